@@ -3,14 +3,25 @@
 
 import os
 import json
-import hashlib
-import requests
-import time
 import random
 import re
 import uuid
+import functools
+import threading
+import concurrent.futures
 from log import get_logger
 from config import ConfigManager
+from http_client import create_session
+from rate_limit import TokenBucket
+from metadata_index import MetadataIndex, index_path_for_user
+from fingerprint_cache import FingerprintCache
+from dir_cache import DirCache
+from link_cache import LinkCache
+from connection_budget import ConnectionBudget
+from bandwidth import BandwidthLimiter
+from downloader import Downloader
+from folder_downloader import FolderDownloader
+from uploader import upload_file, compute_file_md5
 
 logger = get_logger(__name__)
 
@@ -125,12 +136,42 @@ class Pan123:
         self.osversion = random.choice(self.all_os_versions)
 
         self.cookies = None
+        # 所有API、列表、链接解析、上传和下载请求共用的连接池
+        self.session = create_session(
+            pool_maxsize=ConfigManager.get_setting("maxConnectionsPerHost", 32)
+        )
+        # 大文件夹分页并发获取：并发上限与每秒请求页数
+        self.list_concurrency = max(1, int(ConfigManager.get_setting("listConcurrency", 4)))
+        list_rate = float(ConfigManager.get_setting("listRateLimit", 5))
+        self.list_limiter = TokenBucket(list_rate, capacity=max(5, list_rate))
+        # 目录列表内存缓存，来回切换目录时不必重新获取
+        self.dir_cache = DirCache(
+            ttl=float(ConfigManager.get_setting("dirCacheTTL", 60)),
+            max_entries=int(ConfigManager.get_setting("dirCacheMaxEntries", 64)),
+            max_bytes=int(ConfigManager.get_setting("dirCacheMaxBytes", 64 * 1024 * 1024)),
+        )
+        # 全局连接预算：下载、上传连接共享总上限，元数据请求单独限制，避免传输占满连接池
+        self.budget = ConnectionBudget(
+            ConfigManager.get_setting("maxTransferConnections", 24),
+            {
+                "download": ConfigManager.get_setting("maxDownloadConnections", 16),
+                "upload": ConfigManager.get_setting("maxUploadConnections", 8),
+                "meta": ConfigManager.get_setting("maxMetaRequests", 8),
+            },
+        )
+        # 全局带宽限制，所有上传/下载任务共享
+        self.bandwidth = BandwidthLimiter.from_settings()
+        # 下载直链缓存，重试、续传、显示链接和重新下载时不必重复两步解析
+        self.link_cache = LinkCache(ttl=float(ConfigManager.get_setting("linkCacheTTL", 600)))
         self.recycle_list = None
         self.list = []
         self.total = 0
         self.parent_file_name_list = []
         self.all_file = False
         self.file_page = 0
+        # 分页：每页条目数，以及进入目录时获取的页数（当前页 + 预取一页）
+        self.page_size = max(1, int(ConfigManager.get_setting("listPageSize", 100)))
+        self.get_pages = 2
         self.file_list = []
         self.dir_list = []
         self.name_dict = {}
@@ -142,6 +183,21 @@ class Pan123:
             self.user_name = user_name
             self.password = pass_word
             self.authorization = authorization
+        # 本地元数据索引，用于秒开目录、离线浏览和搜索
+        try:
+            self.index = MetadataIndex(index_path_for_user(self.user_name))
+        except Exception as e:
+            logger.error(f"打开本地索引失败: {e}")
+            self.index = None
+        # 本地文件指纹缓存，文件未变化时上传无需重新计算 MD5
+        try:
+            self.fingerprints = FingerprintCache(
+                max_entries=int(ConfigManager.get_setting("fingerprintCacheMaxEntries", 100000))
+            )
+            threading.Thread(target=self._prune_fingerprints, daemon=True).start()
+        except Exception as e:
+            logger.error(f"打开指纹缓存失败: {e}")
+            self.fingerprints = None
         self.header_logined = {
             "user-agent": "123pan/v2.4.0(" + self.osversion + ";Xiaomi)",
             "authorization": self.authorization,
@@ -166,7 +222,7 @@ class Pan123:
     def login(self):
         """登录123云盘账户并获取授权令牌"""
         data = {"type": 1, "passport": self.user_name, "password": self.password}
-        login_res = requests.post(
+        login_res = self.session.post(
             "https://www.123pan.com/b/api/user/sign_in",
             headers=self.header_logined,
             data=data,
@@ -196,6 +252,30 @@ class Pan123:
         self.save_file()
         return res_code_login
 
+    def close(self):
+        """关闭连接池、本地索引和指纹缓存"""
+        try:
+            self.session.close()
+        except Exception:
+            pass
+        if self.index:
+            try:
+                self.index.close()
+            except Exception:
+                pass
+        if self.fingerprints:
+            try:
+                self.fingerprints.close()
+            except Exception:
+                pass
+
+    def _prune_fingerprints(self):
+        """后台淘汰失效的指纹"""
+        try:
+            self.fingerprints.prune()
+        except Exception as e:
+            logger.warning(f"清理指纹缓存失败: {e}")
+
     def save_file(self):
         """将账户信息保存到配置文件"""
         try:
@@ -216,75 +296,195 @@ class Pan123:
         """获取当前目录下的文件列表"""
         return self.get_dir_by_id(self.parent_file_id, save)
 
-    def get_dir_by_id(self, file_id, save=True, all=False, limit=100):
+    def get_dir_by_id(self, file_id, save=True, all=False, limit=None, pages=None):
         """按文件夹ID获取文件列表（支持分页）
         
         Args:
             file_id: 文件夹ID
-            save: 是否保存结果到列表
+            save: 是否保存结果到列表（同时更新分页状态）
             all: 是否强制获取所有文件
-            limit: 每页限制数量
+            limit: 每页限制数量，默认为 page_size
+            pages: 本次获取的页数，默认为 get_pages
         """
-        get_pages = 3
-        res_code_getdir = 0
-        page = self.file_page * get_pages + 1
+        limit = limit or self.page_size
+        page = self.file_page + 1
         lenth_now = len(self.list)
         if all:
             # 强制获取所有文件
             page = 1
             lenth_now = 0
-        lists = []
 
-        total = -1
-        times = 0
-        while (lenth_now < total or total == -1) and (times < get_pages or all):
-            base_url = "https://www.123pan.com/api/file/list/new"
-            params = {
-                "driveId": 0,
-                "limit": limit,
-                "next": 0,
-                "orderBy": "file_id",
-                "orderDirection": "desc",
-                "parentFileId": str(file_id),
-                "trashed": False,
-                "SearchData": "",
-                "Page": str(page),
-                "OnlyLookAbnormalFile": 0,
-            }
-            try:
-                a = requests.get(base_url, headers=self.header_logined, params=params, timeout=30)
-            except Exception:
-                logger.error("连接失败")
-                return -1, []
-            text = a.json()
-            res_code_getdir = text["code"]
-            if res_code_getdir != 0:
-                logger.error("code = 2 Error:" + str(res_code_getdir))
-                logger.error(text.get("message", ""))
-                return res_code_getdir, []
-            lists_page = text["data"]["InfoList"]
-            lists += lists_page
-            total = text["data"]["Total"]
-            lenth_now += len(lists_page)
-            page += 1
-            times += 1
-            if times % 5 == 0:
-                logger.warning("警告：文件夹内文件过多：" + str(lenth_now) + "/" + str(total))
-                logger.info("为防止对服务器造成影响，暂停3秒")
-                time.sleep(3)
+        res_code_getdir, lists, total = self.fetch_dir(
+            file_id, page, None if all else (pages or self.get_pages), limit
+        )
+        if res_code_getdir != 0:
+            return res_code_getdir, []
+        if page == 1:
+            lenth_now = 0
+        lenth_now += len(lists)
 
         if lenth_now < total:
-            logger.warning("文件夹内文件过多：" + str(lenth_now) + "/" + str(total))
-            self.all_file = False
-        else:
-            self.all_file = True
-        self.total = total
-        self.file_page += 1
+            logger.info("已获取：" + str(lenth_now) + "/" + str(total))
         if save:
-            self.list = self.list + lists
+            self.all_file = lenth_now >= total
+            self.total = total
+            self.file_page = page - 1 + (len(lists) + limit - 1) // limit
+            # 从第一页开始获取时替换列表（当前列表可能来自本地索引）
+            self.list = lists if page == 1 else self.list + lists
+            self.dir_cache.put(file_id, self.list, total, self.file_page, self.all_file)
 
         return res_code_getdir, lists
 
+    def fetch_dir(self, file_id, page=1, pages=None, limit=None):
+        """获取文件夹从 page 开始的若干页，不修改当前列表状态
+
+        Args:
+            file_id: 文件夹ID
+            page: 起始页码
+            pages: 最多获取的页数，None 表示获取到最后一页
+            limit: 每页限制数量
+
+        Returns:
+            (返回码, 文件列表, 总数)
+        """
+        limit = limit or self.page_size
+        # 先取首页，得到 Total 后剩余页码即可确定
+        res_code_getdir, data = self._get_dir_page(file_id, page, limit)
+        if res_code_getdir != 0:
+            return res_code_getdir, [], 0
+        lists = list(data["InfoList"])
+        total = data["Total"]
+
+        last_page = (total + limit - 1) // limit
+        end_page = last_page if pages is None else min(last_page, page + pages - 1)
+        if end_page > page:
+            if end_page - page >= 5:
+                logger.warning("警告：文件夹内文件过多：" + str(total))
+            res_code_getdir, rest = self._get_dir_pages(file_id, range(page + 1, end_page + 1), limit)
+            if res_code_getdir != 0:
+                return res_code_getdir, [], 0
+            lists += rest
+
+        self._index_dir(file_id, lists, complete=(page == 1 and len(lists) >= total))
+        return res_code_getdir, lists, total
+
+    def _index_dir(self, file_id, lists, complete=False):
+        """把获取到的列表写入本地索引"""
+        if not self.index:
+            return
+        try:
+            if complete:
+                self.index.replace_children(file_id, lists)
+            else:
+                self.index.upsert(file_id, lists)
+        except Exception as e:
+            logger.error(f"写入本地索引失败: {e}")
+
+    def cached_dir(self, file_id):
+        """从本地索引读取文件夹内容（可能过期）"""
+        if not self.index:
+            return []
+        try:
+            return self.index.children(file_id)
+        except Exception as e:
+            logger.error(f"读取本地索引失败: {e}")
+            return []
+
+    def search_index(self, keyword):
+        """在本地索引中按文件名搜索"""
+        if not self.index or not keyword:
+            return []
+        try:
+            return self.index.search(keyword)
+        except Exception as e:
+            logger.error(f"搜索本地索引失败: {e}")
+            return []
+
+    def set_dir(self, lists, total):
+        """用后台获取的第一批分页替换当前列表"""
+        self.list = lists
+        self.total = total
+        self.file_page = (len(lists) + self.page_size - 1) // self.page_size
+        self.all_file = not lists or len(lists) >= total
+        self.dir_cache.put(self.parent_file_id, self.list, total, self.file_page, self.all_file)
+
+    def append_dir(self, lists, total):
+        """把后台获取的后续分页追加到当前列表"""
+        self.list = self.list + lists
+        self.total = total
+        self.file_page += (len(lists) + self.page_size - 1) // self.page_size
+        # 服务器未返回新条目时视为已到末尾，避免反复请求同一页
+        self.all_file = not lists or len(self.list) >= total
+        self.dir_cache.put(self.parent_file_id, self.list, total, self.file_page, self.all_file)
+
+    def dir_is_fresh(self, file_id=None):
+        """目录缓存是否在有效期内（过期或来自本地索引时需要后台刷新）"""
+        return self.dir_cache.is_fresh(self.parent_file_id if file_id is None else file_id)
+
+    def invalidate_dir(self, *file_ids):
+        """文件夹内容发生变化后使其缓存失效"""
+        self.dir_cache.invalidate(*file_ids)
+
+    def _get_dir_page(self, file_id, page, limit=100):
+        """获取文件夹的某一页
+
+        Returns:
+            (返回码, 接口返回的 data)，失败时 data 为 None
+        """
+        # 所有列表请求共用一个令牌桶，代替固定的暂停
+        self.list_limiter.acquire()
+        base_url = "https://www.123pan.com/api/file/list/new"
+        params = {
+            "driveId": 0,
+            "limit": limit,
+            "next": 0,
+            "orderBy": "file_id",
+            "orderDirection": "desc",
+            "parentFileId": str(file_id),
+            "trashed": False,
+            "SearchData": "",
+            "Page": str(page),
+            "OnlyLookAbnormalFile": 0,
+        }
+        try:
+            with self.budget.slot("meta"):
+                a = self.session.get(base_url, headers=self.header_logined, params=params, timeout=30)
+            text = a.json()
+        except Exception:
+            logger.error("连接失败")
+            return -1, None
+        res_code_getdir = text["code"]
+        if res_code_getdir != 0:
+            logger.error("code = 2 Error:" + str(res_code_getdir))
+            logger.error(text.get("message", ""))
+            return res_code_getdir, None
+        return res_code_getdir, text["data"]
+
+    def _get_dir_pages(self, file_id, pages, limit=100):
+        """并发获取多页，结果按页码顺序拼接
+
+        并发数由 list_concurrency 控制，请求速率由 list_limiter 控制。
+        """
+        pages = list(pages)
+        workers = min(self.list_concurrency, len(pages))
+        if workers <= 1:
+            results = []
+            for page in pages:
+                code, data = self._get_dir_page(file_id, page, limit)
+                if code != 0:
+                    return code, []
+                results.append((code, data))
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as exe:
+                results = list(exe.map(lambda p: self._get_dir_page(file_id, p, limit), pages))
+
+        lists = []
+        for code, data in results:
+            if code != 0:
+                return code, []
+            lists += data["InfoList"]
+        return 0, lists
+
     def show(self):
         """显示文件列表信息到日志"""
         if not self.all_file:
@@ -297,9 +497,23 @@ class Pan123:
         file_detail = self.list[file_number]
         return self.link_by_fileDetail(file_detail, showlink)
 
-    def link_by_fileDetail(self, file_detail, showlink=True):
-        """按文件详情获取下载链接"""
+    def link_by_fileDetail(self, file_detail, showlink=True, refresh=False):
+        """按文件详情获取下载链接
+
+        文件的直链按 (FileId, Etag) 缓存到过期为止，refresh 为 True 时丢弃缓存重新解析。
+        """
         type_detail = file_detail["Type"]
+        cache_key = None
+        if type_detail != 1:
+            cache_key = (file_detail["FileId"], file_detail.get("Etag", ""))
+            if refresh:
+                self.link_cache.invalidate(cache_key)
+            else:
+                cached = self.link_cache.get(cache_key)
+                if cached:
+                    if showlink:
+                        logger.info(f"获取下载链接成功: {cached}")
+                    return cached
 
         if type_detail == 1:
             down_request_url = "https://www.123pan.com/a/api/file/batch_download_info"
@@ -317,27 +531,37 @@ class Pan123:
                 "size": file_detail["Size"],
             }
 
-        link_res = requests.post(
-            down_request_url,
-            headers=self.header_logined,
-            data=json.dumps(down_request_data),
-            timeout=10
-        )
-        link_res_json = link_res.json()
-        res_code_download = link_res_json["code"]
-        if res_code_download != 0:
-            logger.error("获取下载链接失败，返回码: " + str(res_code_download))
-            logger.error(link_res_json.get("message", ""))
-            return res_code_download
-        down_load_url = link_res.json()["data"]["DownloadUrl"]
-        next_to_get = requests.get(down_load_url, timeout=10, allow_redirects=False).text
+        with self.budget.slot("meta"):
+            link_res = self.session.post(
+                down_request_url,
+                headers=self.header_logined,
+                data=json.dumps(down_request_data),
+                timeout=10
+            )
+            link_res_json = link_res.json()
+            res_code_download = link_res_json["code"]
+            if res_code_download != 0:
+                logger.error("获取下载链接失败，返回码: " + str(res_code_download))
+                logger.error(link_res_json.get("message", ""))
+                return res_code_download
+            down_load_url = link_res_json["data"]["DownloadUrl"]
+            next_to_get = self.session.get(down_load_url, timeout=10, allow_redirects=False).text
         url_pattern = re.compile(r"href='(https?://[^']+)'")
         redirect_url = url_pattern.findall(next_to_get)[0]
+        if cache_key is not None:
+            self.link_cache.put(cache_key, redirect_url)
         if showlink:
             logger.info(f"获取下载链接成功: {redirect_url}")
 
         return redirect_url
 
+    def refresh_link(self, file_detail):
+        """重新解析文件的下载链接（缓存的链接过期或返回 403 时使用）"""
+        url = self.link_by_fileDetail(file_detail, showlink=False, refresh=True)
+        if isinstance(url, int):
+            raise RuntimeError("获取下载链接失败，返回码: " + str(url))
+        return url
+
     def download(self, file_number, download_path="download"):
         """下载文件"""
         file_detail = self.list[file_number]
@@ -350,66 +574,74 @@ class Pan123:
         down_load_url = self.link_by_number(file_number, showlink=False)
         if type(down_load_url) == int:
             return
-        self.download_from_url(down_load_url, file_name, download_path)
+        refresh_url = None if file_detail["Type"] == 1 else functools.partial(self.refresh_link, file_detail)
+        self.download_from_url(down_load_url, file_name, download_path,
+                               source={"FileId": file_detail["FileId"], "Etag": file_detail.get("Etag", "")},
+                               refresh_url=refresh_url)
+
+    def download_from_url(self, url, file_name, download_path="download", source=None, refresh_url=None):
+        """从URL下载文件（支持断点续传）
 
-    def download_from_url(self, url, file_name, download_path="download"):
-        """从URL下载文件"""
+        Args:
+            source: 标识下载来源的字典（如 FileId、Etag），用于校验断点信息
+            refresh_url: 链接过期（403/410）时调用以获取新链接
+        """
         if not os.path.exists(download_path):
             logger.info("创建下载目录")
             os.makedirs(download_path)
-        
-        file_path = os.path.join(download_path, file_name)
-        temp_path = file_path + ".123pan"
-        
-        # 如果临时文件存在，删除它（防止之前的不完整下载）
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        
-        down = requests.get(url, stream=True, timeout=10)
-        file_size = int(down.headers.get("Content-Length", 0) or 0)
-        
+
         # 以.123pan后缀下载，下载完成重命名，防止下载中断
-        with open(temp_path, "wb") as f:
-            for chunk in down.iter_content(8192):
-                if chunk:
-                    f.write(chunk)
-        
-        os.rename(temp_path, file_path)
+        file_path = os.path.join(download_path, file_name)
+        Downloader(self.session, url, file_path, source=source, refresh_url=refresh_url,
+                   budget=self.budget, bandwidth=self.bandwidth).run()
 
-    def get_all_things(self, id):
-        """获取文件夹内所有内容"""
-        self.dir_list.remove(id)
-        all_list = self.get_dir_by_id(id, save=False)[1]
+    def walk(self, folder_id, max_workers=None):
+        """广度优先遍历文件夹
 
-        for i in all_list:
-            if i["Type"] == 0:
-                self.file_list.append(i)
-            else:
-                self.dir_list.append(i["FileId"])
-                self.name_dict[i["FileId"]] = i["FileName"]
+        多个文件夹的列表并发获取（总请求速率仍受 list_limiter 限制），
+        每获取到一个文件夹就产出 (相对路径, 条目列表)，相对路径以 "/" 分隔，根为 ""。
+        """
+        max_workers = max_workers or self.list_concurrency
+
+        def list_all(file_id):
+            res_code, lists, _ = self.fetch_dir(file_id)
+            if res_code != 0:
+                raise RuntimeError(f"获取文件夹列表失败，返回码: {res_code}")
+            return lists
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as exe:
+            pending = {exe.submit(list_all, folder_id): ""}
+            while pending:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    rel = pending.pop(future)
+                    items = future.result()
+                    for i in items:
+                        if i.get("Type", 0) == 1:
+                            child = f"{rel}/{i['FileName']}" if rel else i["FileName"]
+                            pending[exe.submit(list_all, i["FileId"])] = child
+                    yield rel, items
 
-        for i in self.dir_list:
-            self.get_all_things(i)
+    def get_all_things(self, id):
+        """获取文件夹内所有内容
+
+        文件追加到 self.file_list，子文件夹 FileId 追加到 self.dir_list，
+        文件夹名记录在 self.name_dict 中。
+        """
+        for _, items in self.walk(id):
+            for i in items:
+                if i["Type"] == 0:
+                    self.file_list.append(i)
+                else:
+                    self.dir_list.append(i["FileId"])
+                    self.name_dict[i["FileId"]] = i["FileName"]
 
     def download_dir(self, file_detail, download_path_root="download"):
-        """下载文件夹"""
-        self.name_dict[file_detail["FileId"]] = file_detail["FileName"]
+        """下载文件夹（保持目录结构，多个文件并发下载）"""
         if file_detail["Type"] != 1:
             logger.warning("不是文件夹")
             return
-
-        all_list = self.get_dir_by_id(file_detail["FileId"], save=False, all=True, limit=100)[1]
-        for i in all_list[::-1]:
-            if i["Type"] == 0:  # 直接开始下载
-                AbsPath = i["AbsPath"]
-                for key, value in self.name_dict.items():
-                    AbsPath = AbsPath.replace(str(key), value)
-                download_path = download_path_root + AbsPath
-                download_path = download_path.replace("/" + str(i["FileId"]), "")
-                self.download_from_url(i["DownloadUrl"], i["FileName"], download_path)
-
-            else:
-                self.download_dir(i, download_path_root)
+        return FolderDownloader(self, file_detail, download_path_root).run()
 
     def recycle(self):
         """获取回收站列表"""
@@ -420,7 +652,7 @@ class Pan123:
                 + str(recycle_id)
                 + "&trashed=true&&Page=1"
         )
-        recycle_res = requests.get(url, headers=self.header_logined, timeout=10)
+        recycle_res = self.session.get(url, headers=self.header_logined, timeout=10)
         json_recycle = recycle_res.json()
         recycle_list = json_recycle["data"]["InfoList"]
         self.recycle_list = recycle_list
@@ -444,13 +676,22 @@ class Pan123:
             "fileTrashInfoList": file_detail,
             "operation": operation,
         }
-        delete_res = requests.post(
+        delete_res = self.session.post(
             "https://www.123pan.com/a/api/file/trash",
             data=json.dumps(data_delete),
             headers=self.header_logined,
             timeout=10
         )
         dele_json = delete_res.json()
+        if dele_json.get("code", -1) == 0:
+            # 所在文件夹（以及被删除的文件夹本身）的缓存失效
+            self.invalidate_dir(file_detail.get("ParentFileId", self.parent_file_id),
+                                self.parent_file_id, file_detail["FileId"])
+            if operation and self.index:
+                try:
+                    self.index.remove([file_detail["FileId"]])
+                except Exception as e:
+                    logger.error(f"更新本地索引失败: {e}")
         print(dele_json)
         message = dele_json.get("message", "")
         print(message)
@@ -467,7 +708,7 @@ class Pan123:
             "sharePwd": share_pwd or "",
             "event": "shareCreate"
         }
-        share_res = requests.post(
+        share_res = self.session.post(
             "https://www.123pan.com/a/api/share/create",
             headers=self.header_logined,
             data=json.dumps(data),
@@ -480,170 +721,64 @@ class Pan123:
         share_url = "https://www.123pan.com/s/" + share_key
         return share_url
 
-    def up_load(self, file_path):
-        """上传文件"""
-        file_path = file_path.replace('"', "").replace("\\", "/")
-        file_name = os.path.basename(file_path)
-        if not os.path.exists(file_path):
-            raise FileNotFoundError("文件不存在")
-        if os.path.isdir(file_path):
-            raise IsADirectoryError("不支持文件夹上传")
-        fsize = os.path.getsize(file_path)
-        readable_hash = self._compute_file_md5(file_path)
-
-        list_up_request = {
-            "driveId": 0,
-            "etag": readable_hash,
-            "fileName": file_name,
-            "parentFileId": self.parent_file_id,
-            "size": fsize,
-            "type": 0,
-            "duplicate": 0,
-        }
-
-        up_res = requests.post(
-            "https://www.123pan.com/b/api/file/upload_request",
-            headers=self.header_logined,
-            data=list_up_request,
-            timeout=10
-        )
-        up_res_json = up_res.json()
-        res_code_up = up_res_json.get("code", -1)
-        if res_code_up == 5060:
-            # 同名文件处理由调用者在GUI中处理
-            raise RuntimeError("同名文件存在")
-        if res_code_up != 0:
-            raise RuntimeError(f"上传请求失败: {up_res_json}")
-        up_file_id = up_res_json["data"]["FileId"]
-        if up_res_json["data"].get("Reuse", False):
-            return up_file_id
-
-        bucket = up_res_json["data"]["Bucket"]
-        storage_node = up_res_json["data"]["StorageNode"]
-        upload_key = up_res_json["data"]["Key"]
-        upload_id = up_res_json["data"]["UploadId"]
-        up_file_id = up_res_json["data"]["FileId"]  # 上传文件的fileId,完成上传后需要用到
-
-        # 获取已将上传的分块
-        start_data = {
-            "bucket": bucket,
-            "key": upload_key,
-            "uploadId": upload_id,
-            "storageNode": storage_node,
-        }
-        start_res = requests.post(
-            "https://www.123pan.com/b/api/file/s3_list_upload_parts",
-            headers=self.header_logined,
-            data=json.dumps(start_data),
-            timeout=10
-        )
-        start_res_json = start_res.json()
-        res_code_up = start_res_json.get("code", -1)
-        if res_code_up != 0:
-            raise RuntimeError(f"获取传输列表失败: {start_res_json}")
-
-        # 分块，每一块取一次链接，依次上传
-        block_size = 5242880
-        with open(file_path, "rb") as f:
-            part_number_start = 1
-            put_size = 0
-            while True:
-                data = f.read(block_size)
-                put_size = put_size + len(data)
-
-                if not data:
-                    break
-                get_link_data = {
-                    "bucket": bucket,
-                    "key": upload_key,
-                    "partNumberEnd": part_number_start + 1,
-                    "partNumberStart": part_number_start,
-                    "uploadId": upload_id,
-                    "StorageNode": storage_node,
-                }
-
-                get_link_url = (
-                    "https://www.123pan.com/b/api/file/s3_repare_upload_parts_batch"
-                )
-                get_link_res = requests.post(
-                    get_link_url,
-                    headers=self.header_logined,
-                    data=json.dumps(get_link_data),
-                    timeout=10
-                )
-                get_link_res_json = get_link_res.json()
-                res_code_up = get_link_res_json.get("code", -1)
-                if res_code_up != 0:
-                    raise RuntimeError(f"获取链接失败: {get_link_res_json}")
-                upload_url = get_link_res_json["data"]["presignedUrls"][
-                    str(part_number_start)
-                ]
-                requests.put(upload_url, data=data, timeout=10)
-
-                part_number_start = part_number_start + 1
-
-
-        uploaded_list_url = "https://www.123pan.com/b/api/file/s3_list_upload_parts"
-        uploaded_comp_data = {
-            "bucket": bucket,
-            "key": upload_key,
-            "uploadId": upload_id,
-            "storageNode": storage_node,
-        }
-        requests.post(
-            uploaded_list_url,
-            headers=self.header_logined,
-            data=json.dumps(uploaded_comp_data),
-            timeout=10
-        )
-        compmultipart_up_url = (
-            "https://www.123pan.com/b/api/file/s3_complete_multipart_upload"
-        )
-        requests.post(
-            compmultipart_up_url,
-            headers=self.header_logined,
-            data=json.dumps(uploaded_comp_data),
-            timeout=10
-        )
+    def up_load(self, file_path, parent_id=None, duplicate=0):
+        """上传文件
 
-        if fsize > 64 * 1024 * 1024:
-            time.sleep(3)
-        close_up_session_url = "https://www.123pan.com/b/api/file/upload_complete"
-        close_up_session_data = {"fileId": up_file_id}
-        close_up_session_res = requests.post(
-            close_up_session_url,
-            headers=self.header_logined,
-            data=json.dumps(close_up_session_data),
-            timeout=10
+        parent_id 默认为当前文件夹；duplicate 为同名文件的处理方式（0 报错，1 覆盖，2 保留两者）。
+        """
+        file_path = file_path.replace('"', "").replace("\\", "/")
+        if parent_id is None:
+            parent_id = self.parent_file_id
+        up_file_id = upload_file(
+            self.session, self.header_logined, file_path, parent_id,
+            duplicate=duplicate, cache=self.fingerprints,
+            budget=self.budget, bandwidth=self.bandwidth,
         )
-        close_res_json = close_up_session_res.json()
-        res_code_up = close_res_json.get("code", -1)
-        if res_code_up != 0:
-            raise RuntimeError(f"上传完成确认失败: {close_res_json}")
+        self.invalidate_dir(parent_id)
         return up_file_id
 
-    def cd(self, dir_num):
+    def _enter_dir(self, fetch=True):
+        """切换目录后重置分页状态并加载列表
+
+        优先使用内存缓存。fetch 为 True 时缓存过期则重新获取；
+        fetch 为 False 时即使过期也直接使用缓存（或本地索引），
+        由调用者在后台与服务器校准。
+        """
+        self.all_file = False
+        self.file_page = 0
+        self.total = 0
+        self.list = []
+        entry = self.dir_cache.get(self.parent_file_id)
+        if entry is not None and (not fetch or self.dir_is_fresh()):
+            self.list = list(entry.items)
+            self.total = entry.total
+            self.file_page = entry.file_page
+            self.all_file = entry.all_file
+        elif fetch:
+            self.get_dir()
+        else:
+            self.list = self.cached_dir(self.parent_file_id)
+
+    def restore_dir(self):
+        """结束搜索后恢复当前文件夹的列表和分页状态（与进入文件夹相同，由调用者在后台校准）"""
+        self._enter_dir(fetch=False)
+
+    def cd(self, dir_num, fetch=True):
         """进入文件夹"""
         if dir_num == "..":
             if len(self.parent_file_list) > 1:
-                self.all_file = False
-                self.file_page = 0
                 self.parent_file_list.pop()
                 self.parent_file_id = self.parent_file_list[-1]
-                self.list = []
                 self.parent_file_name_list.pop()
-                self.get_dir()
+                self._enter_dir(fetch)
             else:
                 raise RuntimeError("已经是根目录")
             return
         if dir_num == "/":
-            self.all_file = False
-            self.file_page = 0
             self.parent_file_id = 0
             self.parent_file_list = [0]
-            self.list = []
             self.parent_file_name_list = []
-            self.get_dir()
+            self._enter_dir(fetch)
             return
         if not str(dir_num).isdigit():
             raise ValueError("文件夹编号必须是数字")
@@ -652,24 +787,37 @@ class Pan123:
             raise IndexError("文件夹编号超出范围")
         if self.list[dir_num]["Type"] != 1:
             raise TypeError("选中项不是文件夹")
-        self.all_file = False
-        self.file_page = 0
         self.parent_file_id = self.list[dir_num]["FileId"]
         self.parent_file_list.append(self.parent_file_id)
         self.parent_file_name_list.append(self.list[dir_num]["FileName"])
-        self.list = []
-        self.get_dir()
+        self._enter_dir(fetch)
 
-    def cdById(self, file_id):
+    def cdById(self, file_id, fetch=True):
         """按ID进入文件夹"""
-        self.all_file = False
-        self.file_page = 0
-        self.list = []
         self.parent_file_id = file_id
         self.parent_file_list.append(self.parent_file_id)
-        self.get_dir()
+        self._enter_dir(fetch)
         self.show()
 
+    def cd_by_detail(self, file_detail, fetch=True):
+        """按文件夹详情进入（用于搜索结果），根据 AbsPath 重建路径"""
+        if file_detail.get("Type") != 1:
+            raise TypeError("选中项不是文件夹")
+        file_id = file_detail["FileId"]
+        ids = [int(i) for i in str(file_detail.get("AbsPath", "")).split("/") if i.isdigit()]
+        ids = [i for i in ids if i != 0]
+        if not ids or ids[-1] != file_id:
+            ids.append(file_id)
+        names = []
+        for i in ids:
+            detail = self.index.get(i) if self.index else None
+            names.append(detail["FileName"] if detail else str(i))
+        names[-1] = file_detail["FileName"]
+        self.parent_file_id = file_id
+        self.parent_file_list = [0] + ids
+        self.parent_file_name_list = names
+        self._enter_dir(fetch)
+
     def read_ini(
             self,
             user_name,
@@ -698,9 +846,11 @@ class Pan123:
         self.password = pass_word
         self.authorization = authorization
 
-    def mkdir(self, dirname, remakedir=False):
-        """创建文件夹"""
-        if not remakedir:
+    def mkdir(self, dirname, remakedir=False, parent_id=None):
+        """创建文件夹，parent_id 默认为当前文件夹"""
+        if parent_id is None:
+            parent_id = self.parent_file_id
+        if not remakedir and parent_id == self.parent_file_id:
             for i in self.list:
                 if i["FileName"] == dirname:
                     logger.info("文件夹已存在")
@@ -711,7 +861,7 @@ class Pan123:
             "driveId": 0,
             "etag": "",
             "fileName": dirname,
-            "parentFileId": self.parent_file_id,
+            "parentFileId": parent_id,
             "size": 0,
             "type": 1,
             "duplicate": 1,
@@ -719,7 +869,7 @@ class Pan123:
             "event": "newCreateFolder",
             "operateType": 1,
         }
-        res_mk = requests.post(
+        res_mk = self.session.post(
             url,
             headers=self.header_logined,
             data=json.dumps(data_mk),
@@ -735,19 +885,11 @@ class Pan123:
 
         if code_mkdir == 0:
             logger.info(f"创建成功: {res_json['data']['FileId']}")
-            self.get_dir()
+            self.invalidate_dir(parent_id)
             return res_json["data"]["Info"]["FileId"]
         logger.error(f"创建失败: {res_json}")
         return
     
-    @staticmethod
-    def _compute_file_md5(file_path):
-        """计算文件MD5值"""
-        md5 = hashlib.md5()
-        with open(file_path, "rb") as f:
-            while True:
-                data = f.read(64 * 1024)
-                if not data:
-                    break
-                md5.update(data)
-        return md5.hexdigest()
+    def _compute_file_md5(self, file_path):
+        """计算文件MD5值（优先使用指纹缓存）"""
+        return compute_file_md5(file_path, cache=self.fingerprints)
@@ -0,0 +1,145 @@
+# https://github.com/123panNextGen/123pan
+# src/bandwidth.py
+
+"""全局带宽限制"""
+
+import time
+import threading
+from log import get_logger
+from config import ConfigManager
+from rate_limit import TokenBucket
+
+logger = get_logger(__name__)
+
+# 传输方向
+KINDS = ("download", "upload")
+# 按时段限速时重新检查当前时段的间隔（秒）
+SCHEDULE_CHECK_INTERVAL = 30
+
+
+def _parse_clock(text):
+    """"HH:MM" -> 当天的分钟数"""
+    hour, minute = text.split(":")
+    return int(hour) * 60 + int(minute)
+
+
+class BandwidthLimiter:
+    """上传、下载各一个令牌桶，所有任务的所有连接共享
+
+    速率单位为 KB/s，0 表示不限速。schedule 为按时段限速的规则列表，例如
+    [{"start": "09:00", "end": "18:00", "download": 2048, "upload": 512}]，
+    start 晚于 end 时表示跨过午夜；当前时间命中某条规则时使用该规则中给出的速率，
+    规则未给出的方向和不在任何时段内时使用 download / upload。
+    """
+
+    def __init__(self, download=0, upload=0, schedule=None):
+        self._buckets = {kind: TokenBucket(0) for kind in KINDS}
+        self._base = {"download": 0, "upload": 0}
+        self._schedule = []
+        self._applied = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.configure(download, upload, schedule)
+
+    @classmethod
+    def from_settings(cls):
+        """按设置 downloadRateLimit / uploadRateLimit / bandwidthSchedule 创建"""
+        limiter = cls()
+        limiter.reload_settings()
+        return limiter
+
+    def reload_settings(self):
+        """重新读取设置（设置对话框保存后调用，立即生效）"""
+        self.configure(
+            ConfigManager.get_setting("downloadRateLimit", 0),
+            ConfigManager.get_setting("uploadRateLimit", 0),
+            ConfigManager.get_setting("bandwidthSchedule", []),
+        )
+
+    def configure(self, download=None, upload=None, schedule=None):
+        """修改限速（KB/s），未传入的项保持不变"""
+        with self._lock:
+            if download is not None:
+                self._base["download"] = max(0.0, float(download))
+            if upload is not None:
+                self._base["upload"] = max(0.0, float(upload))
+            if schedule is not None:
+                self._schedule = []
+                for rule in schedule:
+                    try:
+                        self._schedule.append((_parse_clock(rule["start"]), _parse_clock(rule["end"]), rule))
+                    except (KeyError, ValueError, AttributeError):
+                        logger.warning(f"忽略无效的限速时段: {rule}")
+            self._next_check = 0.0
+        self._check_schedule()
+
+    def current_limits(self, now=None):
+        """当前生效的限速 {"download": KB/s, "upload": KB/s}"""
+        now = time.localtime(now)
+        minute = now.tm_hour * 60 + now.tm_min
+        limits = dict(self._base)
+        for start, end, rule in self._schedule:
+            inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+            if inside:
+                for kind in KINDS:
+                    if kind in rule:
+                        limits[kind] = max(0.0, float(rule[kind]))
+                break
+        return limits
+
+    def _check_schedule(self):
+        """按间隔检查当前时段，速率变化时调整令牌桶"""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + SCHEDULE_CHECK_INTERVAL
+            limits = self.current_limits()
+            previous = self._applied
+            if limits == previous:
+                return
+            self._applied = limits
+        for kind, kbps in limits.items():
+            rate = kbps * 1024
+            # 最多积累 1 秒的令牌，限速刚开启时不会先冲出一大段
+            self._buckets[kind].set_rate(rate, capacity=max(rate, 64 * 1024))
+        if previous is not None or any(limits.values()):
+            logger.info(f"带宽限制: 下载 {limits['download']:g} KB/s，上传 {limits['upload']:g} KB/s（0 为不限）")
+
+    def consume(self, kind, amount):
+        """传输 amount 字节前调用，超出限速时阻塞等待"""
+        self._check_schedule()
+        self._buckets[kind].acquire(amount)
+
+    def limited(self, kind):
+        """当前是否对该方向限速"""
+        return bool(self._applied and self._applied[kind] > 0)
+
+    def reader(self, data):
+        """把要上传的数据包装成按上传限速读取的文件对象"""
+        return ThrottledReader(data, self)
+
+
+class ThrottledReader:
+    """按上传限速读取 bytes 的文件对象
+
+    提供 __len__，requests 据此发送 Content-Length（预签名 PUT 不支持分块编码），
+    http.client 逐块 read 发送，每块发送前从令牌桶取令牌。
+    """
+
+    def __init__(self, data, limiter):
+        self._view = memoryview(data)
+        self._pos = 0
+        self._limiter = limiter
+
+    def __len__(self):
+        return len(self._view) - self._pos
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self)
+        chunk = self._view[self._pos:self._pos + size]
+        self._pos += len(chunk)
+        if chunk:
+            self._limiter.consume("upload", len(chunk))
+        return chunk.tobytes()
@@ -37,7 +37,33 @@ class ConfigManager:
             "osVersion": "",
             "settings": {
                 "defaultDownloadPath": os.path.join(os.path.expanduser("~"), "Downloads"),
-                "askDownloadLocation": True
+                "askDownloadLocation": True,
+                "maxConnectionsPerHost": 32,
+                "listConcurrency": 4,
+                "listRateLimit": 5,
+                "listPageSize": 100,
+                "dirCacheTTL": 60,
+                "dirCacheMaxEntries": 64,
+                "dirCacheMaxBytes": 67108864,
+                "downloadConnections": 8,
+                "downloadAdaptive": True,
+                "uploadConcurrency": 4,
+                "fingerprintCacheMaxEntries": 100000,
+                "folderUploadConcurrency": 3,
+                "folderDownloadConcurrency": 4,
+                "linkCacheTTL": 600,
+                "linkResolveConcurrency": 8,
+                "maxActiveDownloads": 3,
+                "maxActiveUploads": 2,
+                "maxTransferConnections": 24,
+                "maxDownloadConnections": 16,
+                "maxUploadConnections": 8,
+                "maxMetaRequests": 8,
+                "downloadRateLimit": 0,
+                "uploadRateLimit": 0,
+                "bandwidthSchedule": [],
+                "downloadBufferSize": 1048576,
+                "resumeTransfers": True
             }
         }
         
@@ -0,0 +1,93 @@
+# https://github.com/123panNextGen/123pan
+# src/connection_budget.py
+
+"""全局连接预算"""
+
+import threading
+from contextlib import contextmanager
+
+# 计入传输总上限的类别；其余类别（如 meta）只受自身上限限制，不会被传输占满
+TRANSFER_KINDS = ("download", "upload")
+
+
+class ConnectionBudget:
+    """按类别限制同时进行的网络请求数
+
+    download 与 upload 除各自上限外还共享 total 上限；meta（列表、解析链接等元数据请求）
+    有单独的上限，大量传输进行时也不会被饿死。等待者按到达顺序排队，
+    排在前面且有名额的先获得，同一类别先进先出。
+
+    Args:
+        total: 下载与上传连接合计上限
+        limits: 各类别上限，如 {"download": 16, "upload": 8, "meta": 8}
+    """
+
+    def __init__(self, total, limits):
+        self.total = max(1, int(total))
+        self.limits = {kind: max(1, int(n)) for kind, n in limits.items()}
+        self._active = {kind: 0 for kind in self.limits}
+        self._transfer_active = 0
+        self._waiters = []
+        self._cond = threading.Condition()
+
+    def _admissible(self, kind):
+        if self._active[kind] >= self.limits[kind]:
+            return False
+        return kind not in TRANSFER_KINDS or self._transfer_active < self.total
+
+    def _grant(self):
+        """按排队顺序把空出的名额分给可以开始的等待者（调用者需持有 _cond）"""
+        granted = False
+        blocked = set()
+        for waiter in list(self._waiters):
+            kind = waiter[0]
+            # 同一类别中前面的还在等，后面的不能插队
+            if kind in blocked:
+                continue
+            if not self._admissible(kind):
+                blocked.add(kind)
+                continue
+            self._take(kind)
+            waiter[1] = True
+            self._waiters.remove(waiter)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _take(self, kind):
+        self._active[kind] += 1
+        if kind in TRANSFER_KINDS:
+            self._transfer_active += 1
+
+    def acquire(self, kind):
+        """获取一个名额，不足时排队等待"""
+        if kind not in self.limits:
+            raise ValueError(f"未知的连接类别: {kind}")
+        waiter = [kind, False]
+        with self._cond:
+            self._waiters.append(waiter)
+            self._grant()
+            while not waiter[1]:
+                self._cond.wait()
+
+    def release(self, kind):
+        """归还名额"""
+        with self._cond:
+            self._active[kind] -= 1
+            if kind in TRANSFER_KINDS:
+                self._transfer_active -= 1
+            self._grant()
+
+    @contextmanager
+    def slot(self, kind):
+        """with budget.slot("download"): ... 期间占用一个名额"""
+        self.acquire(kind)
+        try:
+            yield
+        finally:
+            self.release(kind)
+
+    def active(self, kind=None):
+        """当前占用的名额数；kind 为 None 时返回传输合计"""
+        with self._cond:
+            return self._transfer_active if kind is None else self._active[kind]
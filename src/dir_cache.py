@@ -0,0 +1,88 @@
+# https://github.com/123panNextGen/123pan
+# src/dir_cache.py
+
+"""目录列表内存缓存（TTL + LRU）"""
+
+import time
+import threading
+from collections import OrderedDict
+
+
+class DirCacheEntry:
+    """一个文件夹的缓存内容，包含恢复分页状态所需的信息"""
+
+    __slots__ = ("items", "total", "file_page", "all_file", "fetched_at", "size")
+
+    def __init__(self, items, total, file_page, all_file, size):
+        self.items = items
+        self.total = total
+        self.file_page = file_page
+        self.all_file = all_file
+        self.fetched_at = time.monotonic()
+        self.size = size
+
+
+class DirCache:
+    """按文件夹ID缓存列表
+
+    超过 ttl 秒的条目视为过期，但仍可先用于显示（stale-while-revalidate），
+    由调用者在后台刷新。条目数或估算字节数超限时按最久未使用淘汰。
+    """
+
+    def __init__(self, ttl=60, max_entries=64, max_bytes=64 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _estimate_size(items):
+        """粗略估算列表占用的字节数"""
+        return sum(64 + sum(len(str(v)) for v in item.values()) for item in items)
+
+    def get(self, folder_id):
+        """获取缓存条目（可能已过期），不存在时返回 None"""
+        with self._lock:
+            entry = self._entries.get(folder_id)
+            if entry is not None:
+                self._entries.move_to_end(folder_id)
+            return entry
+
+    def is_fresh(self, folder_id):
+        """缓存是否存在且未过期"""
+        with self._lock:
+            entry = self._entries.get(folder_id)
+            return entry is not None and time.monotonic() - entry.fetched_at < self.ttl
+
+    def put(self, folder_id, items, total, file_page, all_file):
+        """写入缓存"""
+        items = list(items)
+        entry = DirCacheEntry(items, total, file_page, all_file, self._estimate_size(items))
+        with self._lock:
+            old = self._entries.pop(folder_id, None)
+            if old is not None:
+                self._bytes -= old.size
+            # 单个条目超过上限时不缓存
+            if entry.size > self.max_bytes:
+                return
+            self._entries[folder_id] = entry
+            self._bytes += entry.size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+
+    def invalidate(self, *folder_ids):
+        """使指定文件夹的缓存失效"""
+        with self._lock:
+            for folder_id in folder_ids:
+                entry = self._entries.pop(folder_id, None)
+                if entry is not None:
+                    self._bytes -= entry.size
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
@@ -0,0 +1,705 @@
+# https://github.com/123panNextGen/123pan
+# src/downloader.py
+
+"""分片下载器（预分配文件 + 断点续传）"""
+
+import os
+import json
+import time
+import contextlib
+import threading
+import concurrent.futures
+from collections import deque
+from log import get_logger
+from config import ConfigManager
+
+logger = get_logger(__name__)
+
+# 下载临时文件后缀，完成后重命名为原文件名
+TEMP_SUFFIX = ".123pan"
+# 断点信息文件后缀（追加在临时文件名之后）
+MANIFEST_SUFFIX = ".json"
+# 单个分段的最大重试次数
+PART_RETRIES = 5
+# 初始分段大小
+SEGMENT_SIZE = 8 * 1024 * 1024
+# 拆分正在下载的分段时，双方至少保留的字节数
+MIN_SPLIT_SIZE = 1024 * 1024
+# 签名链接过期时服务器返回的状态码
+EXPIRED_STATUS = (403, 410)
+# 每个连接的读缓冲区大小范围（设置 downloadBufferSize 会被限制在此范围内）
+MIN_BUFFER_SIZE = 256 * 1024
+MAX_BUFFER_SIZE = 4 * 1024 * 1024
+
+
+def read_chunks(response, buffer):
+    """把响应体读入可复用的 buffer，每填满一次（或读到结尾）产出一个 memoryview
+
+    产出的 memoryview 在下一次迭代时会被覆盖，调用者需在此之前写出。
+    连接中断时先产出已读到的部分再抛出异常，续传不会丢掉这部分数据。
+    响应经过压缩时交给 requests 解码，按 buffer 大小产出 bytes。
+    """
+    if response.headers.get("Content-Encoding", "identity").lower() not in ("", "identity"):
+        yield from response.iter_content(chunk_size=len(buffer))
+        return
+    raw = response.raw
+    view = memoryview(buffer)
+    size = len(view)
+    while True:
+        filled = 0
+        while filled < size:
+            try:
+                n = raw.readinto(view[filled:])
+            except Exception:
+                if filled:
+                    yield view[:filled]
+                raise
+            if not n:
+                break
+            filled += n
+        if filled:
+            yield view[:filled]
+        if filled < size:
+            return
+
+
+class DownloadCancelled(Exception):
+    """下载被用户取消"""
+
+
+class DownloadPaused(Exception):
+    """下载被暂停，分段交回调度器，连接和名额归还"""
+
+
+class DownloadManifest:
+    """下载断点信息
+
+    记录下载来源（FileId/Etag）、文件总大小和每个分段的范围及已完成字节数，
+    格式为 parts = [[start, end, done], ...]。
+    """
+
+    def __init__(self, path, source, total, parts):
+        self.path = path
+        self.source = source
+        self.total = total
+        self.parts = parts
+
+    @classmethod
+    def load(cls, path):
+        """读取断点信息，不存在或损坏时返回 None"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            parts = [[int(s), int(e), int(d)] for s, e, d in data["parts"]]
+            return cls(path, data.get("source", {}), int(data["total"]), parts)
+        except Exception as e:
+            logger.warning(f"断点信息损坏，将重新下载: {e}")
+            return None
+
+    def matches(self, source, total):
+        """断点信息是否属于同一个文件"""
+        return self.total == total and self.source == source
+
+    def completed(self):
+        """已完成的字节数"""
+        return sum(d for _, _, d in self.parts)
+
+    def save(self, parts=None):
+        """原子地写入断点信息，parts 为分段的快照（默认使用 self.parts）"""
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"source": self.source, "total": self.total,
+                       "parts": self.parts if parts is None else parts}, f)
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        """删除断点信息"""
+        if os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+            except Exception:
+                pass
+
+
+class SegmentScheduler:
+    """分段调度器
+
+    文件被切成若干分段交给各连接下载。没有待下载的分段时，空闲连接会把
+    预计最晚完成的分段后半部分拆出来接手（work stealing），避免一条慢连接拖慢整体。
+    失败的分段单独退避重试，超过次数后整个下载失败。
+
+    parts 为断点信息中的分段列表，拆分时会原地修改并追加新分段。
+    """
+
+    def __init__(self, parts, retries=PART_RETRIES):
+        self.parts = parts
+        self.retries = retries
+        self._cond = threading.Condition()
+        self._pending = deque(i for i in range(len(parts)) if self._remaining(i) > 0)
+        # 正在下载的分段: index -> (开始时间, 开始时已完成字节数)
+        self._active = {}
+        # 各分段已由 reserve 许可、尚未 advance 的字节数（正在写入的数据）
+        self._reserved = {}
+        self._attempts = {}
+        self._retry_at = {}
+        self.error = None
+
+    def _remaining(self, index):
+        start, end, done = self.parts[index]
+        return end - start + 1 - done
+
+    def snapshot(self):
+        """分段列表的副本，用于保存断点信息"""
+        with self._cond:
+            return [list(p) for p in self.parts]
+
+    def segment(self, index):
+        """获取分段的 (写入位置, 结束位置)，写入位置大于结束位置表示已完成"""
+        with self._cond:
+            start, end, done = self.parts[index]
+            return start + done, end
+
+    def reserve(self, index, n):
+        """预留本次写入的字节数，返回最多可写入的字节数（分段可能已被拆分缩短）
+
+        预留的范围在 advance 之前不会被 _steal 拆走，写入与拆分不会重叠。
+        """
+        with self._cond:
+            reserved = self._reserved.get(index, 0)
+            n = max(0, min(n, self._remaining(index) - reserved))
+            self._reserved[index] = reserved + n
+            return n
+
+    def advance(self, index, n):
+        """记录分段新完成的字节数（释放对应的预留）"""
+        with self._cond:
+            self.parts[index][2] += n
+            self._reserved[index] = max(0, self._reserved.get(index, 0) - n)
+
+    def _steal(self, now):
+        """拆分预计最晚完成的分段，返回新分段的 index"""
+        victim, victim_eta = None, 0.0
+        for index, (started, base) in self._active.items():
+            remaining = self._remaining(index) - self._reserved.get(index, 0)
+            if remaining < 2 * MIN_SPLIT_SIZE:
+                continue
+            speed = (self.parts[index][2] - base) / max(now - started, 1e-3)
+            eta = remaining / speed if speed > 0 else float("inf")
+            if victim is None or eta > victim_eta:
+                victim, victim_eta = index, eta
+        if victim is None:
+            return None
+        start, end, done = self.parts[victim]
+        # 拆分点在原连接已预留（正在写入）的范围之后，原连接在此之外至少再保留 MIN_SPLIT_SIZE
+        reserved = self._reserved.get(victim, 0)
+        mid = start + done + reserved + max(MIN_SPLIT_SIZE, (self._remaining(victim) - reserved) // 2)
+        self.parts[victim][1] = mid - 1
+        self.parts.append([mid, end, 0])
+        return len(self.parts) - 1
+
+    def next_segment(self):
+        """取下一个要下载的分段，全部完成或下载失败时返回 None"""
+        with self._cond:
+            while True:
+                if self.error is not None:
+                    return None
+                now = time.monotonic()
+                wait = None
+                for _ in range(len(self._pending)):
+                    index = self._pending.popleft()
+                    retry_at = self._retry_at.get(index, 0)
+                    if retry_at <= now:
+                        self._active[index] = (now, self.parts[index][2])
+                        return index
+                    self._pending.append(index)
+                    wait = retry_at - now if wait is None else min(wait, retry_at - now)
+                if wait is None:
+                    index = self._steal(now)
+                    if index is not None:
+                        self._active[index] = (now, 0)
+                        return index
+                    if not self._active:
+                        return None
+                # 等待退避结束或其他分段完成/失败
+                self._cond.wait(wait if wait is not None else 0.5)
+
+    def finish(self, index):
+        """分段下载结束"""
+        with self._cond:
+            self._active.pop(index, None)
+            self._reserved.pop(index, None)
+            if self._remaining(index) > 0:
+                self._pending.append(index)
+            self._cond.notify_all()
+
+    def fail(self, index, error):
+        """分段下载失败，退避后重试，超过次数时整个下载失败"""
+        with self._cond:
+            self._active.pop(index, None)
+            self._reserved.pop(index, None)
+            attempts = self._attempts.get(index, 0) + 1
+            self._attempts[index] = attempts
+            if attempts >= self.retries:
+                self.error = error
+            else:
+                wait = 2 ** (attempts - 1)
+                logger.warning(f"分段{index}下载出错，{wait}秒后重试: {error}")
+                self._retry_at[index] = time.monotonic() + wait
+                self._pending.append(index)
+            self._cond.notify_all()
+
+    def abort(self, error):
+        """停止调度（取消或出错）"""
+        with self._cond:
+            if self.error is None:
+                self.error = error
+            self._cond.notify_all()
+
+
+class ConnectionController:
+    """按实测总吞吐量调整并发连接数（AIMD）
+
+    从 initial 个连接开始，每个统计周期结束时：
+    上次增加的连接没有带来明显提升则撤回并保持一段时间，否则再增加一个连接；
+    出现错误（包括 429）时连接数减半。adaptive 为 False 时固定使用 maximum 个连接。
+    """
+
+    # 统计周期（秒）
+    INTERVAL = 2.0
+    # 增加连接后吞吐量至少提高的比例
+    GAIN = 1.1
+    # 撤回或减半后暂停增加连接的时间（秒）
+    HOLD = 10.0
+
+    def __init__(self, maximum, initial=2, adaptive=True):
+        self.maximum = max(1, maximum)
+        self.adaptive = adaptive
+        self.limit = min(initial, self.maximum) if adaptive else self.maximum
+        self._cond = threading.Condition()
+        self._active = 0
+        self._yielding = 0
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+        self._last_rate = 0.0
+        self._grew = False
+        self._hold_until = 0.0
+
+    def acquire(self):
+        """占用一个连接名额，超过当前上限时阻塞"""
+        with self._cond:
+            while self._active >= self.limit:
+                self._cond.wait()
+            self._active += 1
+
+    def release(self, yielded=False):
+        """释放连接名额"""
+        with self._cond:
+            self._active -= 1
+            if yielded:
+                self._yielding -= 1
+            self._cond.notify_all()
+
+    def should_yield(self):
+        """连接数超过上限时让当前连接让出名额（返回 True 的连接需以 yielded=True 释放）"""
+        with self._cond:
+            if self._active - self._yielding > self.limit:
+                self._yielding += 1
+                return True
+            return False
+
+    def record(self, n):
+        """记录下载的字节数，统计周期结束时调整连接数"""
+        if not self.adaptive:
+            return
+        with self._cond:
+            self._window_bytes += n
+            now = time.monotonic()
+            elapsed = now - self._window_start
+            if elapsed < self.INTERVAL:
+                return
+            rate = self._window_bytes / elapsed
+            if self._grew and rate < self._last_rate * self.GAIN:
+                # 增加的连接没有带来明显提升，说明带宽已饱和
+                self.limit = max(1, self.limit - 1)
+                self._hold_until = now + self.HOLD
+                self._grew = False
+            else:
+                self._last_rate = rate
+                self._grew = now >= self._hold_until and self.limit < self.maximum
+                if self._grew:
+                    self.limit += 1
+                    self._cond.notify_all()
+            self._window_start = now
+            self._window_bytes = 0
+            logger.debug(f"下载吞吐量 {rate / 1048576:.2f} MB/s，连接数 {self.limit}")
+
+    def congestion(self):
+        """出现错误时连接数减半"""
+        if not self.adaptive:
+            return
+        with self._cond:
+            self.limit = max(1, self.limit // 2)
+            now = time.monotonic()
+            self._hold_until = now + self.HOLD
+            self._grew = False
+            self._window_start = now
+            self._window_bytes = 0
+
+
+def preallocate(path, size):
+    """创建（或调整）临时文件到最终大小
+
+    优先使用 posix_fallocate 真正分配磁盘空间，不支持时用 truncate 创建稀疏文件。
+    已存在的文件保留原有内容，用于续传。
+    """
+    mode = "r+b" if os.path.exists(path) else "wb"
+    with open(path, mode) as f:
+        if os.fstat(f.fileno()).st_size != size:
+            f.truncate(size)
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+            except OSError:
+                pass
+
+
+class Downloader:
+    """把一个 URL 下载到本地文件
+
+    服务器支持 Range 时先把临时文件预分配到最终大小，由 SegmentScheduler 把分段
+    分配给 ConnectionController 允许数量的连接，各连接直接写入自己的偏移位置。每个分段的
+    完成字节数保存在断点信息中，暂停、出错、程序重启后再次下载同一文件会从中断处继续。
+
+    Args:
+        session: 共享的 requests 会话
+        url: 下载地址
+        out_path: 最终文件路径
+        source: 标识下载来源的字典（如 FileId、Etag），用于校验断点信息
+        task: ThreadedTask，用于暂停/取消
+        on_progress: 进度回调，参数为 0-100 的整数
+        on_bytes: 每写入一块数据时以字节数调用，用于汇总多个文件的进度
+        on_skip: 续传时以断点中已完成的字节数调用一次（计入进度，不计入速度）
+        connections: 最大并发连接数，默认读取设置 downloadConnections
+        adaptive: 是否按吞吐量自动调整连接数，默认读取设置 downloadAdaptive
+        refresh_url: 链接过期（返回 403/410）时调用，返回新的下载地址
+        budget: 全局 ConnectionBudget，每个分段下载期间占用一个 download 名额
+        bandwidth: 全局 BandwidthLimiter，所有连接共享下载限速
+        buffer_size: 每个连接的读缓冲区字节数，默认读取设置 downloadBufferSize
+    """
+
+    # 断点信息最短保存间隔（秒）
+    CHECKPOINT_INTERVAL = 1.0
+
+    def __init__(self, session, url, out_path, source=None, task=None, on_progress=None,
+                 connections=None, adaptive=None, on_bytes=None, refresh_url=None, budget=None,
+                 bandwidth=None, buffer_size=None, on_skip=None):
+        self.session = session
+        self.url = url
+        self.refresh_url = refresh_url
+        self.budget = budget
+        self.bandwidth = bandwidth
+        if buffer_size is None:
+            buffer_size = ConfigManager.get_setting("downloadBufferSize", 1024 * 1024)
+        self.buffer_size = min(MAX_BUFFER_SIZE, max(MIN_BUFFER_SIZE, int(buffer_size)))
+        # 每个下载线程一个可复用的读缓冲区
+        self._local = threading.local()
+        self.out_path = out_path
+        self.temp = out_path + TEMP_SUFFIX
+        self.manifest_path = self.temp + MANIFEST_SUFFIX
+        self.source = source or {}
+        self.task = task
+        self.on_progress = on_progress
+        self.on_bytes = on_bytes
+        self.on_skip = on_skip
+        if connections is None:
+            connections = ConfigManager.get_setting("downloadConnections", 8)
+        self.connections = max(1, int(connections))
+        if adaptive is None:
+            adaptive = ConfigManager.get_setting("downloadAdaptive", True)
+        self.adaptive = bool(adaptive)
+        self.total = 0
+        self._done = 0
+        self._lock = threading.Lock()
+        self._url_lock = threading.Lock()
+        self._manifest = None
+        self._scheduler = None
+        self._controller = None
+        self._last_checkpoint = 0.0
+
+    def _buffer(self):
+        """当前线程的读缓冲区"""
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            buffer = self._local.buffer = bytearray(self.buffer_size)
+        return buffer
+
+    def _budget_slot(self):
+        """占用一个全局 download 名额（未设置 budget 时不限制）"""
+        return self.budget.slot("download") if self.budget else contextlib.nullcontext()
+
+    def _renew_url(self, failed_url):
+        """链接过期时换用新链接，多个连接同时失败时只重新解析一次
+
+        返回是否已有可用的新链接。
+        """
+        if self.refresh_url is None:
+            return False
+        with self._url_lock:
+            if self.url != failed_url:
+                return True
+            try:
+                self.url = self.refresh_url()
+            except Exception as e:
+                logger.warning(f"重新获取下载链接失败: {e}")
+                return False
+            logger.info("下载链接已过期，已重新获取")
+            return True
+
+    def _probe(self):
+        """获取文件大小并判断是否支持 Range"""
+        url = self.url
+        try:
+            head = self.session.head(url, allow_redirects=True, timeout=30)
+            if head.status_code in EXPIRED_STATUS and self._renew_url(url):
+                head = self.session.head(self.url, allow_redirects=True, timeout=30)
+            head.raise_for_status()
+            total = int(head.headers.get("Content-Length", 0) or 0)
+            accept_ranges = head.headers.get("Accept-Ranges", "").lower() == "bytes"
+            return total, accept_ranges
+        except Exception:
+            return self._probe_get()
+
+    def _probe_get(self):
+        """有些链接不支持 HEAD，使用 GET 获取 headers"""
+        try:
+            with self.session.get(self.url, stream=True, timeout=30) as r:
+                r.raise_for_status()
+                total = int(r.headers.get("Content-Length", 0) or 0)
+                accept_ranges = r.headers.get("Accept-Ranges", "").lower() == "bytes"
+                return total, accept_ranges
+        except Exception:
+            return 0, False
+
+    def _wait_if_paused(self):
+        """暂停时阻塞（调用者不应占用连接名额），取消时抛出 DownloadCancelled"""
+        if self.task:
+            self.task._pause_event.wait()
+            if self.task.is_cancelled:
+                raise DownloadCancelled()
+
+    def _check_paused(self):
+        """分段下载中：暂停时抛出 DownloadPaused，取消（或下载已失败）时抛出 DownloadCancelled"""
+        if self._scheduler.error is not None:
+            raise DownloadCancelled()
+        if self.task:
+            if self.task.is_cancelled:
+                raise DownloadCancelled()
+            if getattr(self.task, "is_paused", False):
+                raise DownloadPaused()
+
+    def _check_state(self):
+        """暂停时阻塞，取消（或下载已失败）时抛出 DownloadCancelled"""
+        if self._scheduler is not None and self._scheduler.error is not None:
+            raise DownloadCancelled()
+        if self.task:
+            try:
+                self.task._pause_event.wait()
+            except Exception:
+                pass
+            if self.task.is_cancelled:
+                raise DownloadCancelled()
+
+    def _add_progress(self, n, index=None):
+        """累计进度；index 不为 None 时同时记录该分段的完成字节数"""
+        if index is not None:
+            self._scheduler.advance(index, n)
+            self._controller.record(n)
+        with self._lock:
+            self._done += n
+            if index is not None:
+                self._checkpoint()
+            if self.total and self.on_progress:
+                self.on_progress(int(self._done * 100 / self.total))
+        if self.on_bytes:
+            self.on_bytes(n)
+
+    def _checkpoint(self, force=False):
+        """按间隔保存断点信息（调用者需持有 _lock）"""
+        now = time.monotonic()
+        if not force and now - self._last_checkpoint < self.CHECKPOINT_INTERVAL:
+            return
+        self._last_checkpoint = now
+        try:
+            self._manifest.save(self._scheduler.snapshot())
+        except Exception as e:
+            logger.warning(f"保存断点信息失败: {e}")
+
+    def _plan_parts(self, total):
+        """按 SEGMENT_SIZE 切分初始分段，文件较小时至少保证每个连接一个分段"""
+        size = max(MIN_SPLIT_SIZE, min(SEGMENT_SIZE, -(-total // self.connections)))
+        return [[start, min(start + size, total) - 1, 0] for start in range(0, total, size)]
+
+    def _load_or_create_manifest(self, total):
+        """读取可复用的断点信息，否则新建并清理旧的临时文件"""
+        manifest = DownloadManifest.load(self.manifest_path)
+        if manifest and manifest.matches(self.source, total) and os.path.exists(self.temp):
+            logger.info(f"发现断点信息，继续下载: {self.out_path}")
+            return manifest
+        self._cleanup()
+        manifest = DownloadManifest(self.manifest_path, self.source, total, self._plan_parts(total))
+        manifest.save()
+        return manifest
+
+    def _cancelled(self):
+        """被取消时删除临时文件；任务只是被停止时保留，下次继续"""
+        if not getattr(self.task, "keep_partial", False):
+            self._cleanup()
+
+    def _cleanup(self):
+        """删除临时文件和断点信息"""
+        for p in (self.temp, self.manifest_path):
+            if os.path.exists(p):
+                try:
+                    os.remove(p)
+                except Exception:
+                    pass
+
+    def _download_segment(self, index):
+        """下载一个分段并写入临时文件的对应位置
+
+        连接数被调低时中途返回 True，表示让出了连接名额，未完成的部分交回调度器。
+        """
+        pos, end = self._scheduler.segment(index)
+        if pos > end:
+            return False
+        # 暂停后交回的分段可能被等待中的连接领取，此时不再发起请求
+        self._check_paused()
+        headers = {"Range": f"bytes={pos}-{end}"}
+        url = self.url
+        with self.session.get(url, headers=headers, stream=True, timeout=30) as r:
+            if r.status_code in EXPIRED_STATUS and self._renew_url(url):
+                # 交回调度器，下次用新链接重试
+                raise RuntimeError("下载链接已过期")
+            r.raise_for_status()
+            if r.status_code != 206:
+                raise RuntimeError("服务器未返回分段内容")
+            # 不使用缓冲，写入后立即交给系统，断点信息记录的字节数不会超过实际写入量
+            with open(self.temp, "r+b", buffering=0) as f:
+                f.seek(pos)
+                # 每次读满一个缓冲区再写入、计进度，减少每字节的解释器开销
+                for chunk in read_chunks(r, self._buffer()):
+                    # 暂停时关闭连接、归还名额，恢复后从已写入的位置继续
+                    self._check_paused()
+                    if self.bandwidth:
+                        self.bandwidth.consume("download", len(chunk))
+                    # 分段可能已被其他连接拆走后半部分；预留后写入，拆分不会落在本次写入的范围内
+                    n = self._scheduler.reserve(index, len(chunk))
+                    if n:
+                        f.write(chunk[:n])
+                        self._add_progress(n, index)
+                    if n < len(chunk):
+                        return False
+                    if self._controller.should_yield():
+                        return True
+        pos, end = self._scheduler.segment(index)
+        if pos <= end:
+            raise RuntimeError("连接提前结束")
+        return False
+
+    def _worker(self):
+        """下载线程：不断领取分段直到全部完成"""
+        while True:
+            # 在占用任何名额之前等待暂停结束
+            try:
+                self._wait_if_paused()
+            except DownloadCancelled as e:
+                self._scheduler.abort(e)
+                return
+            self._controller.acquire()
+            index = self._scheduler.next_segment()
+            if index is None:
+                self._controller.release()
+                return
+            yielded = False
+            try:
+                # 每个分段重新排队领取全局名额，多个下载任务之间轮流使用连接
+                with self._budget_slot():
+                    yielded = self._download_segment(index)
+            except DownloadPaused:
+                self._scheduler.finish(index)
+            except DownloadCancelled as e:
+                self._scheduler.abort(e)
+                self._controller.release()
+                return
+            except Exception as e:
+                self._controller.congestion()
+                self._scheduler.fail(index, e)
+            else:
+                self._scheduler.finish(index)
+            self._controller.release(yielded)
+
+    def _download_ranges(self, total):
+        """多连接分段下载，各分段直接写入预分配的临时文件"""
+        self._manifest = self._load_or_create_manifest(total)
+        preallocate(self.temp, total)
+        # 已下载的部分计入进度，但不是本次传输的，不计入速度
+        self._done = self._manifest.completed()
+        if self._done and self.on_skip:
+            self.on_skip(self._done)
+        self._scheduler = SegmentScheduler(self._manifest.parts)
+        self._controller = ConnectionController(self.connections, adaptive=self.adaptive)
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.connections) as exe:
+                for _ in range(self.connections):
+                    exe.submit(self._worker)
+        finally:
+            with self._lock:
+                self._checkpoint(force=True)
+        if self._scheduler.error is not None:
+            # 已下载的部分保留用于续传
+            raise self._scheduler.error
+        self._manifest.remove()
+
+    def _download_stream(self):
+        """服务器不支持 Range 时单线程流式下载（无法续传）"""
+        with self._budget_slot():
+            url = self.url
+            r = self.session.get(url, stream=True, timeout=30)
+            if r.status_code in EXPIRED_STATUS and self._renew_url(url):
+                r.close()
+                r = self.session.get(self.url, stream=True, timeout=30)
+            with r:
+                r.raise_for_status()
+                with open(self.temp, "wb") as f:
+                    for chunk in read_chunks(r, self._buffer()):
+                        self._check_state()
+                        if self.bandwidth:
+                            self.bandwidth.consume("download", len(chunk))
+                        f.write(chunk)
+                        self._add_progress(len(chunk))
+
+    def run(self):
+        """执行下载，返回最终文件路径；被取消时返回 "已取消" """
+        out_dir = os.path.dirname(self.out_path)
+        if out_dir and not os.path.exists(out_dir):
+            os.makedirs(out_dir, exist_ok=True)
+
+        self.total, accept_ranges = self._probe()
+        try:
+            if accept_ranges and self.total:
+                self._download_ranges(self.total)
+            else:
+                self._download_stream()
+        except DownloadCancelled:
+            self._cancelled()
+            return "已取消"
+        # 出错时保留临时文件和断点信息，下次下载同一文件时续传
+
+        if self.task and self.task.is_cancelled:
+            self._cancelled()
+            return "已取消"
+        os.replace(self.temp, self.out_path)
+        return self.out_path
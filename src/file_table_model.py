@@ -0,0 +1,121 @@
+# https://github.com/123panNextGen/123pan
+# src/file_table_model.py
+
+"""文件列表数据模型"""
+
+from PyQt6 import QtCore, QtGui
+
+
+class FileTableModel(QtCore.QAbstractTableModel):
+    """直接以 Pan123.list 为数据源的表格模型
+
+    只有视图中可见的行才会调用 data()，因此大文件夹不会一次性创建所有单元格。
+    """
+
+    HEADERS = ["", "编号", "名称", "类型", "大小"]
+    # 排序使用的角色，由代理模型读取
+    SortRole = QtCore.Qt.ItemDataRole.UserRole + 1
+
+    def __init__(self, icon_provider=None, parent=None):
+        super().__init__(parent)
+        self._items = []
+        self._icon_provider = icon_provider
+        self._bold_font = None
+
+    @staticmethod
+    def format_size(size):
+        """格式化文件大小"""
+        if size > 1073741824:
+            return f"{round(size / 1073741824, 2)} GB"
+        elif size > 1048576:
+            return f"{round(size / 1048576, 2)} MB"
+        return f"{round(size / 1024, 2)} KB"
+
+    def items(self):
+        """当前数据源"""
+        return self._items
+
+    def item(self, row):
+        """获取某一行对应的文件详情"""
+        if 0 <= row < len(self._items):
+            return self._items[row]
+        return None
+
+    def set_items(self, items):
+        """更换数据源
+
+        若新列表只是在当前列表末尾追加了条目（加载更多分页），只插入新增的行。
+        """
+        old = self._items
+        if (old and len(items) > len(old)
+                and items[0] is old[0] and items[len(old) - 1] is old[-1]):
+            first = len(old)
+            self.beginInsertRows(QtCore.QModelIndex(), first, len(items) - 1)
+            self._items = items
+            self.endInsertRows()
+            return
+        self.beginResetModel()
+        self._items = items
+        self.endResetModel()
+
+    def refresh_icons(self):
+        """图标样式变化后通知视图重绘图标列"""
+        if self._items:
+            self.dataChanged.emit(
+                self.index(0, 0), self.index(len(self._items) - 1, 0),
+                [QtCore.Qt.ItemDataRole.DecorationRole],
+            )
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._items)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if orientation == QtCore.Qt.Orientation.Horizontal and role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row, col = index.row(), index.column()
+        if row >= len(self._items):
+            return None
+        item = self._items[row]
+        is_dir = item.get("Type", 0) == 1
+
+        if role == QtCore.Qt.ItemDataRole.DisplayRole:
+            if col == 1:
+                return str(row + 1)
+            if col == 2:
+                return item.get("FileName", "")
+            if col == 3:
+                return "文件夹" if is_dir else "文件"
+            if col == 4:
+                return self.format_size(item.get("Size", 0))
+        elif role == QtCore.Qt.ItemDataRole.DecorationRole:
+            if col == 0 and self._icon_provider:
+                return self._icon_provider(item)
+        elif role == QtCore.Qt.ItemDataRole.FontRole:
+            # 文件夹使用粗体
+            if col == 2 and is_dir:
+                if self._bold_font is None:
+                    self._bold_font = QtGui.QFont()
+                    self._bold_font.setBold(True)
+                return self._bold_font
+        elif role == self.SortRole:
+            if col == 0 or col == 3:
+                return 0 if is_dir else 1
+            if col == 1:
+                return row
+            if col == 2:
+                return item.get("FileName", "").lower()
+            if col == 4:
+                return item.get("Size", 0)
+        return None
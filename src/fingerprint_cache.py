@@ -0,0 +1,119 @@
+# https://github.com/123panNextGen/123pan
+# src/fingerprint_cache.py
+
+"""本地文件指纹缓存（SQLite）"""
+
+import os
+import time
+import sqlite3
+import threading
+from log import get_logger
+from config import ConfigManager, CONFIG_DIR
+
+logger = get_logger(__name__)
+
+# 指纹缓存文件路径（与账号无关，记录的是本地文件）
+FINGERPRINT_DB = os.path.join(CONFIG_DIR, "fingerprints.db")
+
+
+class FingerprintCache:
+    """按 (路径, 大小, 修改时间, inode) 缓存文件 MD5
+
+    文件未变化时直接复用上次的 MD5，无需重新读取整个文件即可发起 upload_request，
+    服务器已有相同文件时（Reuse）上传瞬间完成。
+    """
+
+    def __init__(self, db_path=FINGERPRINT_DB, max_entries=100000):
+        ConfigManager.ensure_config_dir()
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    md5 TEXT NOT NULL,
+                    used_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_fingerprints_used ON fingerprints(used_at)")
+
+    @staticmethod
+    def _key(file_path, st):
+        return os.path.abspath(file_path), st.st_size, st.st_mtime_ns, st.st_ino
+
+    def lookup(self, file_path, st=None):
+        """文件未变化时返回缓存的 MD5，否则返回 None"""
+        st = st or os.stat(file_path)
+        path, size, mtime_ns, inode = self._key(file_path, st)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT md5 FROM fingerprints WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?",
+                (path, size, mtime_ns, inode),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE fingerprints SET used_at = ? WHERE path = ?", (time.time(), path)
+                )
+        return row[0]
+
+    def store(self, file_path, md5, st=None):
+        """记录文件的 MD5"""
+        st = st or os.stat(file_path)
+        path, size, mtime_ns, inode = self._key(file_path, st)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, inode, md5, time.time()),
+            )
+
+    def hit_rate(self):
+        """本次运行的命中率（0-1）"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def prune(self):
+        """淘汰已不存在或已变化的文件，并按最久未使用删除超出 max_entries 的条目"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, size, mtime_ns, inode FROM fingerprints"
+            ).fetchall()
+        stale = []
+        for path, size, mtime_ns, inode in rows:
+            try:
+                st = os.stat(path)
+            except OSError:
+                stale.append((path,))
+                continue
+            if (st.st_size, st.st_mtime_ns, st.st_ino) != (size, mtime_ns, inode):
+                stale.append((path,))
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM fingerprints WHERE path = ?", stale)
+            self._conn.execute(
+                "DELETE FROM fingerprints WHERE path IN ("
+                "SELECT path FROM fingerprints ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (int(self.max_entries),),
+            )
+        if stale:
+            logger.info(f"指纹缓存淘汰 {len(stale)} 个失效条目")
+
+    def close(self):
+        """关闭数据库"""
+        if self.hits or self.misses:
+            logger.info(f"指纹缓存命中 {self.hits} 次，未命中 {self.misses} 次，命中率 {self.hit_rate():.0%}")
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,262 @@
+# https://github.com/123panNextGen/123pan
+# src/folder_downloader.py
+
+"""文件夹及多选下载"""
+
+import os
+import time
+import queue
+import threading
+import concurrent.futures
+from log import get_logger
+from config import ConfigManager
+from downloader import Downloader
+from transfer_stats import TransferProgress
+
+logger = get_logger(__name__)
+
+# 已发现、等待下载的文件数上限
+DISCOVER_AHEAD = 256
+
+
+class BatchDownloader:
+    """下载一批云盘条目（文件和文件夹），文件夹保持目录结构
+
+    遍历线程依次处理所选条目，文件夹通过 Pan123.walk 广度优先并发获取各层列表；
+    发现的文件交给解析线程池并发获取下载直链（结果同时写入 Pan123.link_cache），
+    解析完成后放入下载队列，多个下载线程同时取出下载（每个文件本身也可多连接分段下载）。
+    已存在且大小一致的文件会被跳过（用户确认覆盖的直接选中文件除外），中断的文件由 Downloader 续传。
+
+    Args:
+        pan: 已登录的 Pan123
+        items: 要下载的条目列表
+        download_root: 本地保存位置
+        task: ThreadedTask，用于暂停/取消
+        on_progress: 进度回调，参数为 0-100 的整数
+        on_status: 状态回调，参数为状态文字（文件数、速度、剩余时间）
+        concurrency: 同时下载的文件数，默认读取设置 folderDownloadConcurrency
+        connections: 每个文件的最大连接数，默认读取设置 downloadConnections
+        resolve_concurrency: 同时解析下载链接的数量，默认读取设置 linkResolveConcurrency
+        progress: TransferProgress，传入时字节数和总大小直接记录在其中，供界面定时读取
+        overwrite: 为真时直接选中的文件即使本地已存在也重新下载（用户已确认覆盖），
+            文件夹中的文件仍按大小跳过，重新下载中断的文件夹时不重复下载已完成的文件
+    """
+
+    def __init__(self, pan, items, download_root, task=None, on_progress=None, on_status=None,
+                 concurrency=None, connections=None, resolve_concurrency=None, progress=None,
+                 overwrite=False):
+        self.pan = pan
+        self.items = list(items)
+        self.download_root = download_root
+        self.task = task
+        self.on_progress = on_progress
+        self.on_status = on_status
+        if concurrency is None:
+            concurrency = ConfigManager.get_setting("folderDownloadConcurrency", 4)
+        self.concurrency = max(1, int(concurrency))
+        if resolve_concurrency is None:
+            resolve_concurrency = ConfigManager.get_setting("linkResolveConcurrency", 8)
+        self.resolve_concurrency = max(1, int(resolve_concurrency))
+        self.connections = connections
+        self.overwrite = overwrite
+        self.progress = progress or TransferProgress()
+        self.total_files = 0
+        self.total_bytes = 0
+        self.done_files = 0
+        self.failures = []
+        self.crawl_done = False
+        self._last_percent = -1
+        self._last_status = 0.0
+        self._lock = threading.Lock()
+        # 限制已发现但尚未开始下载的文件数
+        self._ahead = threading.BoundedSemaphore(DISCOVER_AHEAD)
+
+    def _cancelled(self):
+        return bool(self.task and self.task.is_cancelled)
+
+    def _wait_if_paused(self):
+        if self.task:
+            try:
+                self.task._pause_event.wait()
+            except Exception:
+                pass
+
+    def _report(self, force=False):
+        """汇总进度：百分比和文件数（限制频率），速度和剩余时间由 progress 计算"""
+        with self._lock:
+            total_bytes = self.total_bytes
+            percent = int(self.progress.done * 100 / total_bytes) if total_bytes else 0
+            percent = min(100, percent)
+            send_percent = percent != self._last_percent
+            self._last_percent = percent
+            now = time.monotonic()
+            send_status = force or now - self._last_status >= 0.5
+            if send_status:
+                self._last_status = now
+        if send_percent and self.on_progress:
+            self.on_progress(percent)
+        if send_status and self.on_status:
+            files = f"{self.done_files}/{self.total_files}" + ("" if self.crawl_done else "+")
+            self.on_status(f"下载中 {files}")
+
+    def _add_bytes(self, n):
+        self.progress.add_bytes(n)
+        self._report()
+
+    def _skip_bytes(self, n):
+        self.progress.skip(n)
+        self._report()
+
+    def _exists(self, item, local_dir):
+        """本地已有大小一致的同名文件（需要跳过）"""
+        if self.overwrite and local_dir == self.download_root:
+            return False
+        out_path = os.path.join(local_dir, item["FileName"])
+        return os.path.exists(out_path) and os.path.getsize(out_path) == int(item.get("Size", 0) or 0)
+
+    def _resolve(self, item, local_dir, pending):
+        """解析线程：获取下载直链后放入下载队列"""
+        url = None
+        if not self._cancelled() and not self._exists(item, local_dir):
+            try:
+                url = self.pan.link_by_fileDetail(item, showlink=False)
+            except Exception as e:
+                # 下载线程会再解析一次，仍失败时记为失败
+                logger.warning(f"解析下载链接失败 {item.get('FileName')}: {e}")
+        pending.put((item, local_dir, url))
+
+    def _add_file(self, item, local_dir, resolver, pending):
+        with self._lock:
+            self.total_files += 1
+            self.total_bytes += int(item.get("Size", 0) or 0)
+            self.progress.total = self.total_bytes
+        self._ahead.acquire()
+        resolver.submit(self._resolve, item, local_dir, pending)
+
+    def _walk_folder(self, folder, resolver, pending):
+        """遍历一个文件夹，把其中的文件交给解析线程池"""
+        folder_root = os.path.join(self.download_root, folder["FileName"])
+        os.makedirs(folder_root, exist_ok=True)
+        for rel, items in self.pan.walk(folder["FileId"]):
+            if self._cancelled():
+                return
+            self._wait_if_paused()
+            local_dir = os.path.join(folder_root, *rel.split("/")) if rel else folder_root
+            os.makedirs(local_dir, exist_ok=True)
+            for item in items:
+                if item.get("Type", 0) != 1:
+                    self._add_file(item, local_dir, resolver, pending)
+
+    def _crawl(self, pending):
+        """遍历线程：发现文件并交给解析线程池"""
+        resolver = concurrent.futures.ThreadPoolExecutor(max_workers=self.resolve_concurrency)
+        try:
+            # 先处理直接选中的文件，尽快开始下载
+            for item in self.items:
+                if item.get("Type", 0) != 1:
+                    self._add_file(item, self.download_root, resolver, pending)
+            for item in self.items:
+                if item.get("Type", 0) != 1:
+                    continue
+                if self._cancelled():
+                    break
+                try:
+                    self._walk_folder(item, resolver, pending)
+                except Exception as e:
+                    logger.error(f"获取文件夹列表失败 {item['FileName']}: {e}")
+                    with self._lock:
+                        self.failures.append((item["FileName"], e))
+        finally:
+            resolver.shutdown(wait=True)
+            self.crawl_done = True
+            for _ in range(self.concurrency):
+                pending.put(None)
+
+    def _download_file(self, item, local_dir, url):
+        out_path = os.path.join(local_dir, item["FileName"])
+        # 已下载完成的文件直接跳过
+        if self._exists(item, local_dir):
+            self._skip_bytes(int(item.get("Size", 0) or 0))
+            return out_path
+        if url is None:
+            url = self.pan.link_by_fileDetail(item, showlink=False)
+        if isinstance(url, int):
+            raise RuntimeError("获取下载链接失败，返回码: " + str(url))
+        downloader = Downloader(
+            self.pan.session, url, out_path,
+            source={"FileId": item["FileId"], "Etag": item.get("Etag", "")},
+            task=self.task,
+            connections=self.connections,
+            on_bytes=self._add_bytes,
+            on_skip=self._skip_bytes,
+            refresh_url=lambda: self.pan.refresh_link(item),
+            budget=self.pan.budget,
+            bandwidth=self.pan.bandwidth,
+        )
+        return downloader.run()
+
+    def _worker(self, pending):
+        """下载线程：从队列取出文件下载"""
+        while True:
+            entry = pending.get()
+            if entry is None:
+                return
+            self._ahead.release()
+            if self._cancelled():
+                continue
+            item, local_dir, url = entry
+            try:
+                if self._download_file(item, local_dir, url) == "已取消":
+                    continue
+            except Exception as e:
+                logger.warning(f"下载失败 {item.get('FileName')}: {e}")
+                with self._lock:
+                    self.failures.append((item.get("FileName"), e))
+                continue
+            with self._lock:
+                self.done_files += 1
+            self._report()
+
+    def _result(self):
+        """下载完成时 run 的返回值"""
+        return self.download_root
+
+    def run(self):
+        """执行下载，返回本地保存位置；被取消时返回 "已取消" """
+        os.makedirs(self.download_root, exist_ok=True)
+        if self.on_status:
+            self.on_status("获取列表")
+        pending = queue.Queue()
+        crawler = threading.Thread(target=self._crawl, args=(pending,), daemon=True)
+        crawler.start()
+        workers = [
+            threading.Thread(target=self._worker, args=(pending,), daemon=True)
+            for _ in range(self.concurrency)
+        ]
+        for w in workers:
+            w.start()
+        crawler.join()
+        for w in workers:
+            w.join()
+
+        if self._cancelled():
+            return "已取消"
+        if self.failures:
+            name, error = self.failures[0]
+            raise RuntimeError(f"{len(self.failures)} 个文件下载失败，例如 {name}: {error}")
+        if self.on_progress:
+            self.on_progress(100)
+        if self.on_status:
+            self.on_status(f"已下载 {self.done_files} 个文件")
+        return self._result()
+
+
+class FolderDownloader(BatchDownloader):
+    """下载整个云盘文件夹，保持目录结构，其余参数同 BatchDownloader"""
+
+    def __init__(self, pan, folder_detail, download_root, **kwargs):
+        super().__init__(pan, [folder_detail], download_root, **kwargs)
+        self.local_root = os.path.join(download_root, folder_detail["FileName"])
+
+    def _result(self):
+        return self.local_root
@@ -0,0 +1,219 @@
+# https://github.com/123panNextGen/123pan
+# src/folder_uploader.py
+
+"""文件夹上传"""
+
+import os
+import time
+import queue
+import threading
+import concurrent.futures
+from log import get_logger
+from config import ConfigManager
+from uploader import UploadCancelled, check_task, compute_file_md5, upload_file
+
+logger = get_logger(__name__)
+
+# 同时创建的远程文件夹数
+MKDIR_CONCURRENCY = 4
+# 已算好 MD5、等待上传的文件数上限
+HASH_AHEAD = 32
+
+
+class FolderUploader:
+    """上传整个本地文件夹
+
+    1. 用 os.scandir 遍历本地目录树；
+    2. 逐层创建远程文件夹，同一层的文件夹并发创建；
+    3. 校验线程依次计算 MD5 放入有界队列，多个上传线程取出上传，校验与上传同时进行。
+
+    整个文件夹只占用一个后台任务，进度按字节汇总。
+
+    Args:
+        pan: 已登录的 Pan123
+        local_dir: 本地文件夹
+        parent_id: 远程父文件夹 FileId
+        task: ThreadedTask，用于暂停/取消
+        on_progress: 进度回调，参数为 0-100 的整数
+        on_status: 状态回调，参数为状态文字
+        concurrency: 同时上传的文件数，默认读取设置 folderUploadConcurrency
+        progress: TransferProgress，传入时字节数和总大小直接记录在其中，供界面定时读取
+        duplicate: 远程已有同名文件时的处理方式（1 覆盖，2 保留两者），默认保留两者
+    """
+
+    def __init__(self, pan, local_dir, parent_id, task=None, on_progress=None, on_status=None, concurrency=None,
+                 progress=None, duplicate=2):
+        self.pan = pan
+        self.local_dir = os.path.abspath(local_dir)
+        self.parent_id = parent_id
+        self.task = task
+        self.on_progress = on_progress
+        self.on_status = on_status
+        if concurrency is None:
+            concurrency = ConfigManager.get_setting("folderUploadConcurrency", 3)
+        self.concurrency = max(1, int(concurrency))
+        self.progress = progress
+        self.duplicate = duplicate
+        self.total_bytes = 0
+        self.total_files = 0
+        self.done_files = 0
+        self.failures = []
+        self._sent = 0
+        self._last_percent = -1
+        self._last_status = 0.0
+        self._lock = threading.Lock()
+        # 本地相对路径 -> 远程 FileId
+        self._remote = {}
+
+    def _cancelled(self):
+        return bool(self.task and self.task.is_cancelled)
+
+    def _status(self, text, force=False):
+        """更新状态文字（限制频率）"""
+        now = time.monotonic()
+        if self.on_status and (force or now - self._last_status >= 0.2):
+            self._last_status = now
+            self.on_status(text)
+
+    def _add_bytes(self, n, transferred=True):
+        if self.progress:
+            if transferred:
+                self.progress.add_bytes(n)
+            else:
+                self.progress.skip(n)
+        with self._lock:
+            self._sent += n
+            if not self.on_progress or not self.total_bytes:
+                return
+            percent = min(100, int(self._sent * 100 / self.total_bytes))
+            if percent == self._last_percent:
+                return
+            self._last_percent = percent
+        self.on_progress(percent)
+
+    def _scan(self):
+        """遍历本地目录树，返回 (按层级分组的文件夹, 文件列表)"""
+        levels = {}
+        files = []
+        stack = [""]
+        while stack:
+            check_task(self.task)
+            rel = stack.pop()
+            levels.setdefault(rel.count("/") + 1 if rel else 0, []).append(rel)
+            try:
+                with os.scandir(os.path.join(self.local_dir, rel)) as it:
+                    for entry in it:
+                        name = f"{rel}/{entry.name}" if rel else entry.name
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(name)
+                        elif entry.is_file():
+                            size = entry.stat().st_size
+                            files.append((entry.path, rel, size))
+                            self.total_bytes += size
+            except OSError as e:
+                logger.warning(f"读取文件夹失败 {rel}: {e}")
+                self.failures.append((os.path.join(self.local_dir, rel), e))
+        self.total_files = len(files)
+        if self.progress:
+            self.progress.total = self.total_bytes
+        return [levels[d] for d in sorted(levels)], files
+
+    def _make_tree(self, levels):
+        """逐层创建远程文件夹"""
+        root_id = self.pan.mkdir(os.path.basename(self.local_dir), parent_id=self.parent_id)
+        if not root_id:
+            raise RuntimeError("创建文件夹失败: " + os.path.basename(self.local_dir))
+        self._remote[""] = root_id
+        with concurrent.futures.ThreadPoolExecutor(max_workers=MKDIR_CONCURRENCY) as exe:
+            for level in levels[1:]:
+                check_task(self.task)
+                futures = {}
+                for rel in level:
+                    parent_rel, _, name = rel.rpartition("/")
+                    futures[exe.submit(self.pan.mkdir, name, True, self._remote[parent_rel])] = rel
+                for future in concurrent.futures.as_completed(futures):
+                    rel = futures[future]
+                    file_id = future.result()
+                    if not file_id:
+                        raise RuntimeError("创建文件夹失败: " + rel)
+                    self._remote[rel] = file_id
+                self._status(f"创建文件夹 {len(self._remote)}/{sum(len(lv) for lv in levels)}")
+
+    def _hash_files(self, files, pending):
+        """校验线程：计算 MD5 后放入队列"""
+        try:
+            for path, rel, size in files:
+                try:
+                    etag = compute_file_md5(path, task=self.task, cache=self.pan.fingerprints)
+                except UploadCancelled:
+                    break
+                except Exception as e:
+                    logger.warning(f"计算MD5失败 {path}: {e}")
+                    with self._lock:
+                        self.failures.append((path, e))
+                    self._add_bytes(size, transferred=False)
+                    continue
+                pending.put((path, rel, size, etag))
+        finally:
+            for _ in range(self.concurrency):
+                pending.put(None)
+
+    def _upload_files(self, pending):
+        """上传线程：从队列取出文件上传"""
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            if self._cancelled():
+                continue
+            path, rel, size, etag = item
+            try:
+                result = upload_file(
+                    self.pan.session, self.pan.header_logined, path, self._remote[rel],
+                    duplicate=self.duplicate, task=self.task, on_bytes=self._add_bytes, etag=etag,
+                    on_skip=lambda n: self._add_bytes(n, transferred=False),
+                    budget=self.pan.budget, bandwidth=self.pan.bandwidth,
+                )
+                if result == "已取消":
+                    continue
+            except Exception as e:
+                logger.warning(f"上传失败 {path}: {e}")
+                with self._lock:
+                    self.failures.append((path, e))
+                continue
+            with self._lock:
+                self.done_files += 1
+                done = self.done_files
+            self._status(f"上传中 {done}/{self.total_files}")
+
+    def run(self):
+        """执行上传，返回远程文件夹 FileId；被取消时返回 "已取消" """
+        try:
+            self._status("扫描中", force=True)
+            levels, files = self._scan()
+            self._status("创建文件夹", force=True)
+            self._make_tree(levels)
+        except UploadCancelled:
+            return "已取消"
+
+        pending = queue.Queue(maxsize=HASH_AHEAD)
+        hasher = threading.Thread(target=self._hash_files, args=(files, pending), daemon=True)
+        hasher.start()
+        workers = [
+            threading.Thread(target=self._upload_files, args=(pending,), daemon=True)
+            for _ in range(self.concurrency)
+        ]
+        for w in workers:
+            w.start()
+        hasher.join()
+        for w in workers:
+            w.join()
+
+        self.pan.invalidate_dir(self.parent_id, *self._remote.values())
+        if self._cancelled():
+            return "已取消"
+        if self.failures:
+            path, error = self.failures[0]
+            raise RuntimeError(f"{len(self.failures)} 个文件上传失败，例如 {path}: {error}")
+        self._status(f"已上传 {self.done_files} 个文件", force=True)
+        return self._remote[""]
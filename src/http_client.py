@@ -0,0 +1,39 @@
+# https://github.com/123panNextGen/123pan
+# src/http_client.py
+
+"""共享HTTP连接池"""
+
+import http.cookiejar
+import requests
+from requests.adapters import HTTPAdapter
+
+# 连接池缓存的主机数量（API、下载节点、上传节点等）
+DEFAULT_POOL_CONNECTIONS = 16
+# 每个主机的最大连接数
+DEFAULT_POOL_MAXSIZE = 32
+
+
+def create_session(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                   pool_block=True, keep_alive=True):
+    """创建带连接池的会话，所有请求复用 TCP/TLS 连接
+
+    Args:
+        pool_connections: 缓存的主机连接池数量
+        pool_maxsize: 每个主机的最大连接数
+        pool_block: 连接数达到上限时是否等待空闲连接（否则临时新建连接）
+        keep_alive: 是否保持长连接
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=max(1, int(pool_connections)),
+        pool_maxsize=max(1, int(pool_maxsize)),
+        pool_block=pool_block,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # 登录状态由请求头中的 authorization 维护，不在会话中保存 Cookie，
+    # 避免 API 返回的 Cookie 被带到下载/上传节点
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
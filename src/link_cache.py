@@ -0,0 +1,90 @@
+# https://github.com/123panNextGen/123pan
+# src/link_cache.py
+
+"""下载链接缓存（按签名有效期过期）"""
+
+import re
+import time
+import calendar
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+
+# 过期前预留的时间（秒），避免拿到马上失效的链接
+EXPIRY_MARGIN = 30
+
+
+def parse_expiry(url):
+    """从签名链接中解析过期时间（Unix 时间戳），无法解析时返回 None
+
+    支持 Expires / x-oss-expires、X-Amz-Date + X-Amz-Expires、CDN 的 auth_key
+    （以时间戳开头）以及 t / e 参数。
+    """
+    query = {k.lower(): v[0] for k, v in parse_qs(urlsplit(url).query).items() if v}
+    try:
+        if "x-amz-date" in query and "x-amz-expires" in query:
+            signed = calendar.timegm(time.strptime(query["x-amz-date"], "%Y%m%dT%H%M%SZ"))
+            return signed + int(query["x-amz-expires"])
+        for key in ("expires", "x-oss-expires", "t", "e"):
+            if key in query and re.fullmatch(r"\d{10}", query[key]):
+                return int(query[key])
+        if "auth_key" in query:
+            m = re.match(r"(\d{10})-", query["auth_key"])
+            if m:
+                return int(m.group(1))
+    except (ValueError, OverflowError):
+        pass
+    return None
+
+
+class LinkCache:
+    """按 (FileId, Etag) 缓存解析好的下载直链
+
+    过期时间取链接签名中的有效期与 ttl 中较早者；解析不出有效期（或解析结果已过去，
+    说明参数并非过期时间）时按 ttl 过期。条目数超限时按最久未使用淘汰。
+    """
+
+    def __init__(self, ttl=600, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """获取未过期的链接，不存在或已过期时返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            url, expires_at = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return url
+
+    def put(self, key, url):
+        """写入链接"""
+        now = time.time()
+        expires_at = now + self.ttl
+        signed = parse_expiry(url)
+        if signed is not None and signed > now:
+            expires_at = min(expires_at, signed)
+        expires_at -= EXPIRY_MARGIN
+        with self._lock:
+            self._entries.pop(key, None)
+            if expires_at <= now:
+                return
+            self._entries[key] = (url, expires_at)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """丢弃指定文件的链接（例如下载时返回 403）"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
@@ -4,25 +4,36 @@
 from PyQt6 import QtCore, QtGui, QtWidgets
 import os
 import json
-import hashlib
-import requests
 import sys
-import time
-import concurrent.futures
-import threading
 from log import get_logger
 from config import ConfigManager
 from ui_widgets import SidebarButton, LoginDialog, SettingsDialog, AboutDialog
 from api import Pan123
+from transfer_scheduler import TransferScheduler
 from threading_utils import ThreadedTask
+from file_table_model import FileTableModel
+from downloader import Downloader
+from folder_downloader import BatchDownloader, FolderDownloader
+from uploader import upload_file
+from folder_uploader import FolderUploader
 from ui_theme_manager import ThemeManager
+from transfer_stats import TransferProgress
+from transfer_model import TransferTableModel, TransferActionDelegate, FINISHED_STATUSES
+from transfer_queue import TransferQueue, queue_path_for_user, PENDING, PAUSED, DONE, FAILED, CANCELLED
 
 logger = get_logger(__name__)
 
+# 传输列表刷新间隔（毫秒）
+PROGRESS_REFRESH_MS = 100
+# 传输进度写入传输队列的间隔（毫秒）
+QUEUE_SAVE_MS = 5000
+# 退出或退出登录时等待传输线程结束的最长时间（毫秒）
+STOP_WAIT_MS = 10000
 
-class DropAreaTableWidget(QtWidgets.QTableWidget):
+
+class DropAreaTableView(QtWidgets.QTableView):
     """支持拖拽上传的表格控件"""
-    files_dropped = QtCore.pyqtSignal(list)  # 信号：文件路径列表
+    files_dropped = QtCore.pyqtSignal(list)  # 信号：文件/文件夹路径列表
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -43,7 +54,7 @@ class DropAreaTableWidget(QtWidgets.QTableWidget):
             elif event.type() == QtCore.QEvent.Type.DragMove:
                 if event.mimeData().hasUrls():
                     has_files = any(
-                        os.path.isfile(url.toLocalFile()) 
+                        os.path.exists(url.toLocalFile()) 
                         for url in event.mimeData().urls()
                     )
                     if has_files:
@@ -56,9 +67,9 @@ class DropAreaTableWidget(QtWidgets.QTableWidget):
     def dragEnterEvent(self, event):
         """处理拖进事件"""
         if event.mimeData().hasUrls():
-            # 检查是否有文件
+            # 检查是否有文件或文件夹
             has_files = any(
-                os.path.isfile(url.toLocalFile()) 
+                os.path.exists(url.toLocalFile()) 
                 for url in event.mimeData().urls()
             )
             if has_files:
@@ -66,7 +77,7 @@ class DropAreaTableWidget(QtWidgets.QTableWidget):
                 self.is_drag_over = True
                 # 高亮显示表格
                 self.setStyleSheet(self.styleSheet() + 
-                                 "\nQTableWidget { background-color: rgba(59, 130, 246, 0.15); border: 2px dashed rgba(59, 130, 246, 0.5); }")
+                                 "\nQTableView { background-color: rgba(59, 130, 246, 0.15); border: 2px dashed rgba(59, 130, 246, 0.5); }")
                 return True
             else:
                 event.ignore()
@@ -81,7 +92,7 @@ class DropAreaTableWidget(QtWidgets.QTableWidget):
             # 恢复原样式
             style = self.styleSheet()
             # 移除高亮样式
-            style = style.replace("\nQTableWidget { background-color: rgba(59, 130, 246, 0.15); border: 2px dashed rgba(59, 130, 246, 0.5); }", "")
+            style = style.replace("\nQTableView { background-color: rgba(59, 130, 246, 0.15); border: 2px dashed rgba(59, 130, 246, 0.5); }", "")
             self.setStyleSheet(style)
     
     def dropEvent(self, event):
@@ -90,13 +101,13 @@ class DropAreaTableWidget(QtWidgets.QTableWidget):
         if self.is_drag_over:
             self.is_drag_over = False
             style = self.styleSheet()
-            style = style.replace("\nQTableWidget { background-color: rgba(59, 130, 246, 0.15); border: 2px dashed rgba(59, 130, 246, 0.5); }", "")
+            style = style.replace("\nQTableView { background-color: rgba(59, 130, 246, 0.15); border: 2px dashed rgba(59, 130, 246, 0.5); }", "")
             self.setStyleSheet(style)
         
         files = []
         for url in event.mimeData().urls():
             file_path = url.toLocalFile()
-            if os.path.isfile(file_path):
+            if os.path.isfile(file_path) or os.path.isdir(file_path):
                 files.append(file_path)
         
         if files:
@@ -119,6 +130,14 @@ class MainWindow(QtWidgets.QMainWindow):
         self.threadpool = QtCore.QThreadPool.globalInstance()
         # 设置线程池的最大线程数，允许同时下载多个文件
         self.threadpool.setMaxThreadCount(64)
+        # 上传/下载任务由调度器按类别限制同时运行的数量，其余排队
+        self.scheduler = TransferScheduler(self.threadpool, {
+            "download": ConfigManager.get_setting("maxActiveDownloads", 3),
+            "upload": ConfigManager.get_setting("maxActiveUploads", 2),
+        }, self)
+
+        # 文件图标缓存，键为 (类型, 扩展名, 主题, 设备像素比)
+        self.icon_cache = {}
 
         # 应用123云盘主题
         self.theme_manager = ThemeManager(self)
@@ -281,6 +300,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_share = QtWidgets.QPushButton("分享")
         self.btn_link = QtWidgets.QPushButton("显示链接")
         self.btn_upload = QtWidgets.QPushButton("上传文件")
+        self.btn_upload_folder = QtWidgets.QPushButton("上传文件夹")
         self.btn_mkdir = QtWidgets.QPushButton("新建文件夹")
 
         # 关于按钮
@@ -301,7 +321,7 @@ class MainWindow(QtWidgets.QMainWindow):
         
         # 设置按钮最小宽度统一外观
         btns = [self.btn_refresh, self.btn_more, self.btn_up, self.btn_download, self.btn_link,
-                self.btn_upload, self.btn_mkdir, self.btn_delete, self.btn_share]
+                self.btn_upload, self.btn_upload_folder, self.btn_mkdir, self.btn_delete, self.btn_share]
         
         # 为每个按钮添加动画效果
         self.button_animations = {}
@@ -360,7 +380,19 @@ class MainWindow(QtWidgets.QMainWindow):
         self.lbl_path.setFont(font)
         path_h.addWidget(self.lbl_path)
         path_h.addStretch()
+        # 已加载条目数
+        self.lbl_count = QtWidgets.QLabel()
+        path_h.addWidget(self.lbl_count)
+        # 本地索引搜索框
+        self.le_search = QtWidgets.QLineEdit()
+        self.le_search.setPlaceholderText("搜索已浏览过的文件（回车）")
+        self.le_search.setClearButtonEnabled(True)
+        self.le_search.setMaximumWidth(260)
+        self.le_search.returnPressed.connect(self.on_search)
+        path_h.addWidget(self.le_search)
         right_layout.addWidget(self.path_widget)
+        # 当前搜索关键字，为空表示正常浏览
+        self.search_keyword = ""
         
         # 创建页面堆栈
         self.page_stack = QtWidgets.QStackedWidget()
@@ -376,8 +408,21 @@ class MainWindow(QtWidgets.QMainWindow):
         file_list_layout.setContentsMargins(0, 0, 0, 0)
         
         # 文件列表表格（支持拖拽上传）
-        self.table = DropAreaTableWidget(0, 5)
-        self.table.setHorizontalHeaderLabels(["", "编号", "名称", "类型", "大小"])
+        # 数据模型直接引用 pan.list，排序和过滤经由代理模型完成
+        self.file_model = FileTableModel(icon_provider=self.get_file_icon, parent=self)
+        self.file_proxy = QtCore.QSortFilterProxyModel(self)
+        self.file_proxy.setSourceModel(self.file_model)
+        self.file_proxy.setSortRole(FileTableModel.SortRole)
+        self.file_proxy.setFilterKeyColumn(2)
+        self.file_proxy.setFilterCaseSensitivity(QtCore.Qt.CaseSensitivity.CaseInsensitive)
+        # 输入时先在当前列表中过滤，回车再搜索整个本地索引
+        self.le_search.textChanged.connect(self.file_proxy.setFilterFixedString)
+        self.table = DropAreaTableView()
+        self.table.setModel(self.file_proxy)
+        # 默认保持服务器返回的顺序，点击表头后再排序
+        self.table.horizontalHeader().setSortIndicator(-1, QtCore.Qt.SortOrder.AscendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.setColumnWidth(0, 40)
         self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
         self.table.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
         self.table.doubleClicked.connect(self.on_table_double)
@@ -387,6 +432,9 @@ class MainWindow(QtWidgets.QMainWindow):
         self.table.horizontalHeader().setStretchLastSection(True)
         # 连接拖拽上传信号
         self.table.files_dropped.connect(self.on_files_dropped)
+        # 滚动接近底部时自动加载后续分页
+        self.loading_more = False
+        self.table.verticalScrollBar().valueChanged.connect(self._maybe_load_more)
         file_list_layout.addWidget(self.table, stretch=1)
         
         # 加载动画布局
@@ -421,10 +469,13 @@ class MainWindow(QtWidgets.QMainWindow):
         
         files_layout.addWidget(file_list_widget, stretch=1)
         
-        # 传输任务管理
-        self.transfer_tasks = []
+        # 传输任务管理（按 task_id 索引的登记表，同时是传输页表格的模型）
+        self.transfers = TransferTableModel(self)
+        self.scheduler.started.connect(self.transfers.track)
         self.next_task_id = 0
         self.active_tasks = {}  # 保存活动任务的引用，用于取消
+        # 持久化的传输队列，登录后按账号打开
+        self.transfer_queue = None
         
         # 传输页面
         self.transfer_page = QtWidgets.QWidget()
@@ -438,18 +489,39 @@ class MainWindow(QtWidgets.QMainWindow):
         transfer_title.setStyleSheet(f"font-size: 24px; font-weight: bold; color: {title_color}; margin: 20px 0;")
         transfer_layout.addWidget(transfer_title)
         
-        self.transfer_table = QtWidgets.QTableWidget(0, 6)
-        self.transfer_table.setHorizontalHeaderLabels(["类型", "文件名", "大小", "进度", "状态", "操作"])
+        self.transfer_table = QtWidgets.QTableView()
+        self.transfer_table.setModel(self.transfers)
         self.transfer_table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
         self.transfer_table.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
         self.transfer_table.verticalHeader().setVisible(False)
+        # 固定行高，大量任务时视图不必逐行计算高度
+        self.transfer_table.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.Fixed)
+        self.transfer_table.verticalHeader().setDefaultSectionSize(40)
         self.transfer_table.horizontalHeader().setStretchLastSection(True)
+        # 操作列由代理绘制按钮，不为每行创建控件
+        self.transfer_actions = TransferActionDelegate(self.transfer_table)
+        self.transfer_actions.pause_clicked.connect(self.toggle_task_pause)
+        self.transfer_actions.cancel_clicked.connect(self.cancel_task)
+        self.transfer_table.setItemDelegateForColumn(TransferTableModel.ACTION_COLUMN, self.transfer_actions)
         # 设置列宽
         self.transfer_table.setColumnWidth(0, 80)
         self.transfer_table.setColumnWidth(2, 120)
         self.transfer_table.setColumnWidth(3, 100)
         self.transfer_table.setColumnWidth(4, 100)
-        self.transfer_table.setColumnWidth(5, 80)
+        self.transfer_table.setColumnWidth(5, 100)
+        self.transfer_table.setColumnWidth(6, 80)
+        self.transfer_table.setColumnWidth(7, 150)
+        # 工作线程只更新 TransferProgress 计数，界面按固定频率批量刷新
+        self.progress_timer = QtCore.QTimer(self)
+        self.progress_timer.setInterval(PROGRESS_REFRESH_MS)
+        self.progress_timer.timeout.connect(self.transfers.refresh_progress)
+        self.progress_timer.start()
+        self.queue_timer = QtCore.QTimer(self)
+        self.queue_timer.setInterval(QUEUE_SAVE_MS)
+        self.queue_timer.timeout.connect(self.save_transfer_queue)
+        self.queue_timer.start()
+        self.transfer_table.setContextMenuPolicy(QtCore.Qt.ContextMenuPolicy.CustomContextMenu)
+        self.transfer_table.customContextMenuRequested.connect(self.on_transfer_context_menu)
         transfer_layout.addWidget(self.transfer_table, stretch=1)
         
         # 添加页面到堆栈
@@ -467,11 +539,12 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_settings.clicked.connect(self.on_settings)
         self.btn_logout.clicked.connect(self.on_logout)
         self.btn_refresh.clicked.connect(lambda: self.refresh_file_list(reset_page=True))
-        self.btn_more.clicked.connect(lambda: self.refresh_file_list(reset_page=False))
+        self.btn_more.clicked.connect(self.load_more)
         self.btn_up.clicked.connect(self.on_up)
         self.btn_download.clicked.connect(self.on_download)
         self.btn_link.clicked.connect(self.on_showlink)
         self.btn_upload.clicked.connect(self.on_upload)
+        self.btn_upload_folder.clicked.connect(self.on_upload_folder)
         self.btn_mkdir.clicked.connect(self.on_mkdir)
         self.btn_delete.clicked.connect(self.on_delete)
         self.btn_share.clicked.connect(self.on_share)
@@ -497,8 +570,15 @@ class MainWindow(QtWidgets.QMainWindow):
             settings = dlg.get_settings()
             # 保存设置到配置文件
             config = ConfigManager.load_config()
-            config["settings"] = settings
+            config.setdefault("settings", {}).update(settings)
             ConfigManager.save_config(config)
+            self.scheduler.set_limits({
+                "download": settings["maxActiveDownloads"],
+                "upload": settings["maxActiveUploads"],
+            })
+            # 限速对进行中的任务立即生效
+            if self.pan:
+                self.pan.bandwidth.reload_settings()
             QtWidgets.QMessageBox.information(self, "设置", "设置已保存")
     
     def on_logout(self):
@@ -515,7 +595,11 @@ class MainWindow(QtWidgets.QMainWindow):
             config["authorization"] = ""
             ConfigManager.save_config(config)
             
-            # 清空当前登陆状态
+            # 清空当前登陆状态（先停止传输，工作线程不再使用旧的 pan）
+            self.stop_transfers()
+            self.close_transfer_queue()
+            if self.pan:
+                self.pan.close()
             self.pan = None
             
             # 显示登陆对话框
@@ -526,6 +610,7 @@ class MainWindow(QtWidgets.QMainWindow):
                 return
             self.pan = dlg.get_pan()
             self.refresh_file_list(reset_page=True)
+            self.open_transfer_queue()
             QtWidgets.QMessageBox.information(self, "提示", "登陆成功")
     
     def on_files_dropped(self, files):
@@ -536,9 +621,12 @@ class MainWindow(QtWidgets.QMainWindow):
             QtWidgets.QMessageBox.information(self, "提示", "请先登录。")
             return
         
-        # 逐个上传文件
+        # 逐个上传文件，文件夹整体作为一个任务上传
         for file_path in files:
-            self._upload_single_file(file_path)
+            if os.path.isdir(file_path):
+                self._upload_folder(file_path)
+            else:
+                self._upload_single_file(file_path)
     
     def _upload_single_file(self, file_path):
         """上传单个文件"""
@@ -568,40 +656,9 @@ class MainWindow(QtWidgets.QMainWindow):
                 return
             dup_choice = int(text.strip())
         
-        # 添加传输任务
-        task_id = self.add_transfer_task("上传", fname, file_size)
-        
-        task = ThreadedTask(self._task_upload_file, file_path, dup_choice, task_id)
-        
-        # 保存任务对象引用
-        for i, t in enumerate(self.transfer_tasks):
-            if t["id"] == task_id:
-                self.transfer_tasks[i]["threaded_task"] = task
-                break
-        
-        self.active_tasks[task_id] = task
-        
-        def on_task_finished(tid):
-            if tid in self.active_tasks:
-                del self.active_tasks[tid]
-        
-        task.signals.progress.connect(lambda p, tid=task_id: (
-            self.status.showMessage(f"上传进度: {p}%", 2000),
-            self.update_transfer_task(tid, p, "上传中")
-        ))
-        task.signals.result.connect(lambda r, tid=task_id: (
-            self.status.showMessage("上传完成", 3000),
-            self.update_transfer_task(tid, 100, "已完成"),
-            on_task_finished(tid),
-            self.refresh_file_list(reset_page=False)
-        ))
-        task.signals.error.connect(lambda e, tid=task_id: (
-            self.status.showMessage(f"上传出错: {e}", 3000),
-            self.update_transfer_task(tid, 0, "失败"),
-            on_task_finished(tid)
-        ))
-        
-        self.threadpool.start(task)
+        # 添加传输任务（拖拽可能一次加入很多文件，出错时只在状态栏提示）
+        self.start_transfer("upload_file", file_path,
+                            {"parent_id": self.pan.parent_file_id, "duplicate": dup_choice}, quiet=True)
 
     def on_about(self):
         """打开关于对话框"""
@@ -631,21 +688,60 @@ class MainWindow(QtWidgets.QMainWindow):
             self.pan = dlg.get_pan()
 
         self.refresh_file_list(reset_page=True)
+        self.open_transfer_queue()
 
     def prompt_selected_row(self):
+        """返回所选行在 pan.list 中的下标"""
         rows = self.table.selectionModel().selectedRows()
         if not rows:
             QtWidgets.QMessageBox.information(self, "提示", "请先选择一项。")
             return None
-        return rows[0].row()
+        return self.file_proxy.mapToSource(rows[0]).row()
+
+    # 文件扩展名对应的图标颜色
+    FILE_ICON_COLORS = {
+        ".txt": (25, 118, 210),
+        ".pdf": (211, 47, 47),
+        ".doc": (33, 150, 243),
+        ".docx": (33, 150, 243),
+        ".xls": (76, 175, 80),
+        ".xlsx": (76, 175, 80),
+        ".ppt": (255, 193, 7),
+        ".pptx": (255, 193, 7),
+        ".jpg": (156, 39, 176),
+        ".jpeg": (156, 39, 176),
+        ".png": (156, 39, 176),
+        ".gif": (156, 39, 176),
+        ".mp3": (94, 53, 177),
+        ".mp4": (233, 30, 99),
+        ".zip": (121, 85, 72),
+        ".rar": (121, 85, 72),
+        ".7z": (121, 85, 72),
+    }
 
     def get_file_icon(self, file_detail):
-        """根据文件类型获取图标"""
+        """根据文件类型获取图标（同一种图标只绘制一次）"""
         file_type = file_detail.get("Type", 0)
-        file_name = file_detail.get("FileName", "")
-        
-        # 创建一个32x32的图标
-        pixmap = QtGui.QPixmap(32, 32)
+        if file_type == 1:
+            ext = ""
+        else:
+            ext = os.path.splitext(file_detail.get("FileName", ""))[1].lower()
+            # 未知扩展名共用默认图标
+            if ext not in self.FILE_ICON_COLORS:
+                ext = "*"
+        theme = 'dark' if self.theme_manager.is_dark_mode else 'light'
+        dpr = self.devicePixelRatioF()
+        key = (file_type, ext, theme, dpr)
+        icon = self.icon_cache.get(key)
+        if icon is None:
+            icon = self._paint_file_icon(file_type, ext, dpr)
+            self.icon_cache[key] = icon
+        return icon
+
+    def _paint_file_icon(self, file_type, ext, dpr):
+        """绘制一个32x32的文件图标"""
+        pixmap = QtGui.QPixmap(int(32 * dpr), int(32 * dpr))
+        pixmap.setDevicePixelRatio(dpr)
         pixmap.fill(QtCore.Qt.GlobalColor.transparent)
         painter = QtGui.QPainter(pixmap)
         painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
@@ -660,28 +756,7 @@ class MainWindow(QtWidgets.QMainWindow):
             painter.drawRect(6, 6, 16, 8)
         else:  # 文件
             # 根据文件扩展名选择图标颜色
-            ext = os.path.splitext(file_name)[1].lower()
-            colors = {
-                ".txt": QtGui.QColor(25, 118, 210),
-                ".pdf": QtGui.QColor(211, 47, 47),
-                ".doc": QtGui.QColor(33, 150, 243),
-                ".docx": QtGui.QColor(33, 150, 243),
-                ".xls": QtGui.QColor(76, 175, 80),
-                ".xlsx": QtGui.QColor(76, 175, 80),
-                ".ppt": QtGui.QColor(255, 193, 7),
-                ".pptx": QtGui.QColor(255, 193, 7),
-                ".jpg": QtGui.QColor(156, 39, 176),
-                ".jpeg": QtGui.QColor(156, 39, 176),
-                ".png": QtGui.QColor(156, 39, 176),
-                ".gif": QtGui.QColor(156, 39, 176),
-                ".mp3": QtGui.QColor(94, 53, 177),
-                ".mp4": QtGui.QColor(233, 30, 99),
-                ".zip": QtGui.QColor(121, 85, 72),
-                ".rar": QtGui.QColor(121, 85, 72),
-                ".7z": QtGui.QColor(121, 85, 72),
-            }
-            
-            color = colors.get(ext, QtGui.QColor(100, 116, 139))
+            color = QtGui.QColor(*self.FILE_ICON_COLORS.get(ext, (100, 116, 139)))
             painter.setBrush(color)
             painter.setPen(color.darker(120))
             
@@ -697,59 +772,80 @@ class MainWindow(QtWidgets.QMainWindow):
     def populate_table(self):
         if not self.pan:
             return
-        self.table.setRowCount(0)
-        
-        # 直接添加所有行，避免延迟导致的数据错乱
-        for index, item in enumerate(self.pan.list):
-            self._add_row(index)
+        self.file_model.set_items(self.pan.list)
 
+        if self.search_keyword:
+            self.lbl_path.setText(f"搜索“{self.search_keyword}”：{len(self.pan.list)} 项")
+            self.lbl_count.setText("")
+            return
         names = getattr(self.pan, "parent_file_name_list", [])
         path = "/" + "/".join(names) if names else "/"
         self.lbl_path.setText(path)
-    
-    def _add_row(self, index):
-        """添加行，逐行显示"""
-        if index >= len(self.pan.list):
+        self.update_count_label()
+        # 列表不足一屏时无法滚动，布局完成后检查是否需要继续加载
+        QtCore.QTimer.singleShot(0, self._maybe_load_more)
+
+    def update_count_label(self):
+        """显示已加载条目数"""
+        if not self.pan or self.search_keyword:
+            self.lbl_count.setText("")
             return
-            
-        item = self.pan.list[index]
-        row = self.table.rowCount()
-        self.table.insertRow(row)
-        
-        # 添加文件图标
-        icon = self.get_file_icon(item)
-        icon_item = QtWidgets.QTableWidgetItem()
-        icon_item.setIcon(icon)
-        self.table.setItem(row, 0, icon_item)
-        
-        # 设置列宽，图标列不需要太宽
-        self.table.setColumnWidth(0, 40)
-        
-        # 编号
-        self.table.setItem(row, 1, QtWidgets.QTableWidgetItem(str(index + 1)))
-        
-        # 文件名
-        name_item = QtWidgets.QTableWidgetItem(item.get("FileName", ""))
-        # 文件夹使用粗体
-        if item.get("Type", 0) == 1:
-            font = name_item.font()
-            font.setBold(True)
-            name_item.setFont(font)
-        self.table.setItem(row, 2, name_item)
-        
-        # 文件类型
-        typ = "文件夹" if item.get("Type", 0) == 1 else "文件"
-        self.table.setItem(row, 3, QtWidgets.QTableWidgetItem(typ))
-        
-        # 文件大小
-        size = item.get("Size", 0)
-        if size > 1073741824:
-            s = f"{round(size / 1073741824, 2)} GB"
-        elif size > 1048576:
-            s = f"{round(size / 1048576, 2)} MB"
+        total = max(self.pan.total, len(self.pan.list))
+        suffix = "（加载中...）" if self.loading_more else ""
+        self.lbl_count.setText(f"已加载 {len(self.pan.list)} / {total}{suffix}")
+
+    def _maybe_load_more(self, *args):
+        """可见区域下方剩余不足一页时加载下一页，保证始终预取一页"""
+        if (not self.pan or self.loading_more or self.pan.all_file
+                or self.search_keyword or not self.table.isVisible()):
+            return
+        last_visible = self.table.rowAt(self.table.viewport().height() - 1)
+        if last_visible < 0:
+            last_visible = self.file_proxy.rowCount() - 1
+        remaining = self.file_proxy.rowCount() - 1 - last_visible
+        if remaining < self.pan.page_size:
+            self.load_more()
+
+    def load_more(self):
+        """在后台获取下一页并追加到列表末尾"""
+        if not self.pan or self.loading_more or self.search_keyword:
+            return
+        if self.pan.all_file:
+            self.status.showMessage("已加载全部文件", 3000)
+            return
+        self.loading_more = True
+        self.update_count_label()
+        task = ThreadedTask(self._task_load_more, self.pan.parent_file_id, self.pan.file_page + 1)
+        task.signals.result.connect(self._after_load_more)
+        task.signals.error.connect(lambda e: (
+            setattr(self, "loading_more", False),
+            self.update_count_label(),
+            self.status.showMessage("加载更多失败: " + e, 5000)
+        ))
+        self.threadpool.start(task)
+
+    def _task_load_more(self, file_id, page, signals=None, task=None):
+        code, lists, total = self.pan.fetch_dir(file_id, page, 1)
+        return file_id, page, code, lists, total
+
+    def _after_load_more(self, result):
+        file_id, page, code, lists, total = result
+        self.loading_more = False
+        # 目录已切换或列表已被重新加载时丢弃结果
+        if (not self.pan or self.search_keyword or self.pan.parent_file_id != file_id
+                or self.pan.file_page + 1 != page):
+            self.update_count_label()
+            return
+        if code != 0:
+            self.status.showMessage(f"加载更多失败，返回码: {code}", 5000)
+            self.update_count_label()
+            return
+        if page == 1:
+            # 列表中可能是尚未与服务器校准的本地索引条目，第一页替换而不是追加
+            self.pan.set_dir(lists, total)
         else:
-            s = f"{round(size / 1024, 2)} KB"
-        self.table.setItem(row, 4, QtWidgets.QTableWidgetItem(s))
+            self.pan.append_dir(lists, total)
+        self.populate_table()
 
     def update_spinner(self):
         """更新旋转动画"""
@@ -774,6 +870,8 @@ class MainWindow(QtWidgets.QMainWindow):
             QtWidgets.QMessageBox.information(self, "提示", "尚未初始化，请先登录。")
             return
         if reset_page:
+            self.search_keyword = ""
+            self.le_search.clear()
             self.pan.all_file = False
             self.pan.file_page = 0
             self.pan.list = []
@@ -809,10 +907,58 @@ class MainWindow(QtWidgets.QMainWindow):
             self.status.showMessage("目录获取完成", 3000)
         self.populate_table()
 
+    def revalidate_dir(self):
+        """当前目录已用缓存或本地索引显示，过期时在后台向服务器校准"""
+        if not self.pan or self.pan.dir_is_fresh():
+            return
+        if not self.pan.list:
+            # 索引中没有该目录，只能等待服务器返回
+            self.refresh_file_list(reset_page=True)
+            return
+        self.status.showMessage("正在同步目录...")
+        task = ThreadedTask(self._task_reload_dir, self.pan.parent_file_id)
+        task.signals.result.connect(self._after_reload_dir)
+        task.signals.error.connect(lambda e: self.status.showMessage("同步目录失败: " + e, 5000))
+        self.threadpool.start(task)
+
+    def _task_reload_dir(self, file_id, signals=None, task=None):
+        code, lists, total = self.pan.fetch_dir(file_id, 1, self.pan.get_pages)
+        return file_id, code, lists, total
+
+    def _after_reload_dir(self, result):
+        file_id, code, lists, total = result
+        # 用户已切换到其他目录或正在搜索时丢弃结果
+        if not self.pan or self.search_keyword or self.pan.parent_file_id != file_id:
+            return
+        if code != 0:
+            self.status.showMessage(f"同步目录失败（返回码: {code}），显示本地索引", 5000)
+            return
+        self.pan.set_dir(lists, total)
+        self.status.showMessage("目录同步完成", 3000)
+        self.populate_table()
+
+    def on_search(self):
+        """在本地索引中搜索文件名"""
+        if not self.pan:
+            return
+        keyword = self.le_search.text().strip()
+        if not keyword:
+            if self.search_keyword:
+                self.search_keyword = ""
+                self.pan.restore_dir()
+                self.populate_table()
+                self.revalidate_dir()
+            return
+        self.search_keyword = keyword
+        self.pan.list = self.pan.search_index(keyword)
+        self.pan.all_file = True
+        self.populate_table()
+        self.status.showMessage(f"在本地索引中找到 {len(self.pan.list)} 项", 3000)
+
     def on_table_double(self, index):
-        row = index.row()
-        typ_item = self.table.item(row, 3)
-        if typ_item and typ_item.text() == "文件夹":
+        row = self.file_proxy.mapToSource(index).row()
+        item = self.file_model.item(row)
+        if item and item.get("Type", 0) == 1:
             try:
                 # 保存要进入的文件夹编号
                 self.target_folder_num = str(row + 1)
@@ -833,7 +979,15 @@ class MainWindow(QtWidgets.QMainWindow):
     def _after_fade_out_enter_folder(self):
         """淡出动画完成后执行的操作 - 进入文件夹"""
         try:
-            self.pan.cd(self.target_folder_num)
+            searching = bool(self.search_keyword)
+            self.search_keyword = ""
+            self.le_search.clear()
+            if searching:
+                # 搜索结果中的文件夹按其完整路径进入
+                detail = self.pan.list[int(self.target_folder_num) - 1]
+                self.pan.cd_by_detail(detail, fetch=False)
+            else:
+                self.pan.cd(self.target_folder_num, fetch=False)
             self.populate_table()
             # 添加淡入动画
             self.fade_animation = QtCore.QPropertyAnimation(self.table, b"windowOpacity")
@@ -841,6 +995,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.fade_animation.setStartValue(0.0)
             self.fade_animation.setEndValue(1.0)
             self.fade_animation.start()
+            self.revalidate_dir()
         except Exception as e:
             self._show_error("进入文件夹失败: " + str(e))
     
@@ -948,7 +1103,9 @@ class MainWindow(QtWidgets.QMainWindow):
         a_delete = menu.addAction("删除")
         a_share = menu.addAction("分享")
         action = menu.exec(self.table.viewport().mapToGlobal(pos))
-        self.table.selectRow(row)
+        # 在已选中的多行上右键时保留多选
+        if not self.table.selectionModel().isRowSelected(row, QtCore.QModelIndex()):
+            self.table.selectRow(row)
         if action == a_download:
             self.on_download()
         elif action == a_link:
@@ -958,6 +1115,27 @@ class MainWindow(QtWidgets.QMainWindow):
         elif action == a_share:
             self.on_share()
 
+    def on_transfer_context_menu(self, pos):
+        """传输列表右键菜单：调整排队任务的顺序，清除已结束的任务"""
+        task = self.transfers.task_at(self.transfer_table.indexAt(pos).row())
+        task_id = task["id"] if task else None
+        menu = QtWidgets.QMenu()
+        a_front = a_back = None
+        if task_id is not None and self.scheduler.is_pending(task_id):
+            a_front = menu.addAction("优先开始")
+            a_back = menu.addAction("最后开始")
+            menu.addSeparator()
+        a_clear = menu.addAction("清除已结束的任务")
+        action = menu.exec(self.transfer_table.viewport().mapToGlobal(pos))
+        if action is None:
+            return
+        if action == a_front:
+            self.scheduler.move_to_front(task_id)
+        elif action == a_back:
+            self.scheduler.move_to_back(task_id)
+        elif action == a_clear:
+            self.clear_finished_transfers()
+
     def on_up(self):
         if not self.pan:
             return
@@ -975,7 +1153,13 @@ class MainWindow(QtWidgets.QMainWindow):
     def _after_fade_out_up(self):
         """淡出动画完成后执行的操作 - 返回上级"""
         try:
-            self.pan.cd("..")
+            searching = bool(self.search_keyword)
+            self.search_keyword = ""
+            self.le_search.clear()
+            if searching:
+                self.pan.restore_dir()
+            else:
+                self.pan.cd("..", fetch=False)
             self.populate_table()
             # 添加淡入动画
             self.fade_animation = QtCore.QPropertyAnimation(self.table, b"windowOpacity")
@@ -983,6 +1167,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.fade_animation.setStartValue(0.0)
             self.fade_animation.setEndValue(1.0)
             self.fade_animation.start()
+            self.revalidate_dir()
         except Exception as e:
             self._show_error("返回上级失败: " + str(e))
     
@@ -1027,6 +1212,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.btn_share.setVisible(True)
             self.btn_link.setVisible(True)
             self.btn_upload.setVisible(True)
+            self.btn_upload_folder.setVisible(True)
             self.btn_mkdir.setVisible(True)
         else:  # 传输页面
             self.path_widget.setVisible(False)
@@ -1038,6 +1224,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.btn_share.setVisible(False)
             self.btn_link.setVisible(False)
             self.btn_upload.setVisible(False)
+            self.btn_upload_folder.setVisible(False)
             self.btn_mkdir.setVisible(False)
     
     def on_sidebar_button_hover(self, button):
@@ -1166,197 +1353,267 @@ class MainWindow(QtWidgets.QMainWindow):
 
     
     def add_transfer_task(self, type_str, name, size):
-            # 确保 UI 操作在主线程
-            row = self.transfer_table.rowCount()
-            self.transfer_table.insertRow(row)
+        """在传输列表末尾添加任务，返回 task_id"""
+        task_id = self.next_task_id
+        self.next_task_id += 1
+        self.transfers.add_task({
+            "id": task_id,
+            "type": type_str,
+            "name": name,
+            "size": size,
+            "progress": 0,
+            "status": "等待中",
+            "file_path": None,
+            "threaded_task": None,
+            # 进行中的进度计数，结束后置为 None
+            "tracker": TransferProgress(size),
+            "paused": False,
+            # 传输队列中的记录 id
+            "job_id": None,
+        })
+        return task_id
+
+    def transfer_progress(self, task_id):
+        """任务的 TransferProgress，交给工作线程记录进度"""
+        task = self.transfers.task(task_id)
+        return task["tracker"] if task else None
 
-            task_id = self.next_task_id
-            self.next_task_id += 1
+    def update_transfer_task(self, task_id, progress, status):
+        """根据 task_id 更新传输列表中的任务，结束状态会停止定时刷新"""
+        changes = {}
+        if progress is not None:
+            changes["progress"] = progress
+        if status:
+            changes["status"] = status
+        self.transfers.update_task(task_id, **changes)
 
-            # 把 task_id 绑定到 Item 上
-            name_item = QtWidgets.QTableWidgetItem(name)
-            name_item.setData(QtCore.Qt.ItemDataRole.UserRole, task_id)
+    def cancel_transfer_task(self, task_id):
+        """取消传输任务并删除未完成的下载文件"""
+        task = self.transfers.task(task_id)
+        if task is None:
+            return
+        # 取消线程任务
+        if task.get("threaded_task"):
+            task["threaded_task"].cancel()
+        self.scheduler.remove(task_id)
 
-            self.transfer_table.setItem(row, 0, QtWidgets.QTableWidgetItem(type_str))
-            self.transfer_table.setItem(row, 1, name_item)
+        # 如果是下载任务，删除临时文件
+        if task["type"] == "下载" and task.get("file_path") and os.path.exists(task["file_path"]):
+            try:
+                os.remove(task["file_path"])
+                # 也检查是否有最终文件存在（如果下载已完成但未清理）
+                final_path = task["file_path"].replace(".123pan", "")
+                if os.path.exists(final_path):
+                    os.remove(final_path)
+            except Exception as e:
+                print(f"删除文件失败: {e}")
 
-            # 格式化大小
-            s = f"{round(size / 1048576, 2)} MB" if size > 1048576 else f"{round(size / 1024, 2)} KB"
-            self.transfer_table.setItem(row, 2, QtWidgets.QTableWidgetItem(s))
-            self.transfer_table.setItem(row, 3, QtWidgets.QTableWidgetItem("0%"))
-            self.transfer_table.setItem(row, 4, QtWidgets.QTableWidgetItem("等待中"))
-            
-            # 创建并初始化任务字典，添加到transfer_tasks列表中
-            task = {
-                "id": task_id,
-                "type": type_str,
-                "name": name,
-                "size": size,
-                "progress": 0,
-                "status": "等待中",
-                "file_path": None,
-                "threaded_task": None,
-                "pause_button": None,
-                "cancel_button": None,
-                "row": row
-            }
-            self.transfer_tasks.append(task)
+        self._set_job_state(task_id, CANCELLED)
+        self.transfers.update_task(task_id, progress=0, status="已取消")
+        # 从活动任务列表中移除
+        self.active_tasks.pop(task_id, None)
 
-            # 添加操作按钮
-            action_widget = self.create_action_buttons(task_id)
-            self.transfer_table.setCellWidget(row, 5, action_widget)
+    def pause_transfer_task(self, task_id):
+        """切换暂停/继续传输任务"""
+        self.toggle_task_pause(task_id)
 
-            return task_id
+    def remove_transfer_task(self, task_id):
+        """移除传输任务"""
+        self.transfers.remove_task(task_id)
+        self.active_tasks.pop(task_id, None)
 
-    def create_action_buttons(self, task_id):
-        container = QtWidgets.QWidget()
-        layout = QtWidgets.QHBoxLayout(container)
-        
-        # 暂停/恢复按钮
-        pause_btn = QtWidgets.QPushButton("暂停")
-        # 取消按钮
-        cancel_btn = QtWidgets.QPushButton("取消")
-        
-        # 设置按钮固定大小，防止被 QSS 拉伸变形
-        pause_btn.setFixedSize(60, 24)
-        cancel_btn.setFixedSize(60, 24)
-        
-        # 可以在这里为这些按钮添加特定的对象名，以便单独设置样式
-        pause_btn.setObjectName("transferActionBtn")
-        cancel_btn.setObjectName("transferActionBtn")
-        
-        # 连接按钮信号到处理函数
-        pause_btn.clicked.connect(lambda: self.toggle_task_pause(task_id, pause_btn))
-        cancel_btn.clicked.connect(lambda: self.cancel_task(task_id))
-        
-        # 保存按钮引用到任务中，便于后续更新
-        for i, t in enumerate(self.transfer_tasks):
-            if t["id"] == task_id:
-                self.transfer_tasks[i]['pause_button'] = pause_btn
-                self.transfer_tasks[i]['cancel_button'] = cancel_btn
-                break
-
-        layout.addWidget(pause_btn)
-        layout.addWidget(cancel_btn)
-        layout.setContentsMargins(5, 2, 5, 2)
-        layout.setSpacing(10)
-        layout.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
-        
-        return container
+    def clear_finished_transfers(self):
+        """从传输列表中移除已完成、失败、已取消、已停止的任务（一次批量移除）"""
+        finished = [t["id"] for t in self.transfers.tasks() if t["status"] in FINISHED_STATUSES]
+        self.transfers.remove_tasks(finished)
     
-    def update_transfer_task(self, task_id, progress, status):
-            """根据 task_id 安全地更新传输列表中的某一行"""
-            # 遍历表格找到匹配 task_id 的行（假设我们将 task_id 存储在某列的数据角色中）
-            found_row = -1
-            for row in range(self.transfer_table.rowCount()):
-                item = self.transfer_table.item(row, 1) # 获取文件名那一列
-                if item and item.data(QtCore.Qt.ItemDataRole.UserRole) == task_id:
-                    found_row = row
-                    break
-            
-            if found_row == -1:
+    def start_transfer(self, kind, source, destination, paused=False, job=None, quiet=False):
+        """创建传输任务并交给调度器，返回 task_id；无法开始时返回 None
+
+        kind / source / destination 的含义见 TransferQueue。新任务会写入传输队列，
+        job 为从传输队列恢复的任务记录。quiet 为真时出错只在状态栏提示，不弹窗。
+        """
+        if kind == "upload_file":
+            if not os.path.isfile(source):
+                logger.warning(f"文件不存在: {source}")
+                if job and self.transfer_queue:
+                    self.transfer_queue.set_state(job["job_id"], FAILED)
+                return None
+            type_str, name, size = "上传", os.path.basename(source), os.path.getsize(source)
+            label, done_text, failed_progress = "上传", "上传完成", 0
+        elif kind == "upload_folder":
+            if not os.path.isdir(source):
+                logger.warning(f"文件夹不存在: {source}")
+                if job and self.transfer_queue:
+                    self.transfer_queue.set_state(job["job_id"], FAILED)
+                return None
+            type_str, name, size = "上传", os.path.basename(source) + "/", 0
+            label, done_text, failed_progress = "文件夹上传", "文件夹上传完成", None
+        elif kind == "download":
+            type_str = "下载"
+            if len(source) == 1:
+                name = source[0].get("FileName", "未知文件")
+                size = source[0].get("Size", 0)
+            else:
+                name = f"{source[0].get('FileName', '未知文件')} 等 {len(source)} 项"
+                size = sum(d.get("Size", 0) for d in source if d.get("Type", 0) != 1)
+            label, done_text, failed_progress = "下载", "下载完成", 0
+        else:
+            raise ValueError(f"未知的传输类别: {kind}")
+
+        task_id = self.add_transfer_task(type_str, name, size)
+        record = self.transfers.task(task_id)
+        if job is not None:
+            record["job_id"] = job["job_id"]
+            if size:
+                record["progress"] = min(100, int(job["done_bytes"] * 100 / size))
+        elif self.transfer_queue:
+            try:
+                record["job_id"] = self.transfer_queue.add(kind, name, size, source, destination)
+            except Exception as e:
+                logger.error(f"写入传输队列失败: {e}")
+
+        progress = self.transfer_progress(task_id)
+        if kind == "upload_file":
+            task = ThreadedTask(self._task_upload_file, source, destination["duplicate"], task_id,
+                                destination["parent_id"], progress=progress)
+        elif kind == "upload_folder":
+            task = ThreadedTask(self._task_upload_folder, source, destination["parent_id"],
+                                destination.get("duplicate", 2), progress=progress)
+        elif len(source) == 1:
+            task = ThreadedTask(self._task_get_download_and_stream, source[0], destination["path"], task_id,
+                                progress=progress)
+        else:
+            task = ThreadedTask(self._task_download_batch, source, destination["path"],
+                                destination.get("overwrite", False), progress=progress)
+
+        # 保存任务对象引用
+        record["threaded_task"] = task
+        self.active_tasks[task_id] = task
+
+        def on_result(r, tid=task_id):
+            self.active_tasks.pop(tid, None)
+            # 被取消的任务在 cancel_task 中已经更新状态
+            if r == "已取消":
                 return
+            self.status.showMessage(done_text if kind != "download" else f"{done_text}: {r}", 5000)
+            self._set_job_state(tid, DONE)
+            self.update_transfer_task(tid, 100, "已完成")
+            if kind != "download":
+                self._after_upload(destination["parent_id"])
+
+        def on_error(e, tid=task_id):
+            self.active_tasks.pop(tid, None)
+            if quiet:
+                self.status.showMessage(f"{label}失败: {e}", 5000)
+            else:
+                self._show_error(f"{label}失败: " + e)
+            self._set_job_state(tid, FAILED)
+            self.update_transfer_task(tid, failed_progress, "失败")
+            if kind == "upload_folder":
+                self._after_upload(destination["parent_id"])
+
+        task.signals.result.connect(on_result)
+        task.signals.error.connect(on_error)
+        task.signals.finished.connect(lambda tid=task_id: self.active_tasks.pop(tid, None))
+        if paused:
+            # 恢复的暂停任务不进入调度，用户点击恢复后才排队开始，不占任务和连接名额
+            task.pause()
+            progress.paused = True
+            self.transfers.update_task(task_id, paused=True, status="已暂停")
+        self.scheduler.submit(task_id, task, "download" if kind == "download" else "upload", paused=paused)
+        return task_id
+
+    def _set_job_state(self, task_id, state):
+        """把任务状态写入传输队列"""
+        record = self.transfers.task(task_id)
+        if not record or record.get("job_id") is None or not self.transfer_queue:
+            return
+        # 尚未开始传输（如恢复后仍在排队）时保留上次记录的字节数
+        done = (record["tracker"].done if record.get("tracker") else 0) or None
+        try:
+            self.transfer_queue.set_state(record["job_id"], state, done)
+        except Exception as e:
+            logger.warning(f"更新传输队列失败: {e}")
 
-            # 更新进度 (第3列)
-            if progress is not None:
-                self.transfer_table.item(found_row, 3).setText(f"{progress}%")
-                
-            # 更新状态 (第4列)
-            if status:
-                self.transfer_table.item(found_row, 4).setText(status)
-    
-    def cancel_transfer_task(self, task_id):
-        """取消传输任务"""
-        # 查找任务
-        for i, task in enumerate(self.transfer_tasks):
-            if task["id"] == task_id:
-                # 取消线程任务
-                if task.get("threaded_task"):
-                    task["threaded_task"].cancel()
-                
-                # 如果是下载任务，删除临时文件
-                if task["type"] == "下载" and task.get("file_path") and os.path.exists(task["file_path"]):
-                    try:
-                        os.remove(task["file_path"])
-                        # 也检查是否有最终文件存在（如果下载已完成但未清理）
-                        final_path = task["file_path"].replace(".123pan", "")
-                        if os.path.exists(final_path):
-                            os.remove(final_path)
-                    except Exception as e:
-                        print(f"删除文件失败: {e}")
-                
-                # 更新任务状态
-                task["status"] = "已取消"
-                task["progress"] = 0
-                self.transfer_table.setItem(i, 3, QtWidgets.QTableWidgetItem("0%"))
-                self.transfer_table.setItem(i, 4, QtWidgets.QTableWidgetItem("已取消"))
-                
-                # 隐藏按钮容器
-                widget = self.transfer_table.cellWidget(i, 5)
-                if widget:
-                    widget.setVisible(False)
-                # 也隐藏单独的按钮引用（若存在）
-                if task.get('pause_button'):
-                    try:
-                        task['pause_button'].setVisible(False)
-                    except Exception:
-                        pass
-                if task.get('cancel_button'):
-                    try:
-                        task['cancel_button'].setVisible(False)
-                    except Exception:
-                        pass
-                
-                # 从活动任务列表中移除
-                if task_id in self.active_tasks:
-                    del self.active_tasks[task_id]
-                
-                break
+    def open_transfer_queue(self):
+        """打开当前账号的传输队列，并恢复上次未完成的任务"""
+        self.close_transfer_queue()
+        try:
+            self.transfer_queue = TransferQueue(queue_path_for_user(self.pan.user_name))
+            self.transfer_queue.prune()
+            jobs = self.transfer_queue.unfinished()
+        except Exception as e:
+            logger.error(f"打开传输队列失败: {e}")
+            self.transfer_queue = None
+            return
+        if not jobs:
+            return
+        if not ConfigManager.get_setting("resumeTransfers", True):
+            for job in jobs:
+                self.transfer_queue.set_state(job["job_id"], CANCELLED)
+            return
+        restored = 0
+        for job in jobs:
+            try:
+                if self.start_transfer(job["kind"], job["source"], job["destination"],
+                                       paused=job["state"] == PAUSED, job=job, quiet=True) is not None:
+                    restored += 1
+            except Exception as e:
+                logger.error(f"恢复传输任务失败 {job['name']}: {e}")
+                self.transfer_queue.set_state(job["job_id"], FAILED)
+        logger.info(f"已恢复 {restored} 个未完成的传输任务")
+        if restored:
+            self.status.showMessage(f"已恢复 {restored} 个未完成的传输任务", 5000)
+
+    def save_transfer_queue(self):
+        """定时把进行中任务的已完成字节数写入传输队列"""
+        if not self.transfer_queue:
+            return
+        progress = {
+            t["job_id"]: t["tracker"].done
+            for t in self.transfers.running()
+            if t.get("job_id") is not None and t["tracker"].done
+        }
+        try:
+            self.transfer_queue.save_progress(progress)
+        except Exception as e:
+            logger.warning(f"保存传输进度失败: {e}")
+
+    def stop_transfers(self, timeout_ms=STOP_WAIT_MS):
+        """停止全部传输并等待工作线程结束，之后才能关闭传输队列和 pan
+
+        任务被停止而非取消：下载的临时文件和断点信息会保留，
+        传输队列中的状态不变（进行中的仍为 pending），下次打开队列时继续。
+        """
+        tasks = list(self.active_tasks.items())
+        if not tasks:
+            return
+        for task_id, task in tasks:
+            self.scheduler.remove(task_id)
+            task.stop()
+        if not self.threadpool.waitForDone(timeout_ms):
+            logger.warning("部分传输线程未在限定时间内结束")
+        # 线程结束后再写入进度，此时断点信息已保存
+        self.save_transfer_queue()
+        for task_id, _ in tasks:
+            self.update_transfer_task(task_id, None, "已停止")
+        self.active_tasks.clear()
+
+    def close_transfer_queue(self):
+        """保存进度并关闭传输队列，未完成的任务下次启动时恢复"""
+        if not self.transfer_queue:
+            return
+        self.save_transfer_queue()
+        try:
+            self.transfer_queue.close()
+        except Exception:
+            pass
+        self.transfer_queue = None
+        # 之后再打开的可能是其他账号的队列，已有任务不再与其关联
+        for t in self.transfers.tasks():
+            t["job_id"] = None
 
-    def pause_transfer_task(self, task_id):
-        """切换暂停/继续传输任务"""
-        for i, task in enumerate(self.transfer_tasks):
-            if task["id"] == task_id:
-                threaded = task.get("threaded_task")
-                pause_btn = task.get('pause_button')
-                if not threaded:
-                    return
-                # 切换状态
-                if getattr(threaded, 'is_paused', False):
-                    try:
-                        threaded.resume()
-                    except Exception:
-                        pass
-                    task["status"] = "下载中"
-                    if pause_btn:
-                        pause_btn.setText("暂停")
-                else:
-                    try:
-                        threaded.pause()
-                    except Exception:
-                        pass
-                    task["status"] = "已暂停"
-                    if pause_btn:
-                        pause_btn.setText("继续")
-
-                # 更新表格显示
-                self.transfer_table.setItem(i, 4, QtWidgets.QTableWidgetItem(task["status"]))
-                break
-    
-    def remove_transfer_task(self, task_id):
-        """移除传输任务"""
-        # 查找任务
-        for i, task in enumerate(self.transfer_tasks):
-            if task["id"] == task_id:
-                # 从列表中移除
-                self.transfer_tasks.pop(i)
-                # 从表格中移除
-                self.transfer_table.removeRow(i)
-                # 从活动任务列表中移除
-                if task_id in self.active_tasks:
-                    del self.active_tasks[task_id]
-                break
-    
     def format_file_size(self, size):
         """格式化文件大小"""
         if size > 1073741824:
@@ -1373,18 +1630,34 @@ class MainWindow(QtWidgets.QMainWindow):
         if row is None:
             return None, None
         try:
-            # 直接使用行索引作为文件索引，更可靠
-            if not self.pan or row < 0 or row >= len(self.pan.list):
+            # 行号已映射为数据模型中的下标
+            detail = self.file_model.item(row) if self.pan else None
+            if detail is None:
                 self._show_error("无效的选择行")
                 return None, None
-            return row, self.pan.list[row]
+            return row, detail
         except Exception as e:
             self._show_error(f"获取选中文件失败: {str(e)}")
             return None, None
 
+    def get_selected_details(self):
+        """返回所有选中行的 (下标, 文件详情)，按行号排序"""
+        rows = self.table.selectionModel().selectedRows()
+        if not rows:
+            QtWidgets.QMessageBox.information(self, "提示", "请先选择一项。")
+            return []
+        selected = []
+        for index in rows:
+            row = self.file_proxy.mapToSource(index).row()
+            detail = self.file_model.item(row) if self.pan else None
+            if detail is not None:
+                selected.append((row, detail))
+        selected.sort(key=lambda x: x[0])
+        return selected
+
     def on_download(self):
-        file_index, file_detail = self.get_selected_detail()
-        if file_detail is None:
+        selected = self.get_selected_details()
+        if not selected:
             return
         
         # 获取设置
@@ -1400,224 +1673,76 @@ class MainWindow(QtWidgets.QMainWindow):
             if not download_dir:
                 return
         
-        file_name = file_detail.get("FileName", "未知文件")
-        file_size = file_detail.get("Size", 0)
-        
-        # 添加传输任务
-        task_id = self.add_transfer_task("下载", file_name, file_size)
-        
+        # 已存在的文件在这里统一询问一次，不在后台线程中逐个弹窗
+        existing = {
+            d["FileId"] for _, d in selected
+            if d.get("Type", 0) != 1 and os.path.exists(os.path.join(download_dir, d["FileName"]))
+        }
+        overwrite = False
+        if existing:
+            first = next(d["FileName"] for _, d in selected if d["FileId"] in existing)
+            names = first if len(existing) == 1 else f"{first} 等 {len(existing)} 个文件"
+            reply = QtWidgets.QMessageBox.question(
+                self, "文件已存在", f"{names} 已存在，是否覆盖？",
+                QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
+            )
+            if reply == QtWidgets.QMessageBox.StandardButton.No:
+                selected = [(i, d) for i, d in selected if d["FileId"] not in existing]
+                if not selected:
+                    return
+            else:
+                overwrite = True
+
         self.status.showMessage("正在解析下载链接...")
-        task = ThreadedTask(self._task_get_download_and_stream, file_index, download_dir, task_id)
-        
-        # 保存任务对象引用
-        for i, t in enumerate(self.transfer_tasks):
-            if t["id"] == task_id:
-                self.transfer_tasks[i]["threaded_task"] = task
-                break
-        
-        self.active_tasks[task_id] = task
-        
-        task.signals.progress.connect(lambda p, tid=task_id: (
-            self.status.showMessage(f"下载进度: {p}%", 2000),
-            self.update_transfer_task(tid, p, "下载中")
-        ))
-        def on_task_finished(tid):
-            if tid in self.active_tasks:
-                del self.active_tasks[tid]
-        
-        task.signals.result.connect(lambda r, tid=task_id: (
-            self.status.showMessage("下载完成: " + str(r), 5000),
-            self.update_transfer_task(tid, 100, "已完成"),
-            on_task_finished(tid)
-        ))
-        task.signals.error.connect(lambda e, tid=task_id: (
-            self._show_error("下载失败: " + e),
-            self.update_transfer_task(tid, 0, "失败"),
-            on_task_finished(tid)
-        ))
-        task.signals.finished.connect(lambda tid=task_id: on_task_finished(tid))
-        self.threadpool.start(task)
+        # 多选时所有条目合并为一个传输任务，链接并发解析，文件并发下载
+        self.start_transfer("download", [d for _, d in selected],
+                            {"path": download_dir, "overwrite": overwrite})
+
+    def _task_download_batch(self, details, download_dir, overwrite=False, progress=None,
+                             signals=None, task=None):
+        downloader = BatchDownloader(
+            self.pan, details, download_dir,
+            task=task,
+            on_status=progress.set_status,
+            progress=progress,
+            overwrite=overwrite,
+        )
+        return downloader.run()
 
-    def _task_get_download_and_stream(self, file_index, download_dir, task_id, signals=None, task=None):
-        file_detail = self.pan.list[file_index]
+    def _task_get_download_and_stream(self, file_detail, download_dir, task_id, progress=None,
+                                      signals=None, task=None):
         if file_detail["Type"] == 1:
-            redirect_url = self.pan.link_by_fileDetail(file_detail, showlink=False)
-        else:
-            redirect_url = self.pan.link_by_number(file_index, showlink=False)
+            # 文件夹保持目录结构，多个文件并发下载
+            downloader = FolderDownloader(
+                self.pan, file_detail, download_dir,
+                task=task,
+                on_status=progress.set_status,
+                progress=progress,
+            )
+            return downloader.run()
+        redirect_url = self.pan.link_by_fileDetail(file_detail, showlink=False)
         if isinstance(redirect_url, int):
             raise RuntimeError("获取下载链接失败，返回码: " + str(redirect_url))
-        if file_detail["Type"] == 1:
-            fname = file_detail["FileName"] + ".zip"
-        else:
-            fname = file_detail["FileName"]
+        fname = file_detail["FileName"]
         out_path = os.path.join(download_dir, fname)
         temp = out_path + ".123pan"
 
-        # 保存文件路径到任务对象
-        for i, t in enumerate(self.transfer_tasks):
-            if t["id"] == task_id:
-                self.transfer_tasks[i]["file_path"] = temp
-                break
-
-        if os.path.exists(out_path):
-            reply = QtWidgets.QMessageBox.question(None, "文件已存在", f"{fname} 已存在，是否覆盖？", QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No)
-            if reply == QtWidgets.QMessageBox.StandardButton.No:
-                return "已取消"
-
-        # 尝试获取头信息，判断是否支持 Range
-        total = 0
-        accept_ranges = False
-        try:
-            head = requests.head(redirect_url, allow_redirects=True, timeout=30)
-            head.raise_for_status()
-            total = int(head.headers.get("Content-Length", 0) or 0)
-            accept_ranges = head.headers.get("Accept-Ranges", "").lower() == "bytes"
-        except Exception:
-            # 有些链接不支持 HEAD，使用 GET 获取 headers
-            try:
-                with requests.get(redirect_url, stream=True, timeout=30) as r:
-                    r.raise_for_status()
-                    total = int(r.headers.get("Content-Length", 0) or 0)
-                    accept_ranges = r.headers.get("Accept-Ranges", "").lower() == "bytes"
-            except Exception:
-                total = 0
-                accept_ranges = False
-
-        # 如果支持分片并且文件较大，则采用多线程分片下载
-        try:
-            if accept_ranges and total and total > 1024 * 1024 * 2:
-                # 计算分片数（最多 8 片）
-                num_threads = min(8, max(1, int(total / (5 * 1024 * 1024))))
-                part_size = total // num_threads
-                parts = []
-                downloaded = [0]
-                dl_lock = threading.Lock()
-
-                def download_range(start, end, index):
-                    part_path = f"{temp}.part{index}"
-                    headers = {"Range": f"bytes={start}-{end}"}
-                    try:
-                        with requests.get(redirect_url, headers=headers, stream=True, timeout=30) as r:
-                            r.raise_for_status()
-                            with open(part_path, "wb") as pf:
-                                for chunk in r.iter_content(chunk_size=8192):
-                                    # 支持暂停/继续
-                                    if task:
-                                        # wait 如果被暂停，会在这里阻塞
-                                        try:
-                                            task._pause_event.wait()
-                                        except Exception:
-                                            pass
-                                        if task.is_cancelled:
-                                            return False
-                                    if chunk:
-                                        pf.write(chunk)
-                                        with dl_lock:
-                                            downloaded[0] += len(chunk)
-                                            if total and signals:
-                                                signals.progress.emit(int(downloaded[0] * 100 / total))
-                        return True
-                    except Exception:
-                        # 出错时确保部分文件被删除
-                        if os.path.exists(part_path):
-                            try:
-                                os.remove(part_path)
-                            except Exception:
-                                pass
-                        return False
-
-                # 提交分片任务
-                futures = []
-                with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as exe:
-                    for i in range(num_threads):
-                        start = i * part_size
-                        end = (start + part_size - 1) if i < num_threads - 1 else (total - 1)
-                        futures.append(exe.submit(download_range, start, end, i))
-
-                    # 等待完成
-                    ok = True
-                    for f in concurrent.futures.as_completed(futures):
-                        if not f.result():
-                            ok = False
-                            break
-
-                if not ok:
-                    # 清理部分文件
-                    for i in range(num_threads):
-                        p = f"{temp}.part{i}"
-                        if os.path.exists(p):
-                            try:
-                                os.remove(p)
-                            except Exception:
-                                pass
-                    raise RuntimeError("分片下载失败")
-                if task and task.is_cancelled:
-                    for i in range(num_threads):
-                        p = f"{temp}.part{i}"
-                        if os.path.exists(p):
-                            try:
-                                os.remove(p)
-                            except Exception:
-                                pass
-                    return "已取消"
-
-                # 合并部分文件
-                with open(temp, "wb") as out_f:
-                    for i in range(num_threads):
-                        p = f"{temp}.part{i}"
-                        with open(p, "rb") as pf:
-                            while True:
-                                chunk = pf.read(8192)
-                                if not chunk:
-                                    break
-                                out_f.write(chunk)
-                        try:
-                            os.remove(p)
-                        except Exception:
-                            pass
-
-                if task and task.is_cancelled:
-                    if os.path.exists(temp):
-                        os.remove(temp)
-                    return "已取消"
-                os.replace(temp, out_path)
-                return out_path
-            else:
-                # 单线程流式下载，支持暂停/取消
-                with requests.get(redirect_url, stream=True, timeout=30) as r:
-                    r.raise_for_status()
-                    done = 0
-                    with open(temp, "wb") as f:
-                        for chunk in r.iter_content(chunk_size=8192):
-                            if task:
-                                try:
-                                    task._pause_event.wait()
-                                except Exception:
-                                    pass
-                                if task.is_cancelled:
-                                    f.close()
-                                    if os.path.exists(temp):
-                                        os.remove(temp)
-                                    return "已取消"
-                            if chunk:
-                                f.write(chunk)
-                                done += len(chunk)
-                                if total and signals:
-                                    signals.progress.emit(int(done * 100 / total))
-                if task and task.is_cancelled:
-                    if os.path.exists(temp):
-                        os.remove(temp)
-                    return "已取消"
-                os.replace(temp, out_path)
-                return out_path
-        except Exception as e:
-            # 如果发生异常，删除临时文件并抛出
-            if os.path.exists(temp):
-                try:
-                    os.remove(temp)
-                except Exception:
-                    pass
-            raise
+        # 保存文件路径到任务对象（工作线程中只写字段，不刷新视图）
+        self.transfers.task(task_id)["file_path"] = temp
+
+        progress.set_status("下载中")
+        # 分片下载，断点信息保存在临时文件旁，失败或暂停后可以续传
+        downloader = Downloader(
+            self.pan.session, redirect_url, out_path,
+            source={"FileId": file_detail["FileId"], "Etag": file_detail.get("Etag", "")},
+            task=task,
+            on_bytes=progress.add_bytes,
+            on_skip=progress.skip,
+            refresh_url=lambda: self.pan.refresh_link(file_detail),
+            budget=self.pan.budget,
+            bandwidth=self.pan.bandwidth,
+        )
+        return downloader.run()
 
     def on_showlink(self):
         file_index, file_detail = self.get_selected_detail()
@@ -1669,7 +1794,6 @@ class MainWindow(QtWidgets.QMainWindow):
         if not path:
             return
         fname = os.path.basename(path)
-        file_size = os.path.getsize(path)
         same = [i for i in self.pan.list if i.get("FileName") == fname]
         dup_choice = 1
         if same:
@@ -1684,138 +1808,77 @@ class MainWindow(QtWidgets.QMainWindow):
             dup_choice = int(text.strip())
         
         # 添加传输任务
-        task_id = self.add_transfer_task("上传", fname, file_size)
-        
-        task = ThreadedTask(self._task_upload_file, path, dup_choice, task_id)
-        
-        # 保存任务对象引用
-        for i, t in enumerate(self.transfer_tasks):
-            if t["id"] == task_id:
-                self.transfer_tasks[i]["threaded_task"] = task
-                break
-        
-        self.active_tasks[task_id] = task
-        
-        def on_task_finished(tid):
-            if tid in self.active_tasks:
-                del self.active_tasks[tid]
-        
-        task.signals.progress.connect(lambda p, tid=task_id: (
-            self.status.showMessage(f"上传进度: {p}%", 2000),
-            self.update_transfer_task(tid, p, "上传中")
-        ))
-        task.signals.result.connect(lambda r, tid=task_id: (
-            self.status.showMessage("上传完成", 3000),
-            self.update_transfer_task(tid, 100, "已完成"),
-            self.refresh_file_list(reset_page=True),
-            on_task_finished(tid)
-        ))
-        task.signals.error.connect(lambda e, tid=task_id: (
-            self._show_error("上传失败: " + e),
-            self.update_transfer_task(tid, 0, "失败"),
-            on_task_finished(tid)
-        ))
-        task.signals.finished.connect(lambda tid=task_id: on_task_finished(tid))
-        self.threadpool.start(task)
+        self.start_transfer("upload_file", path, {"parent_id": self.pan.parent_file_id, "duplicate": dup_choice})
 
-    def _task_upload_file(self, file_path, dup_choice, task_id, signals=None, task=None):
+    def _after_upload(self, parent_id):
+        """上传完成后使目标文件夹缓存失效，若仍在该文件夹则后台刷新"""
+        if not self.pan:
+            return
+        self.pan.invalidate_dir(parent_id)
+        if self.pan.parent_file_id == parent_id and not self.search_keyword:
+            self.revalidate_dir()
+
+    def _task_upload_file(self, file_path, dup_choice, task_id, parent_id, progress=None, signals=None, task=None):
         file_path = file_path.replace('"', "").replace("\\", "/")
-        file_name = os.path.basename(file_path)
-        if not os.path.exists(file_path):
-            raise RuntimeError("文件不存在")
-        if os.path.isdir(file_path):
-            raise RuntimeError("不支持文件夹上传")
-        fsize = os.path.getsize(file_path)
         
         # 检查是否被取消
         if task and task.is_cancelled:
             return "已取消"
         
-        md5 = hashlib.md5()
-        with open(file_path, "rb") as f:
-            while True:
-                data = f.read(64 * 1024)
-                if not data:
-                    break
-                md5.update(data)
-                # 检查是否被取消
-                if task and task.is_cancelled:
-                    return "已取消"
-        readable_hash = md5.hexdigest()
-        
-        # 检查是否被取消
-        if task and task.is_cancelled:
-            return "已取消"
-        list_up_request = {
-            "driveId": 0,
-            "etag": readable_hash,
-            "fileName": file_name,
-            "parentFileId": self.pan.parent_file_id,
-            "size": fsize,
-            "type": 0,
-            "duplicate": 0,
-        }
-        url = "https://www.123pan.com/b/api/file/upload_request"
-        headers = self.pan.header_logined.copy()
-        res = requests.post(url, headers=headers, data=list_up_request, timeout=30)
-        res_json = res.json()
-        code = res_json.get("code", -1)
-        if code == 5060:
-            list_up_request["duplicate"] = dup_choice
-            res = requests.post(url, headers=headers, data=json.dumps(list_up_request), timeout=30)
-            res_json = res.json()
-            code = res_json.get("code", -1)
-        if code != 0:
-            raise RuntimeError("上传请求失败: " + json.dumps(res_json, ensure_ascii=False))
-        data = res_json["data"]
-        if data.get("Reuse"):
-            return "复用上传成功"
-        bucket = data["Bucket"]
-        storage_node = data["StorageNode"]
-        upload_key = data["Key"]
-        upload_id = data["UploadId"]
-        up_file_id = data["FileId"]
-        block_size = 5242880
-        total_sent = 0
-        part_number = 1
-        with open(file_path, "rb") as f:
-            while True:
-                block = f.read(block_size)
-                if not block:
-                    break
-                get_link_data = {
-                    "bucket": bucket,
-                    "key": upload_key,
-                    "partNumberEnd": part_number + 1,
-                    "partNumberStart": part_number,
-                    "uploadId": upload_id,
-                    "StorageNode": storage_node,
-                }
-                get_link_url = "https://www.123pan.com/b/api/file/s3_repare_upload_parts_batch"
-                get_link_res = requests.post(get_link_url, headers=headers, data=json.dumps(get_link_data), timeout=30)
-                get_link_res_json = get_link_res.json()
-                if get_link_res_json.get("code", -1) != 0:
-                    raise RuntimeError("获取上传链接失败: " + json.dumps(get_link_res_json, ensure_ascii=False))
-                upload_url = get_link_res_json["data"]["presignedUrls"][str(part_number)]
-                requests.put(upload_url, data=block, timeout=60)
-                total_sent += len(block)
-                if signals and fsize:
-                    signals.progress.emit(int(total_sent * 100 / fsize))
-                part_number += 1
-        uploaded_list_url = "https://www.123pan.com/b/api/file/s3_list_upload_parts"
-        uploaded_comp_data = {"bucket": bucket, "key": upload_key, "uploadId": upload_id, "storageNode": storage_node}
-        requests.post(uploaded_list_url, headers=headers, data=json.dumps(uploaded_comp_data), timeout=30)
-        compmultipart_up_url = "https://www.123pan.com/b/api/file/s3_complete_multipart_upload"
-        requests.post(compmultipart_up_url, headers=headers, data=json.dumps(uploaded_comp_data), timeout=30)
-        if fsize > 64 * 1024 * 1024:
-            time.sleep(3)
-        close_up_session_url = "https://www.123pan.com/b/api/file/upload_complete"
-        close_up_session_data = {"fileId": up_file_id}
-        close_res = requests.post(close_up_session_url, headers=headers, data=json.dumps(close_up_session_data), timeout=30)
-        cr = close_res.json()
-        if cr.get("code", -1) != 0:
-            raise RuntimeError("上传完成确认失败: " + json.dumps(cr, ensure_ascii=False))
-        return up_file_id
+        return upload_file(
+            self.pan.session, self.pan.header_logined.copy(), file_path, parent_id,
+            duplicate=dup_choice,
+            task=task,
+            on_progress=progress.set_percent,
+            on_status=progress.set_status,
+            on_bytes=progress.add_bytes,
+            on_skip=progress.skip,
+            cache=self.pan.fingerprints,
+            budget=self.pan.budget,
+            bandwidth=self.pan.bandwidth,
+        )
+
+    def on_upload_folder(self):
+        if not self.pan:
+            QtWidgets.QMessageBox.information(self, "提示", "请先登录。")
+            return
+        path = QtWidgets.QFileDialog.getExistingDirectory(self, "选择要上传的文件夹", os.path.expanduser("~"))
+        if not path:
+            return
+        self._upload_folder(path)
+
+    def _upload_folder(self, folder_path):
+        """上传文件夹（整个文件夹作为一个传输任务）"""
+        logger.info(f"准备上传文件夹: {folder_path}")
+        fname = os.path.basename(os.path.normpath(folder_path))
+        dup_choice = 2
+        # 远程已有同名文件夹时上传会合并进去，其中的同名文件统一询问一次
+        if any(i.get("FileName") == fname and i.get("Type", 0) == 1 for i in self.pan.list):
+            text, ok = QtWidgets.QInputDialog.getText(
+                self, "同名文件夹",
+                f"检测到同名文件夹: {fname}\n其中的同名文件: 1 覆盖; 2 保留两者; 0 取消（默认2）",
+                text="2"
+            )
+            if not ok:
+                return
+            if text.strip() not in ("0", "1", "2"):
+                QtWidgets.QMessageBox.information(self, "提示", "无效的选择，已取消")
+                return
+            if text.strip() == "0":
+                return
+            dup_choice = int(text.strip())
+        self.start_transfer("upload_folder", folder_path,
+                            {"parent_id": self.pan.parent_file_id, "duplicate": dup_choice})
+
+    def _task_upload_folder(self, folder_path, parent_id, duplicate=2, progress=None, signals=None, task=None):
+        uploader = FolderUploader(
+            self.pan, folder_path, parent_id,
+            task=task,
+            on_status=progress.set_status,
+            progress=progress,
+            duplicate=duplicate,
+        )
+        return uploader.run()
 
     def on_mkdir(self):
         if not self.pan:
@@ -1860,7 +1923,7 @@ class MainWindow(QtWidgets.QMainWindow):
         }
         headers = self.pan.header_logined.copy()
         try:
-            r = requests.post("https://www.123pan.com/a/api/share/create", headers=headers, data=json.dumps(data), timeout=30)
+            r = self.pan.session.post("https://www.123pan.com/a/api/share/create", headers=headers, data=json.dumps(data), timeout=30)
             jr = r.json()
             if jr.get("code", -1) != 0:
                 self._show_error("分享失败: " + jr.get("message", str(jr)))
@@ -1932,6 +1995,11 @@ class MainWindow(QtWidgets.QMainWindow):
             self.btn_files.setStyleSheet(self.get_sidebar_button_style(is_active=True))
         if hasattr(self, 'btn_transfer'):
             self.btn_transfer.setStyleSheet(self.get_sidebar_button_style(is_active=False))
+
+        # 图标按新主题重新绘制
+        self.icon_cache.clear()
+        if hasattr(self, 'file_model'):
+            self.file_model.refresh_icons()
     
     def closeEvent(self, event):
         # 停止所有计时器，防止线程冲突
@@ -1950,6 +2018,11 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.pan.save_file()
         except Exception:
             pass
+        # 未完成的传输保留在传输队列中，下次启动时继续
+        self.stop_transfers()
+        self.close_transfer_queue()
+        if self.pan:
+            self.pan.close()
         event.accept()
 
     def on_pause_clicked(self, task):
@@ -1962,27 +2035,38 @@ class MainWindow(QtWidgets.QMainWindow):
         if task_id in self.active_tasks:
             self.active_tasks[task_id].cancel()
 
-    def toggle_task_pause(self, task_id, button):
+    def toggle_task_pause(self, task_id):
         """处理暂停和恢复逻辑"""
         task = self.active_tasks.get(task_id)
         if not task: return
-        
-        if task.is_paused:
-            task.resume()
-            button.setText("暂停")
-            button.setStyleSheet(button.styleSheet().replace("#f9e2af", self.get_theme_color('accent')))
+
+        record = self.transfers.task(task_id)
+        # 恢复后可能仍在等待调度名额（任务本身尚未恢复），以列表中的状态为准
+        if record["paused"]:
+            self.scheduler.resume(task_id)
+            paused = False
         else:
             task.pause()
-            button.setText("恢复")
-            # 变成警告色（黄色）
-            button.setStyleSheet(button.styleSheet().replace(self.get_theme_color('accent'), "#f9e2af"))
-            self.update_transfer_task(task_id, None, "已暂停")
+            # 暂停的任务让出调度名额，下载连接也会归还
+            self.scheduler.pause(task_id)
+            paused = True
+        tracker = self.transfer_progress(task_id)
+        if tracker:
+            tracker.paused = paused
+        changes = {"paused": paused}
+        if not paused and tracker and tracker.status is None:
+            # 尚未开始运行（如恢复的暂停任务），回到排队状态
+            changes["status"] = "等待中"
+        self.transfers.update_task(task_id, **changes)
+        self._set_job_state(task_id, PAUSED if paused else PENDING)
 
     def cancel_task(self, task_id):
         """取消任务"""
         task = self.active_tasks.get(task_id)
         if task:
             task.cancel()
+            self.scheduler.remove(task_id)
+            self._set_job_state(task_id, CANCELLED)
             self.update_transfer_task(task_id, 0, "已取消")
             if task_id in self.active_tasks:
                 del self.active_tasks[task_id]
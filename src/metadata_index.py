@@ -0,0 +1,131 @@
+# https://github.com/123panNextGen/123pan
+# src/metadata_index.py
+
+"""云盘元数据本地索引（SQLite）"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from log import get_logger
+from config import ConfigManager, CONFIG_DIR
+
+logger = get_logger(__name__)
+
+
+def index_path_for_user(user_name):
+    """按账号生成索引文件路径，多个账号互不干扰"""
+    digest = hashlib.md5(str(user_name).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(CONFIG_DIR, f"index_{digest}.db")
+
+
+class MetadataIndex:
+    """以 FileId 为主键保存见过的每个文件/文件夹
+
+    除常用字段外还保存接口返回的完整条目（detail），
+    以便离线时可以直接当作 Pan123.list 中的元素使用。
+    """
+
+    def __init__(self, db_path):
+        ConfigManager.ensure_config_dir()
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    file_id INTEGER PRIMARY KEY,
+                    file_name TEXT NOT NULL,
+                    parent_file_id INTEGER NOT NULL,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    etag TEXT,
+                    type INTEGER NOT NULL DEFAULT 0,
+                    update_at TEXT,
+                    abs_path TEXT,
+                    detail TEXT NOT NULL,
+                    seen_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_files_parent ON files(parent_file_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_files_name ON files(file_name)")
+
+    @staticmethod
+    def _row(item, parent_id, now):
+        """把接口条目转换为表中的一行"""
+        return (
+            int(item["FileId"]),
+            item.get("FileName", ""),
+            int(parent_id),
+            int(item.get("Size", 0) or 0),
+            item.get("Etag", ""),
+            int(item.get("Type", 0) or 0),
+            item.get("UpdateAt", ""),
+            item.get("AbsPath", ""),
+            json.dumps(item, ensure_ascii=False),
+            now,
+        )
+
+    def upsert(self, parent_id, items):
+        """写入（或更新）某个文件夹下的若干条目"""
+        now = time.time()
+        rows = [self._row(i, parent_id, now) for i in items]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def replace_children(self, parent_id, items):
+        """用完整的列表替换文件夹内容，服务器上已不存在的条目会被删除"""
+        now = time.time()
+        rows = [self._row(i, parent_id, now) for i in items]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files WHERE parent_file_id = ?", (int(parent_id),))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def remove(self, file_ids):
+        """删除条目"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM files WHERE file_id = ?", [(int(i),) for i in file_ids]
+            )
+
+    def get(self, file_id):
+        """按 FileId 获取条目，不存在时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT detail FROM files WHERE file_id = ?", (int(file_id),)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def children(self, parent_id):
+        """获取文件夹下的条目，顺序与服务器一致（file_id 倒序）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT detail FROM files WHERE parent_file_id = ? ORDER BY file_id DESC",
+                (int(parent_id),),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def search(self, keyword, limit=500):
+        """按文件名搜索"""
+        pattern = "%" + keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT detail FROM files WHERE file_name LIKE ? ESCAPE '\\' "
+                "ORDER BY type DESC, file_name LIMIT ?",
+                (pattern, int(limit)),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def close(self):
+        """关闭数据库"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,53 @@
+# https://github.com/123panNextGen/123pan
+# src/rate_limit.py
+
+"""令牌桶限速器"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """线程安全的令牌桶
+
+    以 rate 个/秒的速度补充令牌，最多积累 capacity 个。
+    rate 为 0 或负数时表示不限速。
+    """
+
+    def __init__(self, rate, capacity=None):
+        self._lock = threading.Lock()
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+
+    def _refill(self, now):
+        """按流逝时间补充令牌"""
+        if self.rate > 0:
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def set_rate(self, rate, capacity=None):
+        """调整速率（可在运行中修改）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+            if capacity is not None:
+                self.capacity = float(capacity)
+            self._tokens = min(self._tokens, self.capacity)
+
+    def acquire(self, amount=1):
+        """取出 amount 个令牌，不足时阻塞等待"""
+        while True:
+            with self._lock:
+                if self.rate <= 0:
+                    return
+                now = time.monotonic()
+                self._refill(now)
+                # 请求量超过桶容量时允许透支，避免永远等不到
+                need = min(amount, self.capacity)
+                if self._tokens >= need:
+                    self._tokens -= amount
+                    return
+                wait = (need - self._tokens) / self.rate
+            time.sleep(wait)
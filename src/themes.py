@@ -23,7 +23,7 @@ QMainWindow {
 }
 
 /* 表格样式 */
-QTableWidget {
+QTableView {
     background-color: #ffffff;
     border: 1px solid #ccd0da;
     border-radius: 12px;
@@ -32,7 +32,7 @@ QTableWidget {
 }
 
 /* 表格行样式 */
-QTableWidget::item {
+QTableView::item {
     padding: 10px 6px;
     border: none;
     background-color: transparent;
@@ -56,12 +56,12 @@ QPushButton#transferActionBtn:pressed {
 }
 
 /* 表格行悬停效果 */
-QTableWidget::item:hover {
+QTableView::item:hover {
     background-color: #dfe0ea;
 }
 
 /* 表格行选中效果 */
-QTableWidget::item:selected {
+QTableView::item:selected {
     background-color: #1e66f5;
     color: #ffffff;
 }
@@ -302,7 +302,7 @@ QWidget#sidebar {
 }
 
 /* 表格样式 */
-QTableWidget {
+QTableView {
     background-color: #313244;
     border: 1px solid #45475a;
     border-radius: 12px;
@@ -311,7 +311,7 @@ QTableWidget {
 }
 
 /* 表格行样式 */
-QTableWidget::item {
+QTableView::item {
     padding: 10px 6px;
     border: none;
     background-color: transparent;
@@ -335,12 +335,12 @@ QPushButton#transferActionBtn:pressed {
 }
 
 /* 表格行悬停效果 */
-QTableWidget::item:hover {
+QTableView::item:hover {
     background-color: #45475a;
 }
 
 /* 表格行选中效果 */
-QTableWidget::item:selected {
+QTableView::item:selected {
     background-color: #89b4fa;
     color: #1e1e2e;
 }
@@ -12,7 +12,11 @@ class WorkerSignals(QtCore.QObject):
     result = QtCore.pyqtSignal(object)
     progress = QtCore.pyqtSignal(int)
     log = QtCore.pyqtSignal(str)
+    # 任务阶段（如 校验中/上传中），显示在传输列表的状态列
+    status = QtCore.pyqtSignal(str)
     cancel = QtCore.pyqtSignal()
+    # 任务线程结束（包括被取消），用于归还调度名额
+    ended = QtCore.pyqtSignal()
     paused = QtCore.pyqtSignal()
     resumed = QtCore.pyqtSignal()
 
@@ -28,6 +32,8 @@ class ThreadedTask(QtCore.QRunnable):
         self.signals = WorkerSignals()
         self.is_cancelled = False
         self.is_paused = False
+        # 为真时表示任务是被停止而非取消，应保留已下载的部分以便续传
+        self.keep_partial = False
         # pause event: set() means running, clear() means paused
         self._pause_event = threading.Event()
         self._pause_event.set()
@@ -47,12 +53,20 @@ class ThreadedTask(QtCore.QRunnable):
         finally:
             if not self.is_cancelled:
                 self.signals.finished.emit()
+            self.signals.ended.emit()
     
     def cancel(self):
         """取消任务"""
         self.is_cancelled = True
+        # 唤醒暂停中的线程，使其看到取消
+        self._pause_event.set()
         self.signals.cancel.emit()
 
+    def stop(self):
+        """停止任务（程序退出、退出登录时），与取消不同，已完成的部分会保留"""
+        self.keep_partial = True
+        self.cancel()
+
     def pause(self):
         """暂停任务"""
         if not self.is_paused:
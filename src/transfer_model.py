@@ -0,0 +1,275 @@
+# https://github.com/123panNextGen/123pan
+# src/transfer_model.py
+
+"""传输任务列表数据模型"""
+
+from PyQt6 import QtCore, QtGui, QtWidgets
+from transfer_stats import format_rate, format_eta
+
+# 任务结束的状态（已停止：程序退出或退出登录时中断，保留在传输队列中下次继续）
+FINISHED_STATUSES = ("已完成", "失败", "已取消", "已停止")
+
+
+class TransferTableModel(QtCore.QAbstractTableModel):
+    """传输任务登记表，同时作为传输页表格的数据模型
+
+    任务以字典保存，按 task_id 建立索引并维护 task_id -> 行号 的映射，
+    查找、更新、取消都是常数时间；只有视图中可见的行才会调用 data()，
+    上万个排队任务也不会创建对应数量的单元格和按钮。
+    """
+
+    HEADERS = ["类型", "文件名", "大小", "进度", "状态", "速度", "剩余时间", "操作"]
+    ACTION_COLUMN = 7
+    # 任务 id 所在的角色
+    TaskIdRole = QtCore.Qt.ItemDataRole.UserRole
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._tasks = []
+        self._rows = {}
+        # 已开始运行、需要定时读取 TransferProgress 的任务（排队中的不读取）
+        self._live = {}
+
+    @staticmethod
+    def format_size(size):
+        """格式化文件大小"""
+        return f"{round(size / 1048576, 2)} MB" if size > 1048576 else f"{round(size / 1024, 2)} KB"
+
+    def add_task(self, task):
+        """在末尾添加任务，task 至少包含 id / type / name / size"""
+        task.setdefault("progress", 0)
+        task.setdefault("status", "等待中")
+        task.setdefault("rate", "")
+        task.setdefault("eta", "")
+        task.setdefault("paused", False)
+        task.setdefault("tracker", None)
+        row = len(self._tasks)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self._tasks.append(task)
+        self._rows[task["id"]] = row
+        self.endInsertRows()
+        return task
+
+    def task(self, task_id):
+        """按 id 获取任务字典，不存在时返回 None"""
+        row = self._rows.get(task_id)
+        return None if row is None else self._tasks[row]
+
+    def task_at(self, row):
+        """获取某一行的任务字典"""
+        if 0 <= row < len(self._tasks):
+            return self._tasks[row]
+        return None
+
+    def row_of(self, task_id):
+        """任务所在行，不存在时返回 -1"""
+        return self._rows.get(task_id, -1)
+
+    def tasks(self):
+        """全部任务（按行顺序）"""
+        return self._tasks
+
+    def track(self, task_id):
+        """任务开始运行后调用，之后 refresh_progress 会读取它的进度"""
+        task = self.task(task_id)
+        if task is not None and task["tracker"] is not None:
+            self._live[task_id] = task
+
+    def running(self):
+        """已开始运行且尚未结束的任务"""
+        return list(self._live.values())
+
+    def update_task(self, task_id, **changes):
+        """修改任务字段并刷新该行；状态变为结束状态时停止读取进度"""
+        row = self._rows.get(task_id)
+        if row is None:
+            return
+        task = self._tasks[row]
+        task.update(changes)
+        if task.get("status") in FINISHED_STATUSES:
+            task["tracker"] = None
+            task["paused"] = False
+            task["rate"] = task["eta"] = ""
+        if task.get("tracker") is None:
+            self._live.pop(task_id, None)
+        self._emit_rows(row, row)
+
+    def remove_task(self, task_id):
+        """移除任务，见 remove_tasks"""
+        self.remove_tasks([task_id])
+
+    def remove_tasks(self, task_ids):
+        """批量移除任务
+
+        被移除行之后的各行需要重新编号，代价与其后的行数成正比（O(n)）；
+        一次移除多个任务时只重新编号一遍，清理大量任务时应使用本方法而不是逐个移除。
+        """
+        rows = sorted({self._rows[t] for t in task_ids if t in self._rows})
+        if not rows:
+            return
+        # 连续的行合并为一次通知，从下往上删除，前面的行号不受影响
+        runs = []
+        for row in rows:
+            if runs and runs[-1][1] == row - 1:
+                runs[-1][1] = row
+            else:
+                runs.append([row, row])
+        for first, last in reversed(runs):
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            del self._tasks[first:last + 1]
+            self.endRemoveRows()
+        for task_id in task_ids:
+            self._rows.pop(task_id, None)
+            self._live.pop(task_id, None)
+        for i in range(rows[0], len(self._tasks)):
+            self._rows[self._tasks[i]["id"]] = i
+
+    def refresh_progress(self):
+        """读取进行中任务的 TransferProgress，有变化的行合并为一次 dataChanged"""
+        first = last = None
+        for task in self._live.values():
+            percent, status, rate, eta = task["tracker"].snapshot()
+            if task["paused"]:
+                status, rate, eta = "已暂停", 0, None
+            values = {
+                "progress": percent,
+                "status": status or task["status"],
+                "rate": format_rate(rate) if rate else "",
+                "eta": format_eta(eta) if eta is not None else "",
+            }
+            if all(task[k] == v for k, v in values.items()):
+                continue
+            task.update(values)
+            row = self._rows[task["id"]]
+            first = row if first is None else min(first, row)
+            last = row if last is None else max(last, row)
+        if first is not None:
+            self._emit_rows(first, last)
+
+    def _emit_rows(self, first, last):
+        self.dataChanged.emit(self.index(first, 3), self.index(last, self.ACTION_COLUMN))
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._tasks)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if orientation == QtCore.Qt.Orientation.Horizontal and role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._tasks):
+            return None
+        task = self._tasks[index.row()]
+        col = index.column()
+        if role == QtCore.Qt.ItemDataRole.DisplayRole:
+            if col == 0:
+                return task["type"]
+            if col == 1:
+                return task["name"]
+            if col == 2:
+                return self.format_size(task["size"])
+            if col == 3:
+                return f"{task['progress']}%"
+            if col == 4:
+                return task["status"]
+            if col == 5:
+                return task["rate"]
+            if col == 6:
+                return task["eta"]
+        elif role == self.TaskIdRole:
+            return task["id"]
+        return None
+
+
+class TransferActionDelegate(QtWidgets.QStyledItemDelegate):
+    """在操作列绘制 暂停/取消 按钮
+
+    不为每行创建 QPushButton，只在绘制时画出按钮并处理点击，
+    任务结束后不再显示按钮。
+    """
+
+    pause_clicked = QtCore.pyqtSignal(int)
+    cancel_clicked = QtCore.pyqtSignal(int)
+
+    BUTTON_WIDTH = 60
+    BUTTON_HEIGHT = 24
+    SPACING = 10
+    # 与主题中 QPushButton#transferActionBtn 的颜色一致
+    COLOR = "#89b4fa"
+    PAUSED_COLOR = "#f9e2af"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pressed = None
+
+    def _buttons(self, rect):
+        """(暂停按钮区域, 取消按钮区域)，在单元格内居中"""
+        total = self.BUTTON_WIDTH * 2 + self.SPACING
+        left = rect.x() + max(5, (rect.width() - total) // 2)
+        top = rect.y() + (rect.height() - self.BUTTON_HEIGHT) // 2
+        pause = QtCore.QRect(left, top, self.BUTTON_WIDTH, self.BUTTON_HEIGHT)
+        cancel = QtCore.QRect(left + self.BUTTON_WIDTH + self.SPACING, top, self.BUTTON_WIDTH, self.BUTTON_HEIGHT)
+        return pause, cancel
+
+    @staticmethod
+    def _task(index):
+        task = index.model().task_at(index.row())
+        if task is None or task["status"] in FINISHED_STATUSES:
+            return None
+        return task
+
+    def paint(self, painter, option, index):
+        super().paint(painter, option, index)
+        task = self._task(index)
+        if task is None:
+            return
+        pause_rect, cancel_rect = self._buttons(option.rect)
+        painter.save()
+        painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+        font = QtGui.QFont(option.font)
+        font.setPixelSize(11)
+        painter.setFont(font)
+        for name, rect, text in (
+            ("pause", pause_rect, "恢复" if task["paused"] else "暂停"),
+            ("cancel", cancel_rect, "取消"),
+        ):
+            if name == "pause" and task["paused"]:
+                color = self.PAUSED_COLOR
+            else:
+                color = self.COLOR
+            painter.setPen(QtCore.Qt.PenStyle.NoPen)
+            painter.setBrush(QtGui.QColor(color))
+            painter.drawRoundedRect(QtCore.QRectF(rect), 4, 4)
+            painter.setPen(QtGui.QColor("white"))
+            painter.drawText(rect, QtCore.Qt.AlignmentFlag.AlignCenter, text)
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        task = self._task(index)
+        if task is None:
+            return False
+        kind = event.type()
+        if kind not in (QtCore.QEvent.Type.MouseButtonPress, QtCore.QEvent.Type.MouseButtonRelease):
+            return False
+        pos = event.position().toPoint()
+        pause_rect, cancel_rect = self._buttons(option.rect)
+        name = "pause" if pause_rect.contains(pos) else "cancel" if cancel_rect.contains(pos) else None
+        if kind == QtCore.QEvent.Type.MouseButtonPress:
+            self._pressed = (task["id"], name) if name else None
+            return name is not None
+        pressed, self._pressed = self._pressed, None
+        if name is None or pressed != (task["id"], name):
+            return pressed is not None
+        if name == "pause":
+            self.pause_clicked.emit(task["id"])
+        else:
+            self.cancel_clicked.emit(task["id"])
+        return True
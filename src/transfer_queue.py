@@ -0,0 +1,149 @@
+# https://github.com/123panNextGen/123pan
+# src/transfer_queue.py
+
+"""传输队列持久化（SQLite）"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from log import get_logger
+from config import ConfigManager, CONFIG_DIR
+
+logger = get_logger(__name__)
+
+# 任务状态
+PENDING = "pending"
+PAUSED = "paused"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+# 重启后需要恢复的状态
+UNFINISHED = (PENDING, PAUSED)
+# 已结束的任务保留的条数
+KEEP_FINISHED = 200
+
+
+def queue_path_for_user(user_name):
+    """按账号生成传输队列文件路径（任务中的 FileId 只对该账号有效）"""
+    digest = hashlib.md5(str(user_name).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(CONFIG_DIR, f"transfers_{digest}.db")
+
+
+class TransferQueue:
+    """保存传输任务，程序重启后恢复未完成的任务
+
+    每个任务记录类别（kind）、来源（source）、目标（destination）、状态和已完成字节数，
+    source / destination 以 JSON 保存：
+      upload_file   source 为本地文件路径，destination 为 {"parent_id", "duplicate"}
+      upload_folder source 为本地文件夹路径，destination 为 {"parent_id", "duplicate"}
+      download      source 为云盘条目列表，destination 为 {"path", "overwrite"}，
+                    overwrite 表示用户已确认覆盖本地已存在的同名文件
+    文件内已完成的字节范围由 Downloader 的断点信息（.123pan.json）保存，
+    恢复后的下载从断点继续；上传按文件重新开始（MD5 来自指纹缓存，已上传的文件秒传）。
+    """
+
+    def __init__(self, db_path):
+        ConfigManager.ensure_config_dir()
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS transfers (
+                    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    source TEXT NOT NULL,
+                    destination TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    done_bytes INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_transfers_state ON transfers(state)")
+
+    def add(self, kind, name, size, source, destination, state=PENDING):
+        """记录新任务，返回 job_id"""
+        now = time.time()
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO transfers (kind, name, size, source, destination, state, done_bytes, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                (kind, name, int(size), json.dumps(source, ensure_ascii=False),
+                 json.dumps(destination, ensure_ascii=False), state, now, now),
+            )
+            return cur.lastrowid
+
+    def set_state(self, job_id, state, done_bytes=None):
+        """修改任务状态"""
+        with self._lock, self._conn:
+            if done_bytes is None:
+                self._conn.execute(
+                    "UPDATE transfers SET state = ?, updated_at = ? WHERE job_id = ?",
+                    (state, time.time(), job_id),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE transfers SET state = ?, done_bytes = ?, updated_at = ? WHERE job_id = ?",
+                    (state, int(done_bytes), time.time(), job_id),
+                )
+
+    def save_progress(self, progress):
+        """批量写入已完成字节数，progress 为 {job_id: done_bytes}"""
+        if not progress:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE transfers SET done_bytes = ?, updated_at = ? WHERE job_id = ?",
+                [(int(done), now, job_id) for job_id, done in progress.items()],
+            )
+
+    def unfinished(self):
+        """未完成的任务（按加入顺序），每项为字典"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, kind, name, size, source, destination, state, done_bytes FROM transfers "
+                f"WHERE state IN ({', '.join('?' * len(UNFINISHED))}) ORDER BY job_id",
+                UNFINISHED,
+            ).fetchall()
+        jobs = []
+        for job_id, kind, name, size, source, destination, state, done_bytes in rows:
+            try:
+                jobs.append({
+                    "job_id": job_id,
+                    "kind": kind,
+                    "name": name,
+                    "size": size,
+                    "source": json.loads(source),
+                    "destination": json.loads(destination),
+                    "state": state,
+                    "done_bytes": done_bytes,
+                })
+            except ValueError as e:
+                logger.warning(f"忽略损坏的传输任务 {job_id}: {e}")
+        return jobs
+
+    def prune(self, keep=KEEP_FINISHED):
+        """删除较早结束的任务，只保留最近 keep 条"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"DELETE FROM transfers WHERE state NOT IN ({', '.join('?' * len(UNFINISHED))}) "
+                "AND job_id NOT IN (SELECT job_id FROM transfers WHERE state NOT IN "
+                f"({', '.join('?' * len(UNFINISHED))}) ORDER BY updated_at DESC LIMIT ?)",
+                (*UNFINISHED, *UNFINISHED, int(keep)),
+            )
+
+    def close(self):
+        """关闭数据库"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,193 @@
+# https://github.com/123panNextGen/123pan
+# src/transfer_scheduler.py
+
+"""传输任务调度"""
+
+import heapq
+import itertools
+from collections import deque
+from PyQt6 import QtCore
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+class TransferScheduler(QtCore.QObject):
+    """统一调度上传/下载任务
+
+    每个类别（download / upload）同时运行的任务数有上限，超出的任务排队；
+    排队任务按优先级从高到低开始，同一优先级先进先出。任务内部的连接数
+    另由 Pan123.budget（ConnectionBudget）统一限制。
+
+    暂停的任务不占名额：排队中暂停的任务不会开始，运行中暂停的任务让出名额，
+    恢复时重新排队，有名额后（先于普通排队任务）才真正恢复。
+
+    Args:
+        threadpool: 运行任务的 QThreadPool
+        limits: 各类别同时运行的任务数，如 {"download": 3, "upload": 2}
+    """
+
+    # 任务开始运行时发出，参数为 task_id
+    started = QtCore.pyqtSignal(int)
+
+    def __init__(self, threadpool, limits, parent=None):
+        super().__init__(parent)
+        self.threadpool = threadpool
+        self.limits = {kind: max(1, int(n)) for kind, n in limits.items()}
+        # 运行中的任务: 类别 -> {task_id: ThreadedTask}
+        self._running = {kind: {} for kind in self.limits}
+        # task_id -> [优先级, 序号, 类别, ThreadedTask]
+        self._pending = {}
+        # 每个类别一个堆，元素为 (-优先级, 序号, task_id)；调整优先级时压入新元素，
+        # 与 _pending 中当前值不一致的旧元素在弹出时丢弃
+        self._queues = {kind: [] for kind in self.limits}
+        self._seq = itertools.count()
+        # 排队中被暂停的任务: task_id -> 排队条目
+        self._held = {}
+        # 运行中被暂停、已让出名额的任务: task_id -> (类别, ThreadedTask)
+        self._suspended = {}
+        # 等待名额以恢复运行的任务
+        self._resuming = {kind: deque() for kind in self.limits}
+
+    def set_limits(self, limits):
+        """修改同时运行的任务数，调高时立即开始排队任务，调低时等运行中的任务结束"""
+        for kind, n in limits.items():
+            if kind in self.limits:
+                self.limits[kind] = max(1, int(n))
+        self._dispatch()
+
+    def submit(self, task_id, task, kind, priority=0, paused=False):
+        """提交任务，有名额时立即开始，否则排队；paused 为真时在 resume 之前不会开始"""
+        if kind not in self.limits:
+            raise ValueError(f"未知的任务类别: {kind}")
+        task.signals.ended.connect(lambda tid=task_id, k=kind: self._on_ended(tid, k))
+        entry = [priority, next(self._seq), kind, task]
+        if paused:
+            self._held[task_id] = entry
+            return
+        self._pending[task_id] = entry
+        self._push(task_id)
+        self._dispatch()
+
+    def pause(self, task_id):
+        """任务被暂停后调用：排队中的暂不开始，运行中的让出名额，等待恢复的不再恢复"""
+        entry = self._pending.pop(task_id, None)
+        if entry is not None:
+            self._held[task_id] = entry
+            return
+        for kind, running in self._running.items():
+            if task_id in running:
+                self._suspended[task_id] = (kind, running.pop(task_id))
+                self._dispatch()
+                return
+        # 已恢复但仍在等待名额的任务回到暂停状态，不会在有名额时被恢复
+        for kind, queue in self._resuming.items():
+            for item in queue:
+                if item[0] == task_id:
+                    queue.remove(item)
+                    self._suspended[task_id] = (kind, item[1])
+                    return
+
+    def resume(self, task_id):
+        """恢复暂停的任务：未开始的回到排队位置，已开始的等有名额后恢复运行"""
+        entry = self._held.pop(task_id, None)
+        if entry is not None:
+            entry[3].resume()
+            self._pending[task_id] = entry
+            self._push(task_id)
+        elif task_id in self._suspended:
+            kind, task = self._suspended.pop(task_id)
+            self._resuming[kind].append((task_id, task))
+        else:
+            # 暂停时未经 pause 让出名额的任务（仍在排队或运行中）直接恢复
+            entry = self._pending.get(task_id)
+            task = entry[3] if entry else next(
+                (r[task_id] for r in self._running.values() if task_id in r), None)
+            if task is not None:
+                task.resume()
+        self._dispatch()
+
+    def is_paused(self, task_id):
+        """任务是否因暂停不占名额（包括恢复后仍在等待名额的）"""
+        return (task_id in self._held or task_id in self._suspended
+                or any(tid == task_id for q in self._resuming.values() for tid, _ in q))
+
+    def is_pending(self, task_id):
+        """任务是否仍在排队"""
+        return task_id in self._pending
+
+    def set_priority(self, task_id, priority):
+        """调整排队任务的优先级，已开始的任务不受影响"""
+        entry = self._pending.get(task_id)
+        if entry is not None:
+            entry[0] = priority
+            self._push(task_id)
+
+    def move_to_front(self, task_id):
+        """让排队任务在同类任务中最先开始"""
+        entry = self._pending.get(task_id)
+        if entry is None:
+            return
+        same_kind = [e[0] for tid, e in self._pending.items() if e[2] == entry[2] and tid != task_id]
+        entry[0] = max(same_kind, default=entry[0]) + 1
+        self._push(task_id)
+
+    def move_to_back(self, task_id):
+        """让排队任务在同类任务中最后开始"""
+        entry = self._pending.get(task_id)
+        if entry is None:
+            return
+        same_kind = [e[0] for tid, e in self._pending.items() if e[2] == entry[2] and tid != task_id]
+        entry[0] = min(same_kind, default=entry[0]) - 1
+        entry[1] = next(self._seq)
+        self._push(task_id)
+
+    def remove(self, task_id):
+        """移除排队或暂停中的任务（例如被取消），返回是否在排队"""
+        self._held.pop(task_id, None)
+        self._suspended.pop(task_id, None)
+        for queue in self._resuming.values():
+            for item in [item for item in queue if item[0] == task_id]:
+                queue.remove(item)
+        return self._pending.pop(task_id, None) is not None
+
+    def _push(self, task_id):
+        priority, seq, kind, _ = self._pending[task_id]
+        heapq.heappush(self._queues[kind], (-priority, seq, task_id))
+
+    def _pop(self, kind):
+        """弹出该类别优先级最高的排队任务 id，没有时返回 None"""
+        queue = self._queues[kind]
+        while queue:
+            neg_priority, seq, task_id = heapq.heappop(queue)
+            entry = self._pending.get(task_id)
+            # 已移除或优先级已调整（堆中另有新元素）
+            if entry is not None and entry[0] == -neg_priority and entry[1] == seq:
+                return task_id
+        return None
+
+    def _on_ended(self, task_id, kind):
+        self._running[kind].pop(task_id, None)
+        self.remove(task_id)
+        self._dispatch()
+
+    def _dispatch(self):
+        """为有空余名额的类别启动优先级最高的排队任务"""
+        for kind, limit in self.limits.items():
+            resuming = self._resuming[kind]
+            while resuming and len(self._running[kind]) < limit:
+                task_id, task = resuming.popleft()
+                if task.is_cancelled:
+                    continue
+                self._running[kind][task_id] = task
+                task.resume()
+            while len(self._running[kind]) < limit:
+                task_id = self._pop(kind)
+                if task_id is None:
+                    break
+                task = self._pending.pop(task_id)[3]
+                if task.is_cancelled:
+                    continue
+                self._running[kind][task_id] = task
+                self.started.emit(task_id)
+                self.threadpool.start(task)
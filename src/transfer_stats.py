@@ -0,0 +1,124 @@
+# https://github.com/123panNextGen/123pan
+# src/transfer_stats.py
+
+"""传输速度统计"""
+
+import time
+import threading
+from collections import deque
+
+
+def format_size(size):
+    """格式化字节数"""
+    if size >= 1073741824:
+        return f"{size / 1073741824:.2f} GB"
+    if size >= 1048576:
+        return f"{size / 1048576:.2f} MB"
+    return f"{size / 1024:.1f} KB"
+
+
+def format_rate(rate):
+    """格式化速度（字节/秒）"""
+    return format_size(rate) + "/s"
+
+
+def format_eta(seconds):
+    """格式化剩余时间，无法估计时返回 --:--"""
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+class RateMeter:
+    """按最近 window 秒内的字节数计算速度（线程安全）"""
+
+    def __init__(self, window=5.0):
+        self.window = window
+        self.total = 0
+        self._samples = deque()
+        self._window_bytes = 0
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        while self._samples and now - self._samples[0][0] > self.window:
+            _, n = self._samples.popleft()
+            self._window_bytes -= n
+
+    def add(self, n):
+        """记录新传输的字节数"""
+        now = time.monotonic()
+        with self._lock:
+            self.total += n
+            self._samples.append((now, n))
+            self._window_bytes += n
+            self._trim(now)
+
+    def rate(self):
+        """当前速度（字节/秒）"""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if not self._samples:
+                return 0.0
+            elapsed = max(now - self._samples[0][0], 1.0)
+            return self._window_bytes / elapsed
+
+    def eta(self, remaining):
+        """按当前速度估计剩余时间（秒），无法估计时返回 None"""
+        rate = self.rate()
+        if rate <= 0:
+            return None
+        return max(0, remaining) / rate
+
+
+class TransferProgress:
+    """一个传输任务的进度
+
+    工作线程只修改这里的计数（不发送 Qt 信号），界面线程定时调用 snapshot 读取并批量刷新。
+    百分比优先使用 set_percent 给出的值（如校验阶段），否则按 done / total 计算；
+    速度只统计 add_bytes 记录的字节，skip 记录的（如已存在而跳过的文件）只计入完成量。
+    """
+
+    def __init__(self, total=0):
+        self.total = total
+        self.percent = None
+        self.status = None
+        self.paused = False
+        self.meter = RateMeter()
+        self._skipped = 0
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        """已完成的字节数"""
+        return self.meter.total + self._skipped
+
+    def add_bytes(self, n):
+        """记录新传输的字节数"""
+        self.meter.add(n)
+
+    def skip(self, n):
+        """记录无需传输的字节数（不计入速度）"""
+        with self._lock:
+            self._skipped += n
+
+    def set_percent(self, percent):
+        self.percent = percent
+
+    def set_status(self, status):
+        self.status = status
+
+    def snapshot(self):
+        """返回 (百分比, 状态, 速度 字节/秒, 剩余秒数或 None)"""
+        done = self.done
+        total = self.total
+        percent = self.percent
+        if percent is None:
+            percent = min(100, int(done * 100 / total)) if total else 0
+        rate = self.meter.rate()
+        eta = self.meter.eta(total - done) if total else None
+        status = "已暂停" if self.paused else self.status
+        return percent, status, rate, eta
@@ -34,8 +34,8 @@ class SettingsDialog(QtWidgets.QDialog):
         
         layout = QtWidgets.QVBoxLayout(self)
         
-        # 下载设置组
-        download_group = QtWidgets.QGroupBox("下载设置")
+        # 传输设置组
+        download_group = QtWidgets.QGroupBox("传输设置")
         download_layout = QtWidgets.QVBoxLayout()
         
         # 默认下载路径
@@ -53,6 +53,60 @@ class SettingsDialog(QtWidgets.QDialog):
         self.cb_ask_location = QtWidgets.QCheckBox("每次下载前询问保存位置")
         download_layout.addWidget(self.cb_ask_location)
         
+        # 下载连接数
+        conn_layout = QtWidgets.QHBoxLayout()
+        conn_layout.addWidget(QtWidgets.QLabel("最大下载连接数:"))
+        self.sb_connections = QtWidgets.QSpinBox()
+        self.sb_connections.setRange(1, 32)
+        conn_layout.addWidget(self.sb_connections)
+        self.cb_adaptive = QtWidgets.QCheckBox("按网速自动调整")
+        conn_layout.addWidget(self.cb_adaptive)
+        conn_layout.addStretch()
+        download_layout.addLayout(conn_layout)
+        
+        # 上传并发分块数
+        upload_layout = QtWidgets.QHBoxLayout()
+        upload_layout.addWidget(QtWidgets.QLabel("同时上传分块数:"))
+        self.sb_upload_concurrency = QtWidgets.QSpinBox()
+        self.sb_upload_concurrency.setRange(1, 16)
+        upload_layout.addWidget(self.sb_upload_concurrency)
+        upload_layout.addStretch()
+        download_layout.addLayout(upload_layout)
+        
+        # 同时进行的任务数，超出的任务排队
+        active_layout = QtWidgets.QHBoxLayout()
+        active_layout.addWidget(QtWidgets.QLabel("同时进行的任务 下载:"))
+        self.sb_active_downloads = QtWidgets.QSpinBox()
+        self.sb_active_downloads.setRange(1, 16)
+        active_layout.addWidget(self.sb_active_downloads)
+        active_layout.addWidget(QtWidgets.QLabel("上传:"))
+        self.sb_active_uploads = QtWidgets.QSpinBox()
+        self.sb_active_uploads.setRange(1, 16)
+        active_layout.addWidget(self.sb_active_uploads)
+        active_layout.addStretch()
+        download_layout.addLayout(active_layout)
+        
+        # 带宽限制，所有任务共享
+        rate_layout = QtWidgets.QHBoxLayout()
+        rate_layout.addWidget(QtWidgets.QLabel("限速 下载:"))
+        self.sb_download_rate = QtWidgets.QSpinBox()
+        self.sb_download_rate.setRange(0, 1048576)
+        self.sb_download_rate.setSuffix(" KB/s")
+        self.sb_download_rate.setSpecialValueText("不限")
+        rate_layout.addWidget(self.sb_download_rate)
+        rate_layout.addWidget(QtWidgets.QLabel("上传:"))
+        self.sb_upload_rate = QtWidgets.QSpinBox()
+        self.sb_upload_rate.setRange(0, 1048576)
+        self.sb_upload_rate.setSuffix(" KB/s")
+        self.sb_upload_rate.setSpecialValueText("不限")
+        rate_layout.addWidget(self.sb_upload_rate)
+        rate_layout.addStretch()
+        download_layout.addLayout(rate_layout)
+        
+        # 传输队列保存在配置目录中，重启后继续
+        self.cb_resume_transfers = QtWidgets.QCheckBox("启动时恢复未完成的传输")
+        download_layout.addWidget(self.cb_resume_transfers)
+        
         download_group.setLayout(download_layout)
         layout.addWidget(download_group)
         
@@ -77,9 +131,25 @@ class SettingsDialog(QtWidgets.QDialog):
         default_path = ConfigManager.get_setting("defaultDownloadPath", 
                                                 os.path.join(os.path.expanduser("~"), "Downloads"))
         ask_location = ConfigManager.get_setting("askDownloadLocation", True)
+        connections = ConfigManager.get_setting("downloadConnections", 8)
+        adaptive = ConfigManager.get_setting("downloadAdaptive", True)
+        upload_concurrency = ConfigManager.get_setting("uploadConcurrency", 4)
+        active_downloads = ConfigManager.get_setting("maxActiveDownloads", 3)
+        active_uploads = ConfigManager.get_setting("maxActiveUploads", 2)
+        download_rate = ConfigManager.get_setting("downloadRateLimit", 0)
+        upload_rate = ConfigManager.get_setting("uploadRateLimit", 0)
+        resume_transfers = ConfigManager.get_setting("resumeTransfers", True)
         
         self.le_download_path.setText(default_path)
         self.cb_ask_location.setChecked(ask_location)
+        self.sb_connections.setValue(int(connections))
+        self.cb_adaptive.setChecked(adaptive)
+        self.sb_upload_concurrency.setValue(int(upload_concurrency))
+        self.sb_active_downloads.setValue(int(active_downloads))
+        self.sb_active_uploads.setValue(int(active_uploads))
+        self.sb_download_rate.setValue(int(download_rate))
+        self.sb_upload_rate.setValue(int(upload_rate))
+        self.cb_resume_transfers.setChecked(resume_transfers)
     
     def browse_download_path(self):
         """浏览下载路径"""
@@ -93,7 +163,15 @@ class SettingsDialog(QtWidgets.QDialog):
         """获取设置的参数"""
         return {
             "defaultDownloadPath": self.le_download_path.text(),
-            "askDownloadLocation": self.cb_ask_location.isChecked()
+            "askDownloadLocation": self.cb_ask_location.isChecked(),
+            "downloadConnections": self.sb_connections.value(),
+            "downloadAdaptive": self.cb_adaptive.isChecked(),
+            "uploadConcurrency": self.sb_upload_concurrency.value(),
+            "maxActiveDownloads": self.sb_active_downloads.value(),
+            "maxActiveUploads": self.sb_active_uploads.value(),
+            "downloadRateLimit": self.sb_download_rate.value(),
+            "uploadRateLimit": self.sb_upload_rate.value(),
+            "resumeTransfers": self.cb_resume_transfers.isChecked()
         }
 
 
@@ -0,0 +1,391 @@
+# https://github.com/123panNextGen/123pan
+# src/uploader.py
+
+"""分块并发上传"""
+
+import os
+import json
+import hashlib
+import time
+import contextlib
+import threading
+import concurrent.futures
+from log import get_logger
+from config import ConfigManager
+
+logger = get_logger(__name__)
+
+# 分块大小
+BLOCK_SIZE = 5242880
+# 单个分块的最大重试次数
+PART_RETRIES = 5
+# 每次请求上传链接的分块数
+URL_BATCH = 64
+# 上传链接的有效期（秒），超过后重新获取
+URL_TTL = 600
+# 计算 MD5 时每次读取的大小
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+class UploadCancelled(Exception):
+    """上传被用户取消"""
+
+
+def check_task(task):
+    """暂停时阻塞，取消时抛出 UploadCancelled"""
+    if task:
+        try:
+            task._pause_event.wait()
+        except Exception:
+            pass
+        if task.is_cancelled:
+            raise UploadCancelled()
+
+
+def compute_file_md5(file_path, task=None, on_progress=None, cache=None):
+    """计算文件 MD5（upload_request 需要的 etag）
+
+    用同一个缓冲区 readinto 大块读取，不为每块分配新的 bytes；并提示系统顺序预读。
+    读过的数据留在页缓存中，文件能放进内存时随后的上传读取直接命中缓存。
+    传入 cache（FingerprintCache）时文件未变化则直接返回缓存的 MD5，计算后写回缓存。
+    on_progress 参数为 0-100 的整数，被取消时抛出 UploadCancelled。
+    """
+    st = os.stat(file_path)
+    if cache is not None:
+        try:
+            cached = cache.lookup(file_path, st)
+        except Exception as e:
+            logger.warning(f"读取指纹缓存失败: {e}")
+            cached = None
+        if cached:
+            if on_progress:
+                on_progress(100)
+            return cached
+
+    md5 = hashlib.md5()
+    total = st.st_size
+    buf = bytearray(HASH_BLOCK_SIZE)
+    view = memoryview(buf)
+    done = 0
+    last = -1
+    with open(file_path, "rb", buffering=0) as f:
+        if hasattr(os, "posix_fadvise"):
+            try:
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass
+        while True:
+            check_task(task)
+            n = f.readinto(buf)
+            if not n:
+                break
+            md5.update(view[:n])
+            done += n
+            if on_progress and total:
+                percent = int(done * 100 / total)
+                if percent != last:
+                    last = percent
+                    on_progress(percent)
+    digest = md5.hexdigest()
+    if cache is not None:
+        try:
+            cache.store(file_path, digest, st)
+        except Exception as e:
+            logger.warning(f"写入指纹缓存失败: {e}")
+    return digest
+
+
+class PresignedUrlPool:
+    """分块上传链接池
+
+    每次向服务器请求 batch_size 个分块的上传链接，用到一批的一半时在后台预取下一批。
+    链接超过 URL_TTL 秒或分块上传失败后重新获取整批。
+
+    Args:
+        fetch: fetch(start, end) 返回 presignedUrls 字典，end 不包含在内
+        num_parts: 分块总数
+        batch_size: 每批的分块数
+    """
+
+    def __init__(self, fetch, num_parts, batch_size=URL_BATCH):
+        self._fetch = fetch
+        self.num_parts = num_parts
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        # 批次序号 -> Future，结果为 (链接字典, 获取时间)
+        self._batches = {}
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+    def _load(self, batch, last_part):
+        start = batch * self.batch_size + 1
+        end = min((batch + 1) * self.batch_size, max(self.num_parts, last_part)) + 1
+        return self._fetch(start, end), time.monotonic()
+
+    def _usable(self, future):
+        """批次仍在获取中，或已成功获取且未过期"""
+        if not future.done():
+            return True
+        if future.exception() is not None:
+            return False
+        return time.monotonic() - future.result()[1] < URL_TTL
+
+    def get(self, part_number):
+        """获取分块的上传链接（必要时阻塞等待获取）"""
+        batch, offset = divmod(part_number - 1, self.batch_size)
+        with self._lock:
+            future = self._batches.get(batch)
+            if future is None or not self._usable(future):
+                future = self._executor.submit(self._load, batch, part_number)
+                self._batches[batch] = future
+            # 预取下一批
+            next_batch = batch + 1
+            if (offset >= self.batch_size // 2 and next_batch * self.batch_size < self.num_parts
+                    and next_batch not in self._batches):
+                self._batches[next_batch] = self._executor.submit(self._load, next_batch, 0)
+            # 已用完的批次不再需要
+            self._batches.pop(batch - 2, None)
+        urls, _ = future.result()
+        return urls[str(part_number)]
+
+    def invalidate(self, part_number):
+        """分块上传失败后丢弃所在批次的链接，下次使用时重新获取"""
+        batch = (part_number - 1) // self.batch_size
+        with self._lock:
+            future = self._batches.get(batch)
+            if future is not None and future.done():
+                self._batches.pop(batch, None)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class MultipartUploader:
+    """把文件分块上传到 upload_request 返回的 S3 上传会话
+
+    读取线程依次读出分块交给线程池上传，同时在途的分块最多 concurrency 个，
+    因此内存中最多缓存 concurrency 个分块。上传链接由 PresignedUrlPool 批量获取，
+    每个分块单独重试，全部分块确认完成后才调用 s3_complete_multipart_upload。
+
+    Args:
+        session: 共享的 requests 会话
+        headers: 已登录的请求头
+        file_path: 本地文件路径
+        upload_data: upload_request 返回的 data（Bucket、StorageNode、Key、UploadId、FileId）
+        task: ThreadedTask，用于暂停/取消
+        on_progress: 进度回调，参数为 0-100 的整数
+        concurrency: 同时上传的分块数，默认读取设置 uploadConcurrency
+        on_bytes: 每个分块完成时以分块字节数调用，用于汇总多个文件的进度
+        budget: 全局 ConnectionBudget，每个分块上传期间占用一个 upload 名额
+        bandwidth: 全局 BandwidthLimiter，所有分块共享上传限速
+    """
+
+    def __init__(self, session, headers, file_path, upload_data, task=None, on_progress=None,
+                 concurrency=None, on_bytes=None, budget=None, bandwidth=None):
+        self.session = session
+        self.headers = headers
+        self.file_path = file_path
+        self.bucket = upload_data["Bucket"]
+        self.storage_node = upload_data["StorageNode"]
+        self.upload_key = upload_data["Key"]
+        self.upload_id = upload_data["UploadId"]
+        self.file_id = upload_data["FileId"]
+        self.task = task
+        self.on_progress = on_progress
+        self.on_bytes = on_bytes
+        self.budget = budget
+        self.bandwidth = bandwidth
+        if concurrency is None:
+            concurrency = ConfigManager.get_setting("uploadConcurrency", 4)
+        self.concurrency = max(1, int(concurrency))
+        self.total = 0
+        self._sent = 0
+        self._completed = set()
+        self._lock = threading.Lock()
+        self._error = None
+        self._urls = None
+
+    def _check_state(self):
+        check_task(self.task)
+
+    def _post(self, url, data):
+        res = self.session.post(url, headers=self.headers, data=json.dumps(data), timeout=30)
+        return res.json()
+
+    def _session_data(self):
+        return {
+            "bucket": self.bucket,
+            "key": self.upload_key,
+            "uploadId": self.upload_id,
+            "storageNode": self.storage_node,
+        }
+
+    def _get_part_urls(self, start, end):
+        """批量获取分块 [start, end) 的上传链接"""
+        res_json = self._post(
+            "https://www.123pan.com/b/api/file/s3_repare_upload_parts_batch",
+            {
+                "bucket": self.bucket,
+                "key": self.upload_key,
+                "partNumberEnd": end,
+                "partNumberStart": start,
+                "uploadId": self.upload_id,
+                "StorageNode": self.storage_node,
+            },
+        )
+        if res_json.get("code", -1) != 0:
+            raise RuntimeError("获取上传链接失败: " + json.dumps(res_json, ensure_ascii=False))
+        return res_json["data"]["presignedUrls"]
+
+    def _upload_part(self, part_number, block):
+        """上传一个分块，失败时重新获取链接并退避重试"""
+        for attempt in range(PART_RETRIES):
+            self._check_state()
+            if self._error is not None:
+                raise UploadCancelled()
+            try:
+                upload_url = self._urls.get(part_number)
+                body = block
+                if self.bandwidth and self.bandwidth.limited("upload"):
+                    body = self.bandwidth.reader(block)
+                with self.budget.slot("upload") if self.budget else contextlib.nullcontext():
+                    res = self.session.put(upload_url, data=body, timeout=60)
+                res.raise_for_status()
+                break
+            except Exception as e:
+                if attempt == PART_RETRIES - 1:
+                    raise
+                # 链接可能已过期，重试时重新获取
+                self._urls.invalidate(part_number)
+                wait = 2 ** attempt
+                logger.warning(f"分块{part_number}上传出错，{wait}秒后重试: {e}")
+                time.sleep(wait)
+        with self._lock:
+            self._completed.add(part_number)
+            self._sent += len(block)
+            if self.total and self.on_progress:
+                self.on_progress(int(self._sent * 100 / self.total))
+        if self.on_bytes:
+            self.on_bytes(len(block))
+
+    def _upload_parts(self):
+        """读取并并发上传所有分块，返回分块数"""
+        self.total = os.path.getsize(self.file_path)
+        self._urls = PresignedUrlPool(self._get_part_urls, max(1, -(-self.total // BLOCK_SIZE)))
+        # 限制在途分块数，读取线程在名额不足时等待
+        slots = threading.Semaphore(self.concurrency)
+
+        def on_done(future):
+            slots.release()
+            exc = future.exception()
+            if exc is not None and self._error is None:
+                self._error = exc
+
+        part_number = 0
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as exe:
+                with open(self.file_path, "rb") as f:
+                    while True:
+                        self._check_state()
+                        slots.acquire()
+                        if self._error is not None:
+                            slots.release()
+                            break
+                        block = f.read(BLOCK_SIZE)
+                        if not block:
+                            slots.release()
+                            break
+                        part_number += 1
+                        exe.submit(self._upload_part, part_number, block).add_done_callback(on_done)
+        finally:
+            self._urls.close()
+        if self._error is not None:
+            raise self._error
+        missing = set(range(1, part_number + 1)) - self._completed
+        if missing:
+            raise RuntimeError(f"分块未完成: {sorted(missing)}")
+        return part_number
+
+    def run(self):
+        """上传全部分块并完成上传，返回 FileId；被取消时返回 "已取消" """
+        try:
+            self._upload_parts()
+        except UploadCancelled:
+            # 有分块失败时 _error 为真实错误
+            if self._error is not None and not isinstance(self._error, UploadCancelled):
+                raise self._error
+            return "已取消"
+
+        self._post("https://www.123pan.com/b/api/file/s3_list_upload_parts", self._session_data())
+        self._post("https://www.123pan.com/b/api/file/s3_complete_multipart_upload", self._session_data())
+        if self.total > 64 * 1024 * 1024:
+            time.sleep(3)
+        res_json = self._post("https://www.123pan.com/b/api/file/upload_complete", {"fileId": self.file_id})
+        if res_json.get("code", -1) != 0:
+            raise RuntimeError("上传完成确认失败: " + json.dumps(res_json, ensure_ascii=False))
+        return self.file_id
+
+
+def upload_file(session, headers, file_path, parent_id, duplicate=0, task=None,
+                on_progress=None, on_status=None, on_bytes=None, on_skip=None, cache=None, etag=None,
+                budget=None, bandwidth=None):
+    """上传单个文件：计算 MD5、发起 upload_request、分块上传
+
+    已知 MD5 时可通过 etag 传入，跳过校验；budget 为全局 ConnectionBudget，
+    bandwidth 为全局 BandwidthLimiter。on_bytes 以实际上传的字节数调用，
+    秒传时以文件大小调用 on_skip（未传输的字节不计入速度）。
+    服务器提示同名文件（5060）时按 duplicate 重新请求（1 覆盖，2 保留两者），
+    duplicate 为 0 时抛出 RuntimeError("同名文件存在")。
+    返回 FileId，被取消时返回 "已取消"。
+    """
+    file_name = os.path.basename(file_path)
+    if not os.path.exists(file_path):
+        raise FileNotFoundError("文件不存在")
+    if os.path.isdir(file_path):
+        raise IsADirectoryError("请使用文件夹上传")
+    fsize = os.path.getsize(file_path)
+
+    readable_hash = etag
+    if readable_hash is None:
+        if on_status:
+            on_status("校验中")
+        try:
+            readable_hash = compute_file_md5(file_path, task=task, on_progress=on_progress, cache=cache)
+        except UploadCancelled:
+            return "已取消"
+    if on_status:
+        on_status("上传中")
+    if on_progress:
+        on_progress(0)
+
+    list_up_request = {
+        "driveId": 0,
+        "etag": readable_hash,
+        "fileName": file_name,
+        "parentFileId": parent_id,
+        "size": fsize,
+        "type": 0,
+        "duplicate": 0,
+    }
+    url = "https://www.123pan.com/b/api/file/upload_request"
+    res_json = session.post(url, headers=headers, data=list_up_request, timeout=30).json()
+    code = res_json.get("code", -1)
+    if code == 5060:
+        if not duplicate:
+            raise RuntimeError("同名文件存在")
+        list_up_request["duplicate"] = duplicate
+        res_json = session.post(url, headers=headers, data=json.dumps(list_up_request), timeout=30).json()
+        code = res_json.get("code", -1)
+    if code != 0:
+        raise RuntimeError("上传请求失败: " + json.dumps(res_json, ensure_ascii=False))
+    data = res_json["data"]
+    if data.get("Reuse"):
+        # 秒传：服务器已有相同文件
+        if on_skip:
+            on_skip(fsize)
+        return data["FileId"]
+    uploader = MultipartUploader(
+        session, headers, file_path, data,
+        task=task, on_progress=on_progress, on_bytes=on_bytes, budget=budget,
+        bandwidth=bandwidth,
+    )
+    return uploader.run()